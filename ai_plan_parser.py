@@ -0,0 +1,257 @@
+"""
+Parser locale delle tabelle Markdown delle diete generate dall'AI.
+
+Estrae righe {"day", "meal", "food", "grams"} direttamente dal testo della
+risposta, senza una seconda chiamata al modello. Layout riconosciuti:
+  1. righe complete:     | Giorno | Pasto | Alimento | Grammi |
+  2. giorni come titolo: ### Lunedì  seguito da  | Pasto | Alimenti | (Quantità) |
+  3. giorni in colonna:  | Pasto | Lunedì | Martedì | ...
+  4. pasti in colonna:   | Giorno | Colazione | Pranzo | Cena |
+Intestazioni in italiano o inglese; quantità in g/kg/ml/l con intervalli
+("80-100 g", "80/100 g" -> 90) e frazioni ("1/2 l" -> 500); nella colonna
+dei grammi valgono anche i numeri senza unità. Le tabelle senza indicazione del giorno vengono attribuite a Lunedì.
+Se non si trova nulla restituisce una lista vuota: il chiamante può
+ripiegare sull'estrattore AI.
+"""
+import re
+import unicodedata
+
+DAY_NAMES = {
+    "lunedi": "Lunedì", "monday": "Lunedì",
+    "martedi": "Martedì", "tuesday": "Martedì",
+    "mercoledi": "Mercoledì", "wednesday": "Mercoledì",
+    "giovedi": "Giovedì", "thursday": "Giovedì",
+    "venerdi": "Venerdì", "friday": "Venerdì",
+    "sabato": "Sabato", "saturday": "Sabato",
+    "domenica": "Domenica", "sunday": "Domenica",
+}
+DEFAULT_DAY = "Lunedì"
+
+MEAL_WORDS = ("colazione", "spuntino", "merenda", "pranzo", "cena", "breakfast", "lunch", "dinner", "snack")
+
+HEADER_DAY = ("giorno", "day")
+HEADER_MEAL = ("pasto", "meal", "momento", "orario")
+HEADER_FOOD = ("alimento", "alimenti", "cibo", "cibi", "food", "foods", "ingrediente", "ingredienti",
+               "menu", "menù", "piatto", "composizione", "item")
+HEADER_GRAMS = ("grammi", "grammatura", "quantita", "quantità", "porzione", "grams", "quantity", "qty", "g", "peso")
+
+_QUANTITY = re.compile(
+    r"(\d+(?:[.,]\d+)?)(?:\s*(-|–|a|/)\s*(\d+(?:[.,]\d+)?))?\s*(kg|grammi|gr|g|ml|cl|l)(?![a-z])",
+    re.IGNORECASE,
+)
+# Cella della colonna grammi senza unità: "40", "80-100", "~ 150"
+_BARE_QUANTITY = re.compile(r"^[~≈\s]*(\d+(?:[.,]\d+)?)(?:\s*(-|–|a|/)\s*(\d+(?:[.,]\d+)?))?\s*$")
+# "a/b" è una frazione ("1/2 l", "3/4") se b è un denominatore piccolo, altrimenti un intervallo ("80/100 g")
+MAX_DENOMINATOR = 10
+_UNIT_FACTOR = {"kg": 1000.0, "grammi": 1.0, "gr": 1.0, "g": 1.0, "ml": 1.0, "cl": 10.0, "l": 1000.0}
+_SEPARATOR_ROW = re.compile(r"^\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?$")
+_ITEM_SPLIT = re.compile(r"<br\s*/?>|;|\+|\n")
+_COMMA_SPLIT = re.compile(r",(?![^()]*\))")
+
+
+def _fold(text):
+    decomposed = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _clean_cell(text):
+    return re.sub(r"[*_`]", "", text).strip()
+
+
+def find_day(text):
+    """Giorno della settimana citato nel testo (forma canonica) o None."""
+    words = re.findall(r"[a-z]+", _fold(text))
+    for word in words:
+        if word in DAY_NAMES:
+            return DAY_NAMES[word]
+    return None
+
+
+def is_meal(text):
+    folded = _fold(text)
+    return any(word in folded for word in MEAL_WORDS)
+
+
+def _header_role(cell):
+    folded = _fold(_clean_cell(cell)).strip(" :()")
+    words = re.findall(r"[a-z]+", folded)
+    if not words:
+        return None
+    if find_day(folded):
+        return "day_name"
+    if is_meal(folded):
+        return "meal_name"
+    for role, names in (("day", HEADER_DAY), ("meal", HEADER_MEAL), ("grams", HEADER_GRAMS), ("food", HEADER_FOOD)):
+        if words[0] in names or folded in names:
+            return role
+    return None
+
+
+def _amount(low, separator, high):
+    """Valore di "80", "80-100" (medio) o "1/2" (frazione) già separati dalla regex."""
+    value = float(low.replace(",", "."))
+    if not high:
+        return value
+    other = float(high.replace(",", "."))
+    if separator == "/" and low.isdigit() and high.isdigit() and 0 < int(high) <= MAX_DENOMINATOR:
+        return value / other
+    return (value + other) / 2
+
+
+def parse_quantity(text):
+    """
+    Grammi indicati nel testo (None se assenti). Gli intervalli restituiscono
+    il valore medio, le frazioni il loro valore; ml/l sono trattati come grammi.
+    """
+    match = _QUANTITY.search(text.replace(" ", " "))
+    if not match:
+        return None
+    return round(_amount(*match.group(1, 2, 3)) * _UNIT_FACTOR[match.group(4).lower()], 1)
+
+
+def parse_grams_cell(text):
+    """
+    Grammi della colonna "Grammi"/"Quantità": come parse_quantity, ma qui
+    un numero o un intervallo senza unità ("40", "80-100") vale in grammi.
+    """
+    grams = parse_quantity(text)
+    if grams is not None:
+        return grams
+    match = _BARE_QUANTITY.match(_clean_cell(text).replace(" ", " "))
+    if not match:
+        return None
+    return round(_amount(*match.group(1, 2, 3)), 1)
+
+
+def _strip_quantity(text):
+    text = _QUANTITY.sub("", text)
+    text = re.sub(r"\(\s*\)|\[\s*\]", "", text)
+    text = re.sub(r"^[\s\-•·:]+|[\s\-•·:,.]+$", "", text)
+    return re.sub(r"\s{2,}", " ", text).strip()
+
+
+def split_foods(cell):
+    """
+    Spezza una cella con più alimenti ("Avena 40 g, Latte 200 ml") in
+    tuple (alimento, grammi | None). Una quantità isolata si unisce
+    all'alimento precedente ("Pasta integrale, 80 g").
+    """
+    parts = []
+    for chunk in _ITEM_SPLIT.split(_clean_cell(cell)):
+        # La virgola separa alimenti solo se almeno due pezzi hanno una quantità
+        # ("Avena 40 g, Latte 200 ml"); altrimenti fa parte del nome ("Riso, crudo")
+        pieces = _COMMA_SPLIT.split(chunk)
+        if sum(parse_quantity(p) is not None for p in pieces) >= 2:
+            parts.extend(pieces)
+        else:
+            parts.append(chunk)
+
+    items = []
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        grams = parse_quantity(part)
+        food = _strip_quantity(part)
+        if not re.search(r"[A-Za-zÀ-ÿ]", food):
+            if items and grams is not None and items[-1][1] is None:
+                items[-1] = (items[-1][0], grams)
+            continue
+        items.append((food, grams))
+    return items
+
+
+def _iter_tables(text):
+    """Genera (righe_tabella, contesto_precedente) per ogni tabella Markdown."""
+    table, context = [], []
+    for line in text.splitlines() + [""]:
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            if not _SEPARATOR_ROW.match(stripped):
+                cells = [c.strip() for c in stripped.strip("|").split("|")]
+                table.append(cells)
+            continue
+        if table:
+            yield table, list(context)
+            table = []
+        if stripped:
+            context.append(stripped)
+
+
+def _row(day, meal, food, grams):
+    item = {"day": day, "meal": meal, "food": food}
+    if grams is not None:
+        item["grams"] = grams
+    return item
+
+
+def _parse_table(rows, context_day):
+    header, body = rows[0], rows[1:]
+    roles = [_header_role(c) for c in header]
+    items = []
+
+    # Layout 3: giorni in colonna
+    day_cols = [i for i, r in enumerate(roles) if r == "day_name"]
+    if len(day_cols) >= 2:
+        for cells in body:
+            meal = _clean_cell(cells[0]) if cells else ""
+            for i in day_cols:
+                if i < len(cells):
+                    for food, grams in split_foods(cells[i]):
+                        items.append(_row(find_day(header[i]), meal, food, grams))
+        return items
+
+    # Layout 4: pasti in colonna (una riga per giorno)
+    meal_cols = [i for i, r in enumerate(roles) if r == "meal_name"]
+    if len(meal_cols) >= 2:
+        for cells in body:
+            day = find_day(" ".join(cells[:1])) or context_day
+            for i in meal_cols:
+                if i < len(cells):
+                    for food, grams in split_foods(cells[i]):
+                        items.append(_row(day, _clean_cell(header[i]), food, grams))
+        return items
+
+    # Layout 1 e 2: colonne con ruolo (giorno opzionale, pasto, alimento, grammi)
+    col = {role: roles.index(role) for role in ("day", "meal", "food", "grams") if role in roles}
+    if "food" not in col:
+        return items
+    current_day, current_meal = context_day, ""
+    for cells in body:
+        def cell(role):
+            i = col.get(role)
+            return cells[i] if i is not None and i < len(cells) else ""
+
+        day = find_day(cell("day")) if "day" in col else None
+        current_day = day or current_day
+        meal = _clean_cell(cell("meal"))
+        current_meal = meal or current_meal  # celle vuote = stesso pasto della riga sopra
+        grams_cell = parse_grams_cell(cell("grams")) if "grams" in col else None
+        foods = split_foods(cell("food"))
+        for food, grams in foods:
+            grams = grams if grams is not None else (grams_cell if len(foods) == 1 else None)
+            items.append(_row(current_day, current_meal, food, grams))
+    return items
+
+
+def parse_plan_tables(text):
+    """
+    Estrae il piano dalle tabelle Markdown del testo AI.
+    Restituisce una lista di dict {"day", "meal", "food", "grams"} (grams
+    assente se non indicato), nello stesso formato di estrai_piano_in_json.
+    """
+    items = []
+    last_day = None
+    for rows, context in _iter_tables(text or ""):
+        if len(rows) < 2:
+            continue
+        # Il giorno di riferimento è l'ultimo citato prima della tabella
+        for line in reversed(context):
+            day = find_day(line)
+            if day:
+                last_day = day
+                break
+        for item in _parse_table(rows, last_day or DEFAULT_DAY):
+            if item["day"] and item["meal"] and is_meal(item["meal"]):
+                items.append(item)
+    return items
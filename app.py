@@ -5,25 +5,21 @@ import time
 import shutil
 import json
 import re
-from pypdf import PdfReader
 from google import genai
 from google.genai import types
-from xhtml2pdf import pisa
-import markdown
-
-# --- GESTIONE IMPORT ROBUSTA ---
-try:
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-except ImportError:
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.docstore.document import Document
 
 # --- IMPORT LOGICA MEAL PLANNER ---
 import meal_planner_logic as mpl 
 
+# --- IMPORT INDICE DOCUMENTI (costruibile anche da CLI) ---
+import knowledge_index as kidx
+from lexical_index import BM25Index, sync_lexical
+from response_cache import ResponseCache, stable_hash
+from embedding_cache import CachedEmbeddings, DEFAULT_DISK_PATH
+from ai_plan_parser import parse_plan_tables
+from pdf_report import PdfRenderer, report_key
+import context_builder as ctxb
+
 # =========================================================
 # 1. CONFIGURAZIONE & SICUREZZA
 # =========================================================
@@ -69,142 +65,213 @@ client = genai.Client(api_key=LA_MIA_API_KEY)
 # =========================================================
 # 2. MOTORE PDF (FIXED STYLE)
 # =========================================================
-def crea_pdf_html(dati_paziente, testo_ai):
-    html_ai = markdown.markdown(testo_ai, extensions=['tables'])
-    html_paziente = dati_paziente.replace("\n", "<br>")
-    
-    css_style = """
-        @page {
-            size: A4;
-            margin: 1.5cm;
-            @frame footer_frame {
-                -pdf-frame-content: footerContent;
-                bottom: 0cm;
-                margin-left: 1.5cm;
-                margin-right: 1.5cm;
-                height: 1cm;
-            }
-        }
-        body { font-family: Helvetica, sans-serif; font-size: 11px; color: #333; line-height: 1.4; }
-        .header-bar { background-color: #008080; color: white; padding: 15px; text-align: center; border-radius: 5px; margin-bottom: 20px; }
-        h1 { margin:0; font-size: 20px; text-transform: uppercase; }
-        .subtitle { font-size: 10px; font-weight: normal; margin-top: 5px; }
-        h2 { color: #008080; font-size: 14px; border-bottom: 2px solid #008080; padding-bottom: 5px; margin-top: 25px; }
-        .box-paziente { background-color: #f0f7f7; border-left: 5px solid #008080; padding: 15px; margin-bottom: 20px; font-size: 10px; }
-        table { width: 100%; border-collapse: collapse; margin-top: 10px; margin-bottom: 15px; font-size: 10px; }
-        th { background-color: #008080; color: white; font-weight: bold; padding: 8px; text-align: left; border: 1px solid #006666; }
-        td { border: 1px solid #ddd; padding: 6px; color: #444; }
-        tr:nth-child(even) { background-color: #f9f9f9; }
+@st.cache_resource
+def get_pdf_renderer():
+    """
+    Worker PDF condiviso tra le sessioni: il report si crea solo quando
+    l'utente clicca "Prepara PDF", in un thread separato, ed è memorizzato
+    per hash di (profilo, testo AI). Il rendering vero e proprio è in pdf_report.py.
     """
+    return PdfRenderer()
 
-    html_template = f"""
-    <html>
-    <head>
-        <style>
-            {css_style}
-        </style>
-    </head>
-    <body>
-        <div class="header-bar">
-            <h1>Piano Clinico Nutrizionale</h1>
-            <div class="subtitle">Generato con Nutri-AI Assistant</div>
-        </div>
-        
-        <div class="box-paziente">
-            <strong>QUADRO CLINICO:</strong><br><br>
-            {html_paziente}
-        </div>
-        
-        {html_ai}
-        
-        <div id="footerContent" style="text-align:center; color:#999; font-size:9px;">
-            Report generato il {pd.Timestamp.now().strftime('%d/%m/%Y')}
-        </div>
-    </body>
-    </html>
+PDF_RENDERER = get_pdf_renderer()
+
+def pulsante_pdf(indice, profilo, testo):
     """
-    
-    from io import BytesIO
-    result_file = BytesIO()
-    pisa_status = pisa.CreatePDF(html_template, dest=result_file)
-    if pisa_status.err: return None
-    return result_file.getvalue()
+    PDF di una risposta solo su richiesta: la chat non aspetta mai pisa.
+    Dopo "Prepara PDF" compare il download, o un errore se il rendering fallisce.
+    """
+    pronti = st.session_state.setdefault("pdf_risposte", {})  # report_key -> byte del PDF o None
+    chiave = report_key(profilo, testo)
+    if chiave not in pronti and st.button("🖨️ Prepara PDF", key=f"prep_pdf_{indice}"):
+        with st.spinner("Generazione PDF..."):
+            pronti[chiave] = PDF_RENDERER.get(profilo, testo)
+    if chiave in pronti:
+        if pronti[chiave]:
+            st.download_button("🖨️ Scarica PDF", data=pronti[chiave], file_name="Piano.pdf",
+                               mime="application/pdf", key=f"pdf_{indice}")
+        else:
+            st.error("Impossibile generare il PDF di questa risposta.")
 
 # =========================================================
 # 3. MOTORE VETTORIALE (IBRIDO LOCALE/CLOUD)
 # =========================================================
 @st.cache_resource
 def gestisci_indice_vettoriale():
-    cartella_docs = "documenti"
-    cartella_index = "faiss_index_store" 
+    cartella_docs = kidx.DOCS_DIR
+    cartella_index = kidx.INDEX_DIR
     
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=LA_MIA_API_KEY)
-    
-    if os.path.exists(cartella_index):
-        try:
-            vector_store = FAISS.load_local(cartella_index, embeddings, allow_dangerous_deserialization=True)
-            files_presenti = len(os.listdir(cartella_docs)) if os.path.exists(cartella_docs) else 0
-            return vector_store, files_presenti, "⚡ Memoria Persistente (GitHub/Locale)"
-        except Exception:
-            pass 
+    # Provider per nuove costruzioni (Secrets: EMBEDDING_PROVIDER = google | sentence | hashing).
+    # Un indice esistente si carica sempre con il provider con cui è stato costruito.
+    try:
+        provider = st.secrets.get("EMBEDDING_PROVIDER", kidx.DEFAULT_PROVIDER)
+    except Exception:
+        provider = kidx.DEFAULT_PROVIDER
     
     if not os.path.exists(cartella_docs):
+        if os.path.exists(cartella_index):
+            vector_store, info = kidx.load_index(cartella_index, api_key=LA_MIA_API_KEY)
+            if vector_store is not None:
+                return vector_store, 0, f"⚡ Memoria Persistente (GitHub/Locale) · {info['provider']}"
         return None, 0, "⚠️ Cartella Documenti Assente"
     
-    files = [f for f in os.listdir(cartella_docs) if f.endswith('.pdf')]
-    if not files:
+    if not kidx.list_pdf_files(cartella_docs):
         return None, 0, "⚠️ Nessun PDF Trovato"
 
-    docs = []
-    for file_name in files:
-        path = os.path.join(cartella_docs, file_name)
-        try:
-            reader = PdfReader(path)
-            text = ""
-            for page in reader.pages:
-                t = page.extract_text()
-                if t: text += t
-            docs.append(Document(page_content=text, metadata={"source": file_name}))
-        except: pass
-    
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-    splits = text_splitter.split_documents(docs)
+    # Aggiornamento incrementale: si indicizzano solo i PDF nuovi/modificati
+    # (manifest con hash per documento), i PDF rimossi escono dallo store
+    indice_presente = os.path.exists(cartella_index)
+    my_bar = st.progress(0, text="Aggiornamento indice in corso (Attendere)...")
+    vector_store, n_files, report = kidx.sync_index(
+        cartella_docs, cartella_index, provider=provider, api_key=LA_MIA_API_KEY,
+        progress=lambda f: my_bar.progress(f),
+    )
+    my_bar.empty()
 
-    vector_store = None
-    batch_size = 10
-    total_chunks = len(splits)
-    my_bar = st.progress(0, text="Indicizzazione in corso (Attendere)...")
+    if report["incompleti"]:
+        return vector_store, n_files, (
+            f"⚠️ Indice parziale: {sum(report['incompleti'].values())} chunk di {len(report['incompleti'])} PDF "
+            f"non indicizzati, verranno ritentati al prossimo avvio ({report['errori'][0]})"
+        )
+    if report["illeggibili"]:
+        return vector_store, n_files, (
+            f"⚠️ Indice parziale: testo non estratto da {len(report['illeggibili'])} PDF "
+            f"({', '.join(report['illeggibili'])}), verranno ritentati al prossimo avvio"
+        )
+    if not indice_presente:
+        return vector_store, n_files, "✅ Indice Ricostruito e Salvato"
+    modifiche = len(report["aggiunti"]) + len(report["modificati"]) + len(report["rimossi"])
+    if modifiche:
+        return vector_store, n_files, (
+            f"🔄 Indice Aggiornato (+{len(report['aggiunti'])} ~{len(report['modificati'])} -{len(report['rimossi'])})"
+        )
+    return vector_store, n_files, "⚡ Memoria Persistente (GitHub/Locale)"
+
+VECTOR_STORE, NUM_FILES, STATUS_MSG = gestisci_indice_vettoriale()
 
-    for i in range(0, total_chunks, batch_size):
-        batch = splits[i : i + batch_size]
+@st.cache_resource
+def get_lexical_index():
+    """
+    Indice BM25 salvato accanto a FAISS (aggiornato da sync_index). Per un
+    indice caricato senza sync si costruisce dal docstore, senza embedding.
+    """
+    lexical = BM25Index.load(kidx.INDEX_DIR)
+    if lexical is None and VECTOR_STORE is not None:
         try:
-            if vector_store is None:
-                vector_store = FAISS.from_documents(batch, embeddings)
-            else:
-                vector_store.add_documents(batch)
-            time.sleep(1.5)
-            my_bar.progress(min(1.0, (i+batch_size)/total_chunks))
-        except Exception:
-            time.sleep(5)
-            continue
-            
-    my_bar.empty()
-    
-    if vector_store:
-        vector_store.save_local(cartella_index)
-        
-    return vector_store, len(files), "✅ Indice Ricostruito e Salvato"
+            lexical = sync_lexical(kidx.INDEX_DIR, VECTOR_STORE, list(VECTOR_STORE.index_to_docstore_id.values()))
+        except OSError:
+            lexical = None
+    return lexical
 
-VECTOR_STORE, NUM_FILES, STATUS_MSG = gestisci_indice_vettoriale()
+LEXICAL_INDEX = get_lexical_index()
+
+@st.cache_resource
+def get_query_embedder():
+    """
+    Embedding delle query con cache condivisa tra le sessioni (LRU in memoria
+    + SQLite su disco). Secrets: QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_DB (percorso; stringa vuota = solo memoria).
+    """
+    if VECTOR_STORE is None:
+        return None
+    try:
+        cfg = {k: st.secrets[k] for k in ("QUERY_EMBEDDING_CACHE_SIZE", "QUERY_EMBEDDING_CACHE_DB") if k in st.secrets}
+    except Exception:
+        cfg = {}
+    info = kidx.read_index_info(kidx.INDEX_DIR) or {"model": type(VECTOR_STORE.embeddings).__name__}
+    return CachedEmbeddings(VECTOR_STORE.embeddings, info["model"],
+                            maxsize=int(cfg.get("QUERY_EMBEDDING_CACHE_SIZE", 1024)),
+                            disk_path=cfg.get("QUERY_EMBEDDING_CACHE_DB", DEFAULT_DISK_PATH) or None)
+
+QUERY_EMBEDDER = get_query_embedder()
+
+# Configurazione del modello di chat (entra anche nella chiave della cache)
+CHAT_MODEL = "gemini-flash-latest"
+CHAT_TEMPERATURE = 0.3
+RETRIEVAL_K = 5  # chunk del vecchio prompt: riferimento per i token risparmiati
+
+def _secret(name, default):
+    try:
+        return st.secrets[name] if name in st.secrets else default
+    except Exception:
+        return default
+
+# Ricerca: hybrid (BM25 + FAISS con RRF) | vector | lexical (nessun embedding, offline)
+RETRIEVAL_MODE = _secret("RETRIEVAL_MODE", "hybrid")
+
+# Context builder: candidati -> MMR -> unione chunk adiacenti -> budget token
+CONTEXT_FETCH_K = int(_secret("CONTEXT_FETCH_K", ctxb.DEFAULT_FETCH_K))
+CONTEXT_SELECT_K = int(_secret("CONTEXT_SELECT_K", ctxb.DEFAULT_SELECT_K))
+CONTEXT_TOKEN_BUDGET = int(_secret("CONTEXT_TOKEN_BUDGET", ctxb.DEFAULT_TOKEN_BUDGET))
+CONTEXT_MMR_LAMBDA = float(_secret("CONTEXT_MMR_LAMBDA", ctxb.DEFAULT_MMR_LAMBDA))
+
+@st.cache_resource
+def get_response_caches():
+    """
+    Cache a due livelli condivisa tra le sessioni:
+    1. retrieval (query aumentata normalizzata -> chunk)
+    2. generazione (prompt + hash profilo, chunk e config -> risposta)
+    Secrets: RESPONSE_CACHE_MODE = exact | semantic, RESPONSE_CACHE_THRESHOLD,
+    RESPONSE_CACHE_TTL (secondi), RESPONSE_CACHE_SIZE.
+    """
+    try:
+        cfg = {k: st.secrets[k] for k in ("RESPONSE_CACHE_MODE", "RESPONSE_CACHE_THRESHOLD", "RESPONSE_CACHE_TTL", "RESPONSE_CACHE_SIZE") if k in st.secrets}
+    except Exception:
+        cfg = {}
+    mode = cfg.get("RESPONSE_CACHE_MODE", "exact")
+    embed = QUERY_EMBEDDER.embed_query if QUERY_EMBEDDER is not None else None
+    if mode == "semantic" and embed is None:
+        mode = "exact"
+    params = dict(
+        maxsize=int(cfg.get("RESPONSE_CACHE_SIZE", 256)),
+        ttl=float(cfg.get("RESPONSE_CACHE_TTL", 6 * 3600)),
+        mode=mode,
+        threshold=float(cfg.get("RESPONSE_CACHE_THRESHOLD", 0.92)),
+        embed=embed,
+    )
+    return ResponseCache(**params), ResponseCache(**params)
+
+RETRIEVAL_CACHE, GENERATION_CACHE = get_response_caches()
 
 # =========================================================
 # 4. FUNZIONI HELPER & PARSING
 # =========================================================
 
+def genera_risposta_stream(prompt, istruzioni, timing):
+    """
+    Generatore dei frammenti di testo della risposta (API in streaming).
+    Registra in `timing` i secondi al primo token ("ttft") e il totale ("totale").
+    """
+    t0 = time.perf_counter()
+    stream = client.models.generate_content_stream(
+        model=CHAT_MODEL,
+        contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
+        config=types.GenerateContentConfig(system_instruction=istruzioni, temperature=CHAT_TEMPERATURE)
+    )
+    for chunk in stream:
+        if chunk.text:
+            timing.setdefault("ttft", time.perf_counter() - t0)
+            yield chunk.text
+    timing["totale"] = time.perf_counter() - t0
+
+def formatta_timing(timing):
+    testo = "⚡ Risposta dalla cache" if timing.get("cache") else \
+        f"⏱️ Primo token {timing.get('ttft', 0):.1f} s · totale {timing.get('totale', 0):.1f} s"
+    ctx = timing.get("contesto")
+    if ctx:
+        testo += f" · contesto {ctx['token_contesto']} token ({ctx['blocchi']} blocchi, −{ctx['risparmiati']} token, {ctx.get('ricerca', 'vector')})"
+    return testo
+
 def estrai_piano_in_json(testo_ai):
     """
     Funzione robusta per estrarre JSON dall'AI.
+    Prima prova il parser locale delle tabelle Markdown (istantaneo, senza
+    chiamate API); l'estrazione via modello resta solo come ripiego.
     """
+    piano = parse_plan_tables(testo_ai)
+    if piano:
+        return piano
+
     prompt_parser = f"""
     Analizza il testo e estrai gli ingredienti in JSON.
     Regole:
@@ -244,6 +311,7 @@ with st.sidebar:
     
     # 1. DATI BIOMETRICI E STILE DI VITA
     with st.expander("👤 Dati Biometrici", expanded=True):
+        codice_paziente = st.text_input("Codice Paziente", placeholder="Es. ROSSI-01 (salva piano e chat)").strip()
         col1, col2 = st.columns(2)
         with col1:
             sesso = st.selectbox("Sesso", ["Uomo", "Donna"])
@@ -308,20 +376,39 @@ with st.sidebar:
     # --- ADMIN TOOLS ---
     with st.expander("🛠️ Admin & Debug Tools", expanded=False):
         st.info(f"Stato Memoria: {STATUS_MSG}")
+        st.caption(f"Ricerca: {RETRIEVAL_MODE} · BM25: {len(LEXICAL_INDEX) if LEXICAL_INDEX else 0} chunk")
         c1, c2 = st.columns(2)
         with c1:
             if st.button("🔄 Ricostruisci", use_container_width=True):
                 try:
-                    if os.path.exists("faiss_index_store"):
-                        shutil.rmtree("faiss_index_store")
+                    if os.path.exists(kidx.INDEX_DIR):
+                        shutil.rmtree(kidx.INDEX_DIR)
                     st.cache_resource.clear()
                     st.rerun()
                 except: pass
         with c2:
-            if os.path.exists("faiss_index_store"):
-                shutil.make_archive("indice_backup", 'zip', "faiss_index_store")
-                with open("indice_backup.zip", "rb") as fp:
-                    st.download_button("💾 Download ZIP", data=fp, file_name="faiss_index_store.zip", mime="application/zip", use_container_width=True)
+            if VECTOR_STORE is not None:
+                # Lo ZIP si prepara solo al click (thread separato) e si ricrea
+                # solo se l'indice è cambiato: nessun I/O nei normali rerun
+                st.download_button("💾 Download ZIP", data=kidx.read_backup_archive, file_name="faiss_index_store.zip", mime="application/zip", use_container_width=True)
+        
+        st.divider()
+        st.write("🧠 **Cache Risposte**")
+        for nome_cache, cache in (("Retrieval", RETRIEVAL_CACHE), ("Generazione", GENERATION_CACHE)):
+            stats = cache.stats()
+            st.caption(f"{nome_cache} ({cache.mode}): {stats['hit']} hit · {stats['miss']} miss · {stats['hit_rate']:.0%} · {stats['voci']} voci")
+        if QUERY_EMBEDDER is not None:
+            emb_stats = QUERY_EMBEDDER.stats()
+            st.caption(f"Embedding query: {emb_stats['hit_memoria']} hit RAM · {emb_stats['hit_disco']} hit disco · "
+                       f"{emb_stats['miss']} miss · {emb_stats['hit_rate']:.0%} · "
+                       f"~{emb_stats['secondi_risparmiati']:.1f}s risparmiati ({emb_stats['latenza_miss'] * 1000:.0f} ms/miss)")
+        pdf_stats = PDF_RENDERER.stats()
+        st.caption(f"PDF: {pdf_stats['rendering']} generati ({pdf_stats['secondi']:.1f}s) · {pdf_stats['hit']} riusati · {pdf_stats['memorizzati']} in memoria")
+        if st.button("🧹 Svuota Cache Risposte", use_container_width=True):
+            RETRIEVAL_CACHE.clear()
+            GENERATION_CACHE.clear()
+            if QUERY_EMBEDDER is not None:
+                QUERY_EMBEDDER.clear()
         
         st.divider()
         st.write("🔧 **Test Connessione DB Cibo**")
@@ -367,12 +454,35 @@ Esami Ematici:
 {esami_df.to_string(index=False)}
 """
 
+# Dati del paziente anche per il Meal Planner (riferimenti LARN, report)
+st.session_state["profilo_paziente"] = {"sesso": sesso, "eta": eta, "peso": peso, "altezza": altezza,
+                                        "attivita": attivita, "regime": regime, "cibi_no": cibi_no,
+                                        "codice": codice_paziente, "testo": PROFILO}
+
+# Piano già compilato e piano salvato per lo stesso codice: si sceglie nel Meal Planner
+mpl.initialize_meal_plan_state()
+if mpl.plan_conflict():
+    st.sidebar.warning(f"Esiste già un piano salvato per **{codice_paziente}**: apri il Meal Planner "
+                       "per riprenderlo o sovrascriverlo con quello attuale.")
+
+# Chat salvata del paziente: si riprende da dove era rimasta. Passando da
+# nessun codice a un codice nuovo, la conversazione in corso viene adottata
+if st.session_state.get("chat_codice", "") != codice_paziente:
+    salvati = mpl.load_chat_messages()
+    if salvati or st.session_state.get("chat_codice"):
+        st.session_state.messages = salvati or []
+    st.session_state.chat_codice = codice_paziente
+
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-for m in st.session_state.messages:
+for i, m in enumerate(st.session_state.messages):
     with st.chat_message(m["role"]):
         st.markdown(m["content"])
+        if m.get("timing"):
+            st.caption(formatta_timing(m["timing"]))
+        if m["role"] == "assistant":
+            pulsante_pdf(i, PROFILO, m["content"])
 
 if prompt := st.chat_input("Scrivi qui la tua richiesta..."):
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -380,12 +490,28 @@ if prompt := st.chat_input("Scrivi qui la tua richiesta..."):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Consultazione biblioteca scientifica..."):
-            try:
+        try:
+            with st.spinner("Consultazione biblioteca scientifica..."):
                 # Retrieval Arricchito
                 q_aug = f"{prompt} {', '.join(metaboliche)} {', '.join(gastro)} {obiettivo}"
-                docs = VECTOR_STORE.similarity_search(q_aug, k=5) if VECTOR_STORE else []
-                context = "\n".join([f"FONTE {d.metadata.get('source')}: {d.page_content}" for d in docs]) or "Nessuna fonte specifica trovata."
+                blocks, ctx_report = [], None
+                if VECTOR_STORE or LEXICAL_INDEX:
+                    ctx_scope = stable_hash({"mode": RETRIEVAL_MODE, "fetch_k": CONTEXT_FETCH_K, "select_k": CONTEXT_SELECT_K,
+                                             "budget": CONTEXT_TOKEN_BUDGET, "lambda": CONTEXT_MMR_LAMBDA})
+                    cached, q_vec = RETRIEVAL_CACHE.lookup(q_aug, scope=ctx_scope)
+                    if cached is None:
+                        candidates, q_vec, modo = kidx.retrieve(q_aug, CONTEXT_FETCH_K, VECTOR_STORE, LEXICAL_INDEX,
+                                                                mode=RETRIEVAL_MODE, query_vector=q_vec,
+                                                                embed=QUERY_EMBEDDER.embed_query if QUERY_EMBEDDER else None)
+                        blocks, ctx_report = ctxb.build_context(q_vec, candidates, select_k=CONTEXT_SELECT_K,
+                                                                token_budget=CONTEXT_TOKEN_BUDGET,
+                                                                lambda_mult=CONTEXT_MMR_LAMBDA, baseline_k=RETRIEVAL_K)
+                        ctx_report["ricerca"] = modo
+                        RETRIEVAL_CACHE.store(q_aug, (blocks, ctx_report), scope=ctx_scope,
+                                              vector=q_vec if RETRIEVAL_CACHE.mode == "semantic" else None)
+                    else:
+                        blocks, ctx_report = cached
+                context = "\n".join(ctxb.format_block(b) for b in blocks) or "Nessuna fonte specifica trovata."
 
                 # PROMPT SYSTEM AGGIORNATO CON REGOLE STRATEGICHE
                 ISTRUZIONI = f"""
@@ -408,49 +534,58 @@ if prompt := st.chat_input("Scrivi qui la tua richiesta..."):
                    - Se "Educazione Alimentare": Niente grammi precisi, usa "porzioni" o "piatto sano".
                 """
                 
-                resp = client.models.generate_content(
-                    model="gemini-flash-latest",
-                    contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
-                    config=types.GenerateContentConfig(system_instruction=ISTRUZIONI, temperature=0.3)
-                )
-                
-                # Risposta Testuale
-                st.markdown(resp.text)
-                st.session_state.messages.append({"role": "assistant", "content": resp.text})
-                
-                # --- PULSANTI AZIONE ---
-                st.markdown("---")
-                btn_col1, btn_col2 = st.columns([1, 1])
-                
-                # Tasto 1: PDF
-                with btn_col1:
-                    pdf = crea_pdf_html(PROFILO, resp.text)
-                    if pdf:
-                        st.download_button("🖨️ Scarica PDF", data=pdf, file_name="Piano.pdf", mime="application/pdf", key=f"pdf_{len(st.session_state.messages)}")
-                
-                # Tasto 2: EXPORT TO MEAL PLANNER
-                with btn_col2:
-                    if st.button("📤 Esporta nel Meal Planner", key=f"exp_{len(st.session_state.messages)}"):
-                        with st.spinner("Elaborazione dati..."):
-                            json_plan = estrai_piano_in_json(resp.text)
+                # Cache di generazione: stessa domanda, stesso paziente, stesse fonti e config
+                chunk_ids = [b["ids"] for b in blocks]
+                gen_scope = stable_hash(stable_hash(PROFILO), chunk_ids, {"model": CHAT_MODEL, "temperature": CHAT_TEMPERATURE})
+                risposta, p_vec = GENERATION_CACHE.lookup(prompt, scope=gen_scope)
+
+            # Risposta Testuale: in streaming, il Markdown si aggiorna man mano
+            if risposta is None:
+                timing = {}
+                risposta = st.write_stream(genera_risposta_stream(prompt, ISTRUZIONI, timing))
+                GENERATION_CACHE.store(prompt, risposta, scope=gen_scope, vector=p_vec)
+            else:
+                timing = {"cache": True}
+                st.markdown(risposta)
+            if ctx_report:
+                timing["contesto"] = ctx_report
+            st.caption(formatta_timing(timing))
+            st.session_state.messages.append({"role": "assistant", "content": risposta, "timing": timing})
+            mpl.save_chat_messages(st.session_state.messages)
+            
+            # --- PULSANTI AZIONE ---
+            st.markdown("---")
+            btn_col1, btn_col2 = st.columns([1, 1])
+            
+            # Tasto 1: PDF
+            with btn_col1:
+                # PDF pigro: pisa gira solo su richiesta, mai durante la risposta
+                pulsante_pdf(len(st.session_state.messages) - 1, PROFILO, risposta)
+            
+            # Tasto 2: EXPORT TO MEAL PLANNER
+            with btn_col2:
+                if st.button("📤 Esporta nel Meal Planner", key=f"exp_{len(st.session_state.messages)}"):
+                    with st.spinner("Elaborazione dati..."):
+                        json_plan = estrai_piano_in_json(risposta)
+                        
+                        if json_plan:
+                            # Chiamata alla logica
+                            count, logs = mpl.import_ai_plan_to_state(json_plan)
+                            mpl.persist_plan()
                             
-                            if json_plan:
-                                # Chiamata alla logica
-                                count, logs = mpl.import_ai_plan_to_state(json_plan)
-                                
-                                # Visualizzazione Logs Debug
-                                with st.expander(f"📝 Dettaglio Importazione ({count} aggiunti)", expanded=True):
-                                    for log in logs:
-                                        if "❌" in log: st.error(log)
-                                        elif "⚠️" in log: st.warning(log)
-                                        else: st.success(log)
-                                
-                                if count > 0:
-                                    st.toast(f"✅ {count} alimenti aggiunti!", icon="🥗")
-                                else:
-                                    st.error("Nessun match trovato nel DB.")
+                            # Visualizzazione Logs Debug
+                            with st.expander(f"📝 Dettaglio Importazione ({count} aggiunti)", expanded=True):
+                                for log in logs:
+                                    if "❌" in log: st.error(log)
+                                    elif "⚠️" in log: st.warning(log)
+                                    else: st.success(log)
+                            
+                            if count > 0:
+                                st.toast(f"✅ {count} alimenti aggiunti!", icon="🥗")
                             else:
-                                st.error("Errore: L'AI non ha generato dati leggibili.")
+                                st.error("Nessun match trovato nel DB.")
+                        else:
+                            st.error("Errore: L'AI non ha generato dati leggibili.")
 
-            except Exception as e:
-                st.error(f"Errore generale: {e}")
+        except Exception as e:
+            st.error(f"Errore generale: {e}")
@@ -0,0 +1,234 @@
+"""
+Import e valutazione in blocco dei piani AI, da riga di comando (senza Streamlit).
+
+Legge piani nel formato di estrai_piano_in_json (liste di righe
+{"day", "meal", "food", "grams"}) da una cartella (*.json, *.jsonl), da
+singoli file o da uno stream JSONL su stdin ("-"), e per ognuno esegue lo
+stesso matching e gli stessi totali di "Esporta nel Meal Planner".
+
+I piani sono distribuiti su un pool di processi: ogni worker carica il DB
+alimenti e l'indice dei nomi una sola volta (initializer), poi riceve solo
+le righe dei piani. Il throughput cresce con i core.
+
+Formato dei piani:
+  - file .json: una lista di righe, oppure {"id": ..., "plan": [...]}
+  - file .jsonl / stdin: un piano per riga, nello stesso formato
+  id del piano: campo "id", altrimenti nome del file (e numero di riga per i JSONL)
+
+Uscite nella cartella --out (Parquet se pyarrow è installato, altrimenti JSONL):
+  - piani:       una riga per piano (righe, aggiunti, non trovati, medie giornaliere)
+  - totali:      una riga per piano e giorno con i NUMERIC_COLS
+  - match:       una riga per alimento del piano (query, alimento del DB, confidenza, stato)
+  - non_trovati: alimenti non riconosciuti sull'intero lotto, con occorrenze e piani
+
+Uso (dalla root del progetto):
+    python batch_plans.py piani_ai/ --out risultati/
+    cat piani.jsonl | python batch_plans.py - --out risultati/ --workers 8
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import planner_core as core
+
+OUTPUT_TABLES = ("piani", "totali", "match", "non_trovati")
+
+# --- 1. LETTURA DEI PIANI ---
+
+def _plan_record(data, default_id):
+    """(id, righe) da una lista di righe o da un oggetto {"id", "plan"}."""
+    if isinstance(data, dict):
+        items = data.get("plan", data.get("piano"))
+        return str(data.get("id", default_id)), items
+    return default_id, data
+
+def _read_jsonl(lines, source):
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        default_id = f"{source}:{number}"
+        try:
+            yield _plan_record(json.loads(line), default_id)
+        except json.JSONDecodeError as e:
+            yield default_id, f"JSON non valido: {e}"
+
+def iter_plans(sources):
+    """
+    Genera (id, righe) per ogni piano delle sorgenti (cartelle, file, "-").
+    Se un piano non si legge, al posto delle righe c'è il messaggio d'errore.
+    """
+    for source in sources:
+        if source == "-":
+            yield from _read_jsonl(sys.stdin, "stdin")
+            continue
+        if os.path.isdir(source):
+            paths = sorted(glob.glob(os.path.join(source, "*.json")) + glob.glob(os.path.join(source, "*.jsonl")))
+        else:
+            paths = [source]
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            with open(path, encoding="utf-8") as fp:
+                if path.endswith(".jsonl"):
+                    yield from _read_jsonl(fp, name)
+                    continue
+                try:
+                    yield _plan_record(json.load(fp), name)
+                except json.JSONDecodeError as e:
+                    yield name, f"JSON non valido: {e}"
+
+# --- 2. WORKER ---
+
+# DB e indice di ricerca del processo (caricati una volta dall'initializer)
+_WORKER = {}
+
+def init_worker(csv_path=core.CSV_DB_PATH, cache_dir=core.FOOD_DB_CACHE_DIR):
+    db_df = core.load_food_db(csv_path, cache_dir)
+    core.get_food_search_index(db_df)
+    core.get_nutrient_matrix(db_df)
+    _WORKER["db"] = db_df
+
+def process_plan(job):
+    """
+    Importa un piano in un WeeklyPlan nuovo e ne calcola i totali.
+    Restituisce {"piano": riepilogo, "totali": [righe], "match": [righe]}.
+    """
+    plan_id, items = job
+    summary = {"piano": plan_id, "righe": 0, "aggiunti": 0, "non_trovati": 0,
+               "giorni_non_riconosciuti": 0, "giorni_compilati": 0, "errore": None}
+    if isinstance(items, str) or not isinstance(items, list):
+        summary["errore"] = items if isinstance(items, str) else "Formato del piano non valido"
+        return {"piano": summary, "totali": [], "match": []}
+
+    db_df = _WORKER["db"]
+    items = [item for item in items if isinstance(item, dict)]
+    summary["righe"] = len(items)
+    try:
+        matches = core.match_ai_plan(db_df, items)
+        plan = core.new_plan(db_df)
+        summary["aggiunti"] = core.add_matches_to_plan(plan, matches)
+    except Exception as e:
+        # Un piano malformato (righe con tipi inattesi, grammi non numerici...)
+        # resta registrato come errore e non ferma il lotto
+        summary["errore"] = f"Errore import: {type(e).__name__}: {e}"
+        return {"piano": summary, "totali": [], "match": []}
+    summary["non_trovati"] = sum(m["stato"] == "non_trovato" for m in matches)
+    summary["giorni_non_riconosciuti"] = sum(m["stato"] == "giorno" for m in matches)
+
+    # Medie sui soli giorni con almeno un alimento, come week_analytics
+    week = plan.week_totals()
+    filled = np.bincount(plan.day[:len(plan)], minlength=plan.n_days) > 0
+    summary["giorni_compilati"] = int(filled.sum())
+    means = week[filled].mean(axis=0) if filled.any() else np.zeros(len(core.NUMERIC_COLS))
+    for n, nutrient in enumerate(core.NUMERIC_COLS):
+        summary[f"{nutrient}_media"] = round(float(means[n]), 1)
+
+    totals = [{"piano": plan_id, "giorno": day, **{k: round(float(v), 1) for k, v in zip(core.NUMERIC_COLS, week[d])}}
+              for d, day in enumerate(core.DAYS_OF_WEEK) if filled[d]]
+    match_rows = [{"piano": plan_id, "giorno": m["giorno"], "giorno_ai": m["day"], "pasto": m["pasto"], "query": m["food"],
+                   "grammi": m["grams"], "alimento": m["nome"], "confidenza": m["confidenza"], "stato": m["stato"]}
+                  for m in matches]
+    return {"piano": summary, "totali": totals, "match": match_rows}
+
+# --- 3. ESECUZIONE E SCRITTURA ---
+
+def run_batch(jobs, workers=None, csv_path=core.CSV_DB_PATH, chunksize=4):
+    """
+    Elabora i piani (iterabile di (id, righe)) sul pool di processi e
+    restituisce le tabelle di OUTPUT_TABLES come DataFrame.
+    workers=1: tutto nel processo corrente (utile per il debug).
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        init_worker(csv_path)
+        results = map(process_plan, jobs)
+        return _collect(results)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(csv_path,)) as pool:
+        return _collect(pool.map(process_plan, jobs, chunksize=chunksize))
+
+def _collect(results):
+    summaries, totals, matches = [], [], []
+    for result in results:
+        summaries.append(result["piano"])
+        totals.extend(result["totali"])
+        matches.extend(result["match"])
+
+    match_df = pd.DataFrame(matches, columns=["piano", "giorno", "giorno_ai", "pasto", "query", "grammi",
+                                              "alimento", "confidenza", "stato"])
+    match_df["grammi"] = pd.to_numeric(match_df["grammi"], errors="coerce")
+    missing = match_df[match_df["stato"] == "non_trovato"]
+    missing = (missing.assign(query_norm=missing["query"].astype(str).str.strip().str.lower())
+               .groupby("query_norm")
+               .agg(occorrenze=("piano", "size"), piani=("piano", "nunique"), esempio=("query", "first"))
+               .sort_values("occorrenze", ascending=False)
+               .reset_index()
+               .rename(columns={"query_norm": "query"}))
+    return {
+        "piani": pd.DataFrame(summaries),
+        "totali": pd.DataFrame(totals, columns=["piano", "giorno"] + core.NUMERIC_COLS),
+        "match": match_df,
+        "non_trovati": missing,
+    }
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def write_tables(tables, out_dir, fmt="auto"):
+    """Scrive le tabelle in out_dir (Parquet o JSONL); restituisce i percorsi."""
+    if fmt == "auto":
+        fmt = "parquet" if _has_pyarrow() else "jsonl"
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name in OUTPUT_TABLES:
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        if fmt == "parquet":
+            tables[name].to_parquet(path, index=False)
+        else:
+            tables[name].to_json(path, orient="records", lines=True, force_ascii=False)
+        paths.append(path)
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("sources", nargs="+", help="Cartelle, file .json/.jsonl o '-' per JSONL da stdin")
+    parser.add_argument("--out", required=True, help="Cartella delle tabelle di uscita")
+    parser.add_argument("--format", choices=["auto", "parquet", "jsonl"], default="auto")
+    parser.add_argument("--workers", type=int, default=None, help="Processi (default: tutti i core)")
+    parser.add_argument("--chunksize", type=int, default=4, help="Piani inviati a ogni worker per volta")
+    parser.add_argument("--db", default=core.CSV_DB_PATH, help="CSV del database alimenti")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    try:
+        tables = run_batch(iter_plans(args.sources), args.workers, args.db, args.chunksize)
+    except FileNotFoundError as e:
+        print(f"Errore: {e}", file=sys.stderr)
+        return 2
+    paths = write_tables(tables, args.out, args.format)
+    elapsed = time.perf_counter() - t0
+
+    summary = tables["piani"]
+    n_plans = len(summary)
+    errors = int(summary["errore"].notna().sum()) if n_plans else 0
+    added = int(summary["aggiunti"].sum()) if n_plans else 0
+    rows = int(summary["righe"].sum()) if n_plans else 0
+    print(f"{n_plans} piani ({errors} con errori), {added}/{rows} alimenti riconosciuti, "
+          f"{len(tables['non_trovati'])} alimenti distinti non trovati")
+    print(f"{elapsed:.1f} s ({n_plans / elapsed:.1f} piani/s)" if elapsed else "")
+    for path in paths:
+        print(f"  {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Benchmark: caricamento a freddo del DB alimenti (CSV vs snapshot colonnare).
+
+Ogni misura gira in un processo Python nuovo, così da riprodurre l'avvio di
+un worker: si misurano tempo di caricamento e crescita della RSS.
+
+Uso (dalla root del progetto):
+    python benchmarks/bench_food_db.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Codice eseguito nel processo figlio: importa solo pandas/numpy e il modulo
+# snapshot (niente Streamlit), poi misura il caricamento richiesto.
+_CHILD = r"""
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import numpy, pandas
+import food_snapshot
+COLUMN_MAPPING = {mapping!r}
+NUMERIC_COLS = {numeric!r}
+
+def rss_kb():
+    with open("/proc/self/status") as fp:
+        for line in fp:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+before = rss_kb()
+t0 = time.perf_counter()
+if {mode!r} == "csv":
+    df = pandas.read_csv({csv!r})
+    cols = list(set(COLUMN_MAPPING).intersection(df.columns))
+    df = df[cols].rename(columns=COLUMN_MAPPING)
+    for col in NUMERIC_COLS:
+        df[col] = pandas.to_numeric(df[col], errors="coerce").fillna(0)
+else:
+    df = food_snapshot.load_food_table({csv!r}, {cache!r}, COLUMN_MAPPING, NUMERIC_COLS)
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "rss_delta_kb": rss_kb() - before, "rows": len(df)}}))
+"""
+
+
+def _run_child(mode, csv_path, cache_dir, mapping, numeric):
+    code = _CHILD.format(root=ROOT, mapping=mapping, numeric=numeric, mode=mode, csv=csv_path, cache=cache_dir)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    import meal_planner_logic as mpl
+    import food_snapshot
+
+    csv_path = os.path.join(ROOT, mpl.CSV_DB_PATH)
+    cache_dir = os.path.join(ROOT, mpl.FOOD_DB_CACHE_DIR)
+    mapping, numeric = dict(mpl.COLUMN_MAPPING), list(mpl.NUMERIC_COLS)
+
+    # Lo snapshot va compilato una volta: è il costo "una tantum" del deploy
+    food_snapshot.build_snapshot(csv_path, cache_dir, mapping, numeric)
+
+    print(f"{'modalità':<10} {'p50 ms':>9} {'max ms':>9} {'RSS +KB':>9}")
+    for mode in ("csv", "snapshot"):
+        runs = [_run_child(mode, csv_path, cache_dir, mapping, numeric) for _ in range(args.runs)]
+        times = [r["seconds"] * 1000 for r in runs]
+        rss = statistics.median(r["rss_delta_kb"] for r in runs)
+        print(f"{mode:<10} {statistics.median(times):>9.2f} {max(times):>9.2f} {rss:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Benchmark dei percorsi critici del Meal Planner e del retrieval.
+
+Gira offline: session state di Streamlit e client Gemini sono stub
+(harness.install_stubs), i piani AI e i PDF sono sintetici (synthetic.py),
+gli embedding dell'indice sono quelli locali "hashing". Per ogni operazione
+riporta p50/p95, throughput (elementi/s) e picco di memoria Python.
+
+Uso (dalla root del progetto):
+    python benchmarks/bench_hot_paths.py                          # misura e confronta con la baseline
+    python benchmarks/bench_hot_paths.py --save-baseline          # registra la baseline di questa macchina
+    python benchmarks/bench_hot_paths.py --sizes 50,500 --only import
+
+Esce con codice 1 se un p50 peggiora oltre la tolleranza rispetto alla baseline.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness
+import synthetic
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+QUERIES = ["fabbisogno di potassio nell'insufficienza renale", "celiachia e cereali senza glutine",
+           "omega-3 e dislipidemia", "sodio e ipertensione", "fibre nella sindrome dell'intestino irritabile",
+           "calcio in menopausa", "ferro in gravidanza", "carboidrati complessi nello sport di resistenza"]
+
+
+def bench_planner(results, sizes, repeats, only):
+    import ai_plan_parser
+    import meal_planner_logic as mpl
+    from pdf_report import crea_pdf_html
+
+    state = harness.install_stubs()
+
+    def run(name, fn, **kwargs):
+        if only and only not in name:
+            return
+        results[name] = harness.measure(fn, **kwargs)
+        print(f"  {name}: p50 {results[name]['p50_ms']:.3f} ms", flush=True)
+
+    # Caricamento: ogni ripetizione svuota la cache di st.cache_data (lettura dello snapshot)
+    run("load_food_db", mpl.load_food_db, setup=mpl.load_food_db.clear, repeats=repeats)
+    db = mpl.load_food_db()
+    names = db["Nome"].tolist()
+    mpl.get_food_search_index(db)
+
+    queries = [p["food"] for p in synthetic.synthetic_ai_plan(200, names, seed=1)]
+    run("find_closest_food_match", lambda: [mpl.find_closest_food_match(q, db) for q in queries],
+        repeats=max(3, repeats // 4), items=len(queries))
+
+    def fresh_plan():
+        state.pop("weekly_plan", None)
+        state.pop("_meal_frames", None)
+        mpl.get_food_search_index(db).clear_match_cache()  # import a freddo, come per un piano nuovo
+
+    for n in sizes:
+        plan = synthetic.synthetic_ai_plan(n, names, seed=n)
+        text = synthetic.plan_markdown(plan)
+        run(f"parse_plan_tables[{n}]", lambda t=text: ai_plan_parser.parse_plan_tables(t),
+            repeats=repeats, items=n)
+        run(f"import_ai_plan_to_state[{n}]", lambda p=plan: mpl.import_ai_plan_to_state(p),
+            setup=fresh_plan, repeats=max(3, repeats // (1 + n // 500)), items=n)
+
+    # Operazioni interattive su un piano già pieno (500 alimenti)
+    fresh_plan()
+    mpl.import_ai_plan_to_state(synthetic.synthetic_ai_plan(500, names, seed=7))
+    row = db.iloc[0]
+    run("add_food_to_meal", lambda: mpl.add_food_to_meal("Mercoledì", "Pranzo", row, 80), repeats=repeats * 5)
+
+    # Delta del data_editor (come nel callback on_change): grammi di tutte le righe di un pasto
+    edited = {"ids": [], "delta": {}, "factor": 1.0}
+
+    def edit_setup():
+        edited["factor"] = 1.1 if edited["factor"] != 1.1 else 0.9
+        df = mpl.get_meal_items_df("Martedì", "Cena")
+        edited["ids"] = df["ID"].tolist()
+        edited["delta"] = {"edited_rows": {n: {"Grammi": g * edited["factor"]} for n, g in enumerate(df["Grammi"])}}
+
+    run("apply_editor_delta", lambda: mpl.core.apply_editor_delta(mpl.get_plan("Martedì"), edited["delta"], edited["ids"]),
+        setup=edit_setup, repeats=repeats * 5)
+
+    # Dopo una modifica (totali da ricalcolare), come a ogni rerun della pagina
+    plan_obj = mpl.get_plan()
+    touched = {"g": 100.0}
+
+    def touch():
+        touched["g"] = 110.0 if touched["g"] == 100.0 else 100.0
+        plan_obj.set_grams(plan_obj.item_id[0], touched["g"])
+
+    run("calculate_daily_totals", lambda: mpl.calculate_daily_totals("Lunedì"), setup=touch, repeats=repeats * 5)
+
+    # Archivio dei piani: salvataggio di un giorno modificato e ripresa del piano (SQLite temporaneo)
+    import plan_storage
+    store_dir = tempfile.mkdtemp(prefix="bench_store_")
+    try:
+        store = plan_storage.PlanStore(plan_storage.SQLiteBackend(os.path.join(store_dir, "plans.sqlite")),
+                                       db["Codice"].tolist(), flush_interval=0)
+        stored = store.open("bench", plan=plan_obj)
+        store.sync(stored)
+        run("plan_storage_sync_day", lambda: store.sync(stored), setup=touch, repeats=repeats * 5)
+        run("plan_storage_load_week",
+            lambda: store.load_days(store.open("bench", nutrients=plan_obj.nutrients)), repeats=repeats)
+        store.close()
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+    analysis = mpl.week_analytics("Donna", 40, 65)
+    report_md = "## Analisi Settimanale\n\n" + mpl.week_analytics_markdown(analysis)
+    report_md += "\n\n" + synthetic.plan_markdown(synthetic.synthetic_ai_plan(35, names, seed=3))
+    profile = "Paziente: Donna, 40 anni, 65kg, 165cm.\nRegime: Onnivora."
+    run("crea_pdf_html", lambda: crea_pdf_html(profile, report_md, data_report="01/01/2026"),
+        repeats=max(3, repeats // 4))
+
+
+def bench_retrieval(results, pdf_docs, repeats, only):
+    if only and only not in "sync_index retrieve build_context":
+        return
+    import context_builder as ctxb
+    import knowledge_index as kidx
+    from lexical_index import BM25Index
+
+    work = tempfile.mkdtemp(prefix="bench_rag_")
+    cwd = os.getcwd()
+    try:
+        docs_dir = os.path.join(work, "documenti")
+        index_dir = os.path.join(work, "indice")
+        synthetic.write_pdf_corpus(docs_dir, n_docs=pdf_docs, pages=4)
+        os.chdir(work)  # la cache del testo estratto finisce nella cartella temporanea
+
+        def cold():
+            shutil.rmtree(index_dir, ignore_errors=True)
+            shutil.rmtree(os.path.join(work, ".pdf_text_cache"), ignore_errors=True)
+
+        results[f"sync_index[{pdf_docs} pdf]"] = harness.measure(
+            lambda: kidx.sync_index(docs_dir, index_dir, provider="hashing", max_workers=2),
+            setup=cold, repeats=3, items=pdf_docs)
+        print(f"  sync_index: p50 {results[f'sync_index[{pdf_docs} pdf]']['p50_ms']:.1f} ms", flush=True)
+
+        cold()
+        vector_store, _, _ = kidx.sync_index(docs_dir, index_dir, provider="hashing", max_workers=2)
+        lexical = BM25Index.load(index_dir)
+        for mode in ("lexical", "hybrid"):
+            name = f"retrieve[{mode}]"
+            results[name] = harness.measure(
+                lambda m=mode: [kidx.retrieve(q, ctxb.DEFAULT_FETCH_K, vector_store, lexical, mode=m) for q in QUERIES],
+                repeats=repeats, items=len(QUERIES))
+            print(f"  {name}: p50 {results[name]['p50_ms']:.3f} ms", flush=True)
+
+        prepared = [kidx.retrieve(q, ctxb.DEFAULT_FETCH_K, vector_store, lexical, mode="hybrid") for q in QUERIES]
+        results["build_context"] = harness.measure(
+            lambda: [ctxb.build_context(qvec, cands) for cands, qvec, _ in prepared],
+            repeats=repeats, items=len(QUERIES))
+        print(f"  build_context: p50 {results['build_context']['p50_ms']:.3f} ms", flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="50,500,5000", help="Dimensioni dei piani AI sintetici (alimenti)")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--pdf-docs", type=int, default=12, help="PDF del corpus sintetico")
+    parser.add_argument("--only", default="", help="Solo le operazioni che contengono questo testo")
+    parser.add_argument("--out", help="Salva i risultati in questo JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Registra i risultati come nuova baseline")
+    parser.add_argument("--tolerance", type=float, default=harness.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = {}
+    print("Meal Planner:")
+    bench_planner(results, sizes, args.repeats, args.only)
+    print("Retrieval:")
+    bench_retrieval(results, args.pdf_docs, args.repeats, args.only)
+
+    print()
+    print(harness.format_table(results))
+    if args.out:
+        harness.save_results(args.out, results)
+    if args.save_baseline:
+        harness.save_results(args.baseline, results)
+        print(f"\nBaseline salvata in {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("\nNessuna baseline: usa --save-baseline per registrarla.")
+        return 0
+
+    rows = harness.compare(results, harness.load_results(args.baseline), args.tolerance)
+    print(f"\nConfronto con {args.baseline} (tolleranza +{args.tolerance:.0%} sul p50):")
+    for name, base, now, change, regression in rows:
+        print(f"  {'REGRESSIONE' if regression else 'ok':<12} {name:<42} {base:>10.3f} -> {now:>10.3f} ms ({change:+.0%})")
+    return 1 if any(r[4] for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
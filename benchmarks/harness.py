@@ -0,0 +1,173 @@
+"""
+Strumenti comuni dei benchmark: stub di Streamlit e Gemini, misure, baseline.
+
+  - install_stubs(): session state di Streamlit sostituito da un dict (niente
+    runtime, niente avvisi) e client Gemini finto, così nessuna misura passa
+    dalla rete
+  - measure(): p50/p95 su più ripetizioni, throughput e picco di memoria
+    (tracemalloc, in un'esecuzione separata per non falsare i tempi)
+  - save_results() / load_results() / compare(): baseline JSON e confronto
+"""
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DEFAULT_TOLERANCE = 0.30  # +30% sul p50 = regressione
+MIN_DELTA_MS = 1.0        # sotto questa differenza assoluta è rumore di misura
+
+
+class StubSessionState(dict):
+    """st.session_state senza runtime: dict con accesso anche per attributo."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError as exc:
+            raise AttributeError(name) from exc
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        del self[name]
+
+
+class _FakeStream:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModels:
+    """Risposte fisse al posto di Gemini (nessuna chiamata di rete)."""
+
+    reply = "| Giorno | Pasto | Alimenti |\n|---|---|---|\n| Lunedì | Colazione | Fiocchi d'avena 40g |"
+
+    def generate_content(self, *args, **kwargs):
+        return _FakeStream(self.reply)
+
+    def generate_content_stream(self, *args, **kwargs):
+        for start in range(0, len(self.reply), 32):
+            yield _FakeStream(self.reply[start:start + 32])
+
+
+class FakeGeminiClient:
+    def __init__(self, *args, **kwargs):
+        self.models = _FakeModels()
+
+
+def install_stubs():
+    """Da chiamare prima di usare i moduli dell'app (percorsi relativi alla root del progetto)."""
+    os.chdir(ROOT)
+    import streamlit as st
+    from streamlit import logger as st_logger
+    st_logger.set_log_level(logging.ERROR)  # niente avvisi "No runtime found" a ogni chiamata
+    logging.getLogger("xhtml2pdf").setLevel(logging.ERROR)
+    st.session_state = StubSessionState()
+    try:
+        from google import genai
+        genai.Client = FakeGeminiClient
+    except ImportError:
+        pass
+    os.environ.pop("GOOGLE_API_KEY", None)
+    return st.session_state
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    pos = (len(ordered) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def measure(fn, repeats=20, setup=None, items=1, warmup=1):
+    """
+    Esegue fn() `repeats` volte (setup() prima di ognuna, fuori dal tempo).
+    items: elementi elaborati per chiamata (per il throughput).
+    Restituisce {"runs", "p50_ms", "p95_ms", "media_ms", "items", "items_s", "picco_kb"}.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    times = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50 = _percentile(times, 0.5)
+    mean = statistics.fmean(times)
+    return {
+        "runs": repeats,
+        "p50_ms": round(p50 * 1000, 4),
+        "p95_ms": round(_percentile(times, 0.95) * 1000, 4),
+        "media_ms": round(mean * 1000, 4),
+        "items": items,
+        "items_s": round(items / mean, 1) if mean else None,
+        "picco_kb": round(peak / 1024, 1),
+    }
+
+
+def environment():
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpu": os.cpu_count()}
+
+
+def save_results(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump({"ambiente": environment(), "risultati": results}, fp, indent=2, ensure_ascii=False)
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as fp:
+        return json.load(fp)["risultati"]
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Confronto del p50 con la baseline: lista di (operazione, base_ms, ora_ms,
+    variazione, regressione). Le operazioni nuove o scomparse si ignorano;
+    differenze sotto MIN_DELTA_MS non contano come regressione.
+    """
+    rows = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        change = current["p50_ms"] / base["p50_ms"] - 1
+        regression = change > tolerance and current["p50_ms"] - base["p50_ms"] > MIN_DELTA_MS
+        rows.append((name, base["p50_ms"], current["p50_ms"], change, regression))
+    return rows
+
+
+def format_table(results):
+    lines = [f"{'operazione':<42} {'p50 ms':>10} {'p95 ms':>10} {'item/s':>12} {'picco KB':>10}"]
+    for name, r in results.items():
+        items_s = f"{r['items_s']:.0f}" if r.get("items_s") else "-"
+        lines.append(f"{name:<42} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {items_s:>12} {r['picco_kb']:>10.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,92 @@
+"""
+Dati sintetici e riproducibili (seed) per i benchmark.
+
+  - synthetic_ai_plan(): righe {"day", "meal", "food", "grams"} come quelle
+    estratte dalle risposte dell'AI, con i nomi "sporcati" come li scrive il
+    modello (minuscolo, parole mancanti, sinonimi inglesi, refusi) e una
+    quota di alimenti inesistenti
+  - plan_markdown(): la stessa lista come tabella Markdown (parser locale)
+  - write_pdf_corpus(): PDF di testo clinico-nutrizionale generati con
+    reportlab (dipendenza di xhtml2pdf), per indicizzazione e retrieval
+"""
+import os
+import random
+
+DAYS = ["Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato", "Domenica"]
+MEALS = ["Colazione", "Spuntino Mattina", "Pranzo", "Spuntino Pomeriggio", "Cena"]
+ENGLISH = {"Pollo": "chicken", "Riso": "rice", "Mele": "apple", "Salmone": "salmon", "Latte": "milk",
+           "Pane": "bread", "Uova": "eggs", "Tonno": "tuna", "Patate": "potatoes", "Carote": "carrots"}
+UNKNOWN = ["Bistecca di seitan marinata", "Porridge proteico al cacao", "Smoothie verde detox",
+           "Barretta energetica fatta in casa", "Bowl di poke al salmone"]
+
+TOPICS = ["celiachia", "diabete di tipo 2", "insufficienza renale", "ipertensione", "dislipidemia",
+          "gravidanza", "menopausa", "sindrome dell'intestino irritabile", "low-fodmap", "sport di resistenza"]
+NUTRIENTS = ["potassio", "sodio", "fosforo", "calcio", "ferro", "fibre", "proteine", "carboidrati complessi",
+             "acidi grassi omega-3", "vitamina B12", "vitamina D", "zuccheri semplici"]
+FOODS = ["legumi", "cereali integrali", "pesce azzurro", "verdure a foglia verde", "frutta fresca",
+         "latticini magri", "frutta secca", "olio extravergine di oliva", "carni bianche", "uova"]
+VERBS = ["è consigliato aumentare", "si raccomanda di limitare", "è opportuno monitorare",
+         "le linee guida suggeriscono di distribuire", "occorre valutare con attenzione"]
+
+
+def _dirty(name, rng):
+    """Nome come lo scriverebbe il modello."""
+    words = name.replace(",", "").split()
+    choice = rng.random()
+    if choice < 0.25 and words[0] in ENGLISH:
+        return ENGLISH[words[0]]
+    if choice < 0.5:
+        return " ".join(words[:max(1, len(words) - 2)]).lower()
+    if choice < 0.65 and len(words[0]) > 4:
+        i = rng.randrange(1, len(words[0]) - 1)
+        return (words[0][:i] + words[0][i + 1:] + " " + " ".join(words[1:])).strip().lower()
+    return name.split(",")[0]
+
+
+def synthetic_ai_plan(n_items, food_names, seed=0, unknown_rate=0.05):
+    rng = random.Random(seed)
+    plan = []
+    for i in range(n_items):
+        if rng.random() < unknown_rate:
+            food = rng.choice(UNKNOWN)
+        else:
+            food = _dirty(rng.choice(food_names), rng)
+        plan.append({"day": DAYS[(i // len(MEALS)) % len(DAYS)], "meal": MEALS[i % len(MEALS)],
+                     "food": food, "grams": rng.choice([30, 50, 80, 100, 120, 150, 200])})
+    return plan
+
+
+def plan_markdown(plan):
+    lines = ["| Giorno | Pasto | Alimento | Grammi |", "|---|---|---|---|"]
+    lines += [f"| {p['day']} | {p['meal']} | {p['food']} | {p['grams']} g |" for p in plan]
+    return "\n".join(lines)
+
+
+def _sentence(rng):
+    return (f"Nei pazienti con {rng.choice(TOPICS)} {rng.choice(VERBS)} l'apporto di {rng.choice(NUTRIENTS)}, "
+            f"privilegiando {rng.choice(FOODS)} e {rng.choice(FOODS)} nell'arco della giornata.")
+
+
+def write_pdf_corpus(out_dir, n_docs=10, pages=4, seed=0):
+    """Scrive n_docs PDF di `pages` pagine in out_dir; restituisce i percorsi."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for doc in range(n_docs):
+        path = os.path.join(out_dir, f"linee_guida_{doc:03d}.pdf")
+        pdf = canvas.Canvas(path, pagesize=A4)
+        for _ in range(pages):
+            text = pdf.beginText(40, 800)
+            text.setFont("Helvetica", 9)
+            for _ in range(60):
+                line = _sentence(rng)
+                text.textLine(line[:110])
+                text.textLine(line[110:])
+            pdf.drawText(text)
+            pdf.showPage()
+        pdf.save()
+        paths.append(path)
+    return paths
@@ -0,0 +1,161 @@
+"""
+Costruzione del contesto RAG tra la ricerca vettoriale e il prompt.
+
+Dai candidati restituiti dall'indice (più numerosi dei chunk che finiranno
+nel prompt):
+  1. scarta i duplicati esatti
+  2. sceglie i chunk con MMR (rilevanza per la domanda, penalità per i chunk
+     troppo simili a quelli già scelti)
+  3. unisce i chunk consecutivi dello stesso PDF eliminando la sovrapposizione
+     del text splitter (almeno MIN_OVERLAP caratteri, al più MAX_OVERLAP)
+  4. rispetta un budget di token, in ordine di rilevanza
+
+I token sono stimati (caratteri / CHARS_PER_TOKEN): non serve un tokenizer
+per confrontare le dimensioni del prompt prima e dopo.
+"""
+import numpy as np
+
+CHARS_PER_TOKEN = 4
+DEFAULT_FETCH_K = 20
+DEFAULT_SELECT_K = 6
+DEFAULT_TOKEN_BUDGET = 2000
+DEFAULT_MMR_LAMBDA = 0.7
+# Sovrapposizione del text splitter tra chunk consecutivi: fino a
+# knowledge_index.CHUNK_OVERLAP (200) caratteri, ma il taglio cade su un
+# separatore e può essere più corto. Sotto MIN_OVERLAP una coincidenza tra
+# fine e inizio (uno spazio, un punto, una parola ripetuta) non è
+# sovrapposizione: i chunk si uniscono per intero con CHUNK_JOINER.
+MAX_OVERLAP = 400
+MIN_OVERLAP = 20
+CHUNK_JOINER = "\n"
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def mmr_select(query_vector, vectors, k, lambda_mult=DEFAULT_MMR_LAMBDA):
+    """
+    Maximal Marginal Relevance sui vettori (coseno). Restituisce gli indici
+    scelti, in ordine di selezione.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) == 0:
+        return []
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1)
+
+    relevance = vectors @ query
+    selected = [int(np.argmax(relevance))]
+    max_sim = vectors @ vectors[selected[0]]
+    while len(selected) < min(k, len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_sim
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        max_sim = np.maximum(max_sim, vectors @ vectors[best])
+    return selected
+
+
+def _overlap(left, right, limit=MAX_OVERLAP, minimum=MIN_OVERLAP):
+    """
+    Lunghezza del più lungo suffisso di `left` che è anche prefisso di
+    `right`, se almeno `minimum` caratteri; altrimenti 0.
+    """
+    for size in range(min(limit, len(left), len(right)), minimum - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_adjacent(chunks):
+    """
+    chunks: lista di dict {"id", "source", "chunk", "text"} in ordine di rilevanza.
+    I chunk consecutivi (indice n, n+1) dello stesso PDF diventano un unico
+    blocco {"ids", "source", "chunks", "text"}; i blocchi restano ordinati
+    per la rilevanza del loro chunk migliore.
+    """
+    rank = {id(c): i for i, c in enumerate(chunks)}
+    by_source = {}
+    for chunk in chunks:
+        by_source.setdefault(chunk["source"], []).append(chunk)
+
+    blocks = []
+    for source, items in by_source.items():
+        items.sort(key=lambda c: (c["chunk"] is None, c["chunk"] if c["chunk"] is not None else 0))
+        current = None
+        for chunk in items:
+            adjacent = (current is not None and chunk["chunk"] is not None
+                        and current["chunks"][-1] is not None and chunk["chunk"] == current["chunks"][-1] + 1)
+            if adjacent:
+                overlap = _overlap(current["text"], chunk["text"])
+                current["text"] += chunk["text"][overlap:] if overlap else CHUNK_JOINER + chunk["text"]
+                current["ids"].append(chunk["id"])
+                current["chunks"].append(chunk["chunk"])
+                current["rank"] = min(current["rank"], rank[id(chunk)])
+            else:
+                current = {"ids": [chunk["id"]], "source": source, "chunks": [chunk["chunk"]],
+                           "text": chunk["text"], "rank": rank[id(chunk)]}
+                blocks.append(current)
+    blocks.sort(key=lambda b: b["rank"])
+    for block in blocks:
+        del block["rank"]
+    return blocks
+
+
+def format_block(block):
+    return f"FONTE {block['source']}: {block['text']}"
+
+
+def build_context(query_vector, candidates, select_k=DEFAULT_SELECT_K, token_budget=DEFAULT_TOKEN_BUDGET,
+                  lambda_mult=DEFAULT_MMR_LAMBDA, baseline_k=None):
+    """
+    candidates: lista di (chunk, vettore) in ordine di similarità, con chunk
+    dict {"id", "source", "chunk", "text"}. Il vettore può essere None (MMR
+    saltato: si tengono i primi select_k).
+    Restituisce (blocchi, report). Il report confronta il contesto finale con
+    la concatenazione semplice dei primi `baseline_k` candidati (il
+    comportamento precedente): "token_base", "token_contesto", "risparmiati".
+    """
+    baseline_k = baseline_k or select_k
+    baseline_tokens = sum(estimate_tokens(format_block({"source": c["source"], "text": c["text"]}))
+                          for c, _ in candidates[:baseline_k])
+
+    unique, seen = [], set()
+    for chunk, vector in candidates:
+        if chunk["text"] not in seen:
+            seen.add(chunk["text"])
+            unique.append((chunk, vector))
+
+    if query_vector is not None and unique and all(v is not None for _, v in unique):
+        order = mmr_select(query_vector, [v for _, v in unique], select_k, lambda_mult)
+    else:
+        order = list(range(min(select_k, len(unique))))
+    chosen = [unique[i][0] for i in order]
+
+    blocks, used = [], 0
+    for block in merge_adjacent(chosen):
+        cost = estimate_tokens(format_block(block))
+        if used + cost > token_budget:
+            continue  # Un blocco più corto, meno rilevante, può ancora entrare
+        blocks.append(block)
+        used += cost
+    if not blocks and chosen:
+        # Nemmeno il blocco migliore entra nel budget: lo si tronca
+        block = merge_adjacent(chosen)[0]
+        room = token_budget * CHARS_PER_TOKEN - len(format_block({"source": block["source"], "text": ""}))
+        block["text"] = block["text"][:max(room, 0)]
+        blocks, used = [block], estimate_tokens(format_block(block))
+
+    report = {
+        "candidati": len(candidates),
+        "duplicati": len(candidates) - len(unique),
+        "selezionati": len(chosen),
+        "blocchi": len(blocks),
+        "token_base": baseline_tokens,
+        "token_contesto": used,
+        "risparmiati": max(baseline_tokens - used, 0),
+    }
+    return blocks, report
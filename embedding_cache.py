@@ -0,0 +1,133 @@
+"""
+Cache degli embedding delle query, condivisa tra le sessioni.
+
+CachedEmbeddings avvolge il provider dell'indice: embed_query passa prima da
+una LRU in memoria, poi (opzionale) da un archivio SQLite su disco che
+sopravvive ai riavvii; solo i miss arrivano al modello (rete per Google).
+Chiave = modello + testo normalizzato (minuscolo, spazi compattati), così
+un vettore non viene mai riusato con un modello diverso.
+embed_documents non passa dalla cache (serve solo a costruire l'indice).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from response_cache import normalize_text
+
+DEFAULT_DISK_PATH = os.path.join(".embedding_cache", "queries.sqlite")
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings con cache LRU (memoria) + SQLite (disco, opzionale) per embed_query."""
+
+    def __init__(self, base, model, maxsize=1024, disk_path=None, disk_maxsize=50000):
+        self.base = base
+        self.model = model
+        self.maxsize = maxsize
+        self.disk_maxsize = disk_maxsize
+        self._memory = OrderedDict()  # chiave -> vettore float32
+        self._lock = threading.Lock()
+        self._db = None
+        if disk_path:
+            try:
+                os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(disk_path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB, used REAL)")
+                self._db.commit()
+            except sqlite3.Error:
+                self._db = None  # Disco non scrivibile: resta la sola cache in memoria
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        row = self._db.execute("SELECT vector FROM vectors WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE vectors SET used = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def _disk_put(self, key, vector):
+        self._db.execute("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)", (key, vector.tobytes(), time.time()))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()
+        if count > self.disk_maxsize:
+            # Via le voci usate meno di recente (un 10% alla volta)
+            self._db.execute("DELETE FROM vectors WHERE key IN (SELECT key FROM vectors ORDER BY used LIMIT ?)",
+                             (count - int(self.disk_maxsize * 0.9),))
+        self._db.commit()
+
+    def embed_query(self, text):
+        key = self._key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return vector.tolist()
+            if self._db is not None:
+                try:
+                    vector = self._disk_get(key)
+                except sqlite3.Error:
+                    vector = None
+                if vector is not None:
+                    self._remember(key, vector)
+                    self.hits_disk += 1
+                    return vector.tolist()
+
+        t0 = time.perf_counter()
+        vector = np.asarray(self.base.embed_query(" ".join(str(text).split())), dtype=np.float32)
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += elapsed
+            self._remember(key, vector)
+            if self._db is not None:
+                try:
+                    self._disk_put(key, vector)
+                except sqlite3.Error:
+                    pass
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM vectors")
+                self._db.commit()
+            self.hits_memory = self.hits_disk = self.misses = 0
+            self.miss_seconds = 0.0
+
+    def stats(self):
+        """Contatori per il pannello admin; il tempo risparmiato usa la latenza media dei miss."""
+        hits = self.hits_memory + self.hits_disk
+        total = hits + self.misses
+        avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+        return {
+            "voci": len(self._memory),
+            "hit_memoria": self.hits_memory,
+            "hit_disco": self.hits_disk,
+            "miss": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "latenza_miss": avg_miss,
+            "secondi_risparmiati": hits * avg_miss,
+        }
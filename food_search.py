@@ -0,0 +1,247 @@
+"""
+Motore di ricerca per nomi di alimenti (sostituisce la scansione difflib).
+
+L'indice viene costruito una volta sui nomi del DB e offre:
+  - search(): candidati ordinati per similarità a trigrammi (accenti
+    normalizzati, sinonimi italiano/inglese, nomi inglesi CREA come alias)
+  - close_match(): stesso risultato di difflib.get_close_matches(n=1), ma
+    confronta con SequenceMatcher solo i nomi che superano un limite
+    superiore calcolato in modo vettoriale
+  - substring_match(): fallback "la parola è contenuta nel nome", in ordine DB
+  - best_match(): la catena completa usata dall'import dei piani AI
+
+Il modulo non dipende da Streamlit.
+"""
+import difflib
+import re
+import unicodedata
+from bisect import bisect_right
+
+import numpy as np
+
+# Sinonimi/varianti comuni nei piani generati dall'AI -> termini usati nei nomi CREA
+SYNONYMS = {
+    # Inglese -> Italiano
+    "rice": "riso", "oats": "avena", "oat": "avena", "bread": "pane", "chicken": "pollo",
+    "turkey": "tacchino", "beef": "bovino", "pork": "maiale", "egg": "uova", "eggs": "uova",
+    "milk": "latte", "yogurt": "yogurt", "cheese": "formaggio", "salmon": "salmone",
+    "tuna": "tonno", "cod": "merluzzo", "beans": "fagioli", "lentils": "lenticchie",
+    "chickpeas": "ceci", "apple": "mela", "apples": "mele", "banana": "banana",
+    "orange": "arancia", "oranges": "arance", "potato": "patate", "potatoes": "patate",
+    "tomato": "pomodori", "tomatoes": "pomodori", "carrot": "carote", "carrots": "carote",
+    "spinach": "spinaci", "zucchini": "zucchine", "courgette": "zucchine", "almonds": "mandorle",
+    "walnuts": "noci", "honey": "miele", "butter": "burro", "oil": "olio", "olive": "oliva",
+    # Varianti italiane -> forma CREA
+    "evo": "extravergine", "pomodoro": "pomodori", "zucchina": "zucchine", "carota": "carote",
+    "mela": "mele", "uovo": "uova", "fiocchi": "avena", "petto": "petto", "ricotta": "ricotta",
+    "bresaola": "bresaola", "grana": "grana", "parmigiano": "parmigiano", "lenticchia": "lenticchie",
+    "fagiolo": "fagioli", "cece": "ceci", "noce": "noci", "mandorla": "mandorle",
+}
+
+# Parole poco informative da ignorare nel confronto a trigrammi
+STOPWORDS = {"di", "da", "del", "della", "dei", "delle", "al", "alla", "con", "in", "e", "d", "of", "the", "and", "with"}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def fold_text(text):
+    """Minuscolo, senza accenti e punteggiatura: 'Caffè, tostato' -> 'caffe tostato'."""
+    decomposed = unicodedata.normalize("NFKD", str(text).lower())
+    ascii_text = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", ascii_text).strip()
+
+
+def expand_synonyms(folded):
+    """Sostituisce le parole note con il termine usato nel DB e rimuove le stopword."""
+    words = [SYNONYMS.get(w, w) for w in folded.split() if w not in STOPWORDS]
+    return " ".join(words)
+
+
+def normalize_query(raw):
+    """
+    Normalizzazione usata per deduplicare le query (spazi superflui).
+    Un valore non testuale (null nel JSON dell'AI) diventa "", non "None".
+    """
+    if not isinstance(raw, str):
+        return ""
+    return " ".join(raw.split())
+
+
+def _trigrams(folded):
+    grams = set()
+    for word in folded.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+# Match già risolti da match_many (query normalizzata -> risultato): i nomi
+# scritti dall'AI si ripetono molto tra un piano e l'altro
+MATCH_CACHE_SIZE = 20000
+
+
+class FoodSearchIndex:
+    """Indice di ricerca sui nomi (posizione della lista = riga del DB)."""
+
+    def __init__(self, names, aliases=None):
+        self.names = [str(n) for n in names]
+        self._match_cache = {}
+
+        # --- Trigrammi: una "voce" per nome italiano e per ogni alias ---
+        entry_rows, entry_texts = [], []
+        for row, name in enumerate(self.names):
+            entry_rows.append(row)
+            entry_texts.append(expand_synonyms(fold_text(name)))
+        if aliases is not None:
+            for row, alias in enumerate(aliases):
+                if alias:
+                    entry_rows.append(row)
+                    entry_texts.append(expand_synonyms(fold_text(alias)))
+
+        postings = {}
+        sizes = np.zeros(len(entry_texts), dtype=np.float32)
+        for entry, text in enumerate(entry_texts):
+            grams = _trigrams(text)
+            sizes[entry] = len(grams)
+            for g in grams:
+                postings.setdefault(g, []).append(entry)
+        self._postings = {g: np.asarray(ids, dtype=np.int32) for g, ids in postings.items()}
+        self._entry_rows = np.asarray(entry_rows, dtype=np.int32)
+        self._entry_sizes = sizes
+
+        # --- Limite superiore di difflib (quick_ratio) per tutti i nomi ---
+        alphabet = sorted({ch for name in self.names for ch in name})
+        self._char_pos = {ch: i for i, ch in enumerate(alphabet)}
+        counts = np.zeros((len(self.names), max(len(alphabet), 1)), dtype=np.int16)
+        for row, name in enumerate(self.names):
+            for ch in name:
+                counts[row, self._char_pos[ch]] += 1
+        self._char_counts = counts
+        self._name_lengths = np.asarray([len(n) for n in self.names], dtype=np.float64)
+
+        # --- Fallback sottostringa: nomi minuscoli concatenati ---
+        lowered = [n.lower() for n in self.names]
+        self._lower_blob = "\x00".join(lowered)
+        starts, pos = [], 0
+        for text in lowered:
+            starts.append(pos)
+            pos += len(text) + 1
+        self._lower_starts = starts
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query, k=5):
+        """
+        Restituisce fino a k tuple (riga, score) ordinate per similarità
+        (coefficiente di Dice sui trigrammi, 0-1).
+        """
+        grams = _trigrams(expand_synonyms(fold_text(query)))
+        if not grams or not len(self._entry_rows):
+            return []
+
+        hits = [self._postings[g] for g in grams if g in self._postings]
+        if not hits:
+            return []
+        common = np.bincount(np.concatenate(hits), minlength=len(self._entry_rows))
+        entry_scores = 2.0 * common / (self._entry_sizes + len(grams))
+
+        # Miglior punteggio per riga (nome italiano o alias)
+        row_scores = np.zeros(len(self.names), dtype=np.float64)
+        np.maximum.at(row_scores, self._entry_rows, entry_scores)
+
+        k = min(k, len(row_scores))
+        top = np.argpartition(-row_scores, k - 1)[:k]
+        top = top[np.lexsort((top, -row_scores[top]))]
+        return [(int(r), float(row_scores[r])) for r in top if row_scores[r] > 0]
+
+    def close_match(self, query, cutoff=0.5):
+        """
+        Equivalente a difflib.get_close_matches(query, names, n=1, cutoff):
+        stesso score, stesso criterio di parità. Restituisce (riga, ratio) o None.
+        """
+        q_counts = np.zeros(self._char_counts.shape[1], dtype=np.int16)
+        for ch in query:
+            pos = self._char_pos.get(ch)
+            if pos is not None:
+                q_counts[pos] += 1
+        total = self._name_lengths + len(query)
+        # quick_ratio() di difflib: limite superiore di ratio()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            upper = np.where(total > 0, 2.0 * np.minimum(self._char_counts, q_counts).sum(axis=1) / total, 0.0)
+
+        candidates = np.flatnonzero(upper >= cutoff)
+        candidates = candidates[np.argsort(-upper[candidates], kind="stable")]
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        best = None  # (ratio, nome, riga)
+        for row in candidates:
+            if best is not None and upper[row] < best[0]:
+                break
+            name = self.names[row]
+            matcher.set_seq1(name)
+            ratio = matcher.ratio()
+            # difflib usa heapq.nlargest su (score, nome): a parità vince il nome "maggiore"
+            if ratio >= cutoff and (best is None or (ratio, name) > best[:2]):
+                best = (ratio, name, int(row))
+
+        if best is None:
+            return None
+        # Nomi duplicati: pandas restituiva la prima riga con quel nome
+        return self.names.index(best[1]), best[0]
+
+    def substring_match(self, query):
+        """Prima riga (in ordine DB) il cui nome minuscolo contiene la query."""
+        needle = query.lower()
+        if "\x00" in needle:
+            return None
+        pos = self._lower_blob.find(needle)
+        if pos < 0:
+            return None
+        return bisect_right(self._lower_starts, pos) - 1
+
+    def best_match(self, query, cutoff=0.5, min_score=0.5):
+        """
+        Catena di matching dell'import AI. Restituisce (riga, confidenza, metodo)
+        oppure None:
+          1. "fuzzy": close match stile difflib
+          2. "substring": la query è contenuta nel nome
+          3. "indice": miglior candidato a trigrammi (accenti/sinonimi/inglese)
+        I primi due passi riproducono il comportamento storico; il terzo
+        interviene solo dove prima non si trovava nulla.
+        """
+        close = self.close_match(query, cutoff=cutoff)
+        if close is not None:
+            return close[0], close[1], "fuzzy"
+
+        row = self.substring_match(query)
+        if row is not None:
+            name_len = max(len(self.names[row]), 1)
+            return row, min(1.0, len(query) / name_len), "substring"
+
+        ranked = self.search(query, k=1)
+        if ranked and ranked[0][1] >= min_score:
+            return ranked[0][0], ranked[0][1], "indice"
+        return None
+
+    def clear_match_cache(self):
+        self._match_cache.clear()
+
+    def match_many(self, queries):
+        """
+        Risolve un elenco di query in un colpo solo: ogni query normalizzata
+        distinta viene cercata una volta sola, anche tra chiamate successive
+        (memo di MATCH_CACHE_SIZE query). Il lavoro è CPU-bound, quindi niente
+        thread (GIL): i lotti di piani si parallelizzano per processi in
+        batch_plans.py.
+        Restituisce {query_normalizzata: (riga, confidenza, metodo) | None}.
+        """
+        unique = list(dict.fromkeys(normalize_query(q) for q in queries))
+        cache = self._match_cache
+        todo = [q for q in unique if q and q not in cache]
+        results = [self.best_match(q) for q in todo]
+        if len(cache) + len(todo) > MATCH_CACHE_SIZE:
+            cache.clear()
+        cache.update(zip(todo, results))
+        return {q: cache[q] if q else None for q in unique}  # query vuota: nessun alimento
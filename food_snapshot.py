@@ -0,0 +1,182 @@
+"""
+Snapshot colonnare del database alimenti CREA.
+
+Il CSV originale (~150 colonne) viene letto una sola volta e compilato in una
+cartella di cache con sole le colonne mappate:
+  - numeric.npy          -> matrice float32 compatta (righe x nutrienti)
+  - <colonna>.str.bin    -> testo UTF-8 concatenato (colonne testuali)
+  - <colonna>.off.npy    -> offset int32 delle stringhe nel blob
+  - meta.json            -> impronta del CSV (mtime, size, sha256) e schema
+
+Il guadagno al caricamento viene dal non rileggere il CSV: la matrice è
+piccola e si espande subito in float64 (valori identici a quelli del CSV).
+Lo snapshot si ricostruisce da solo quando il CSV cambia. Il modulo non dipende
+da Streamlit, così può essere usato anche da worker e script.
+"""
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_FORMAT = 1
+META_FILE = "meta.json"
+NUMERIC_FILE = "numeric.npy"
+# I valori CREA hanno al massimo 3 decimali: arrotondando dopo l'espansione a
+# float64 si recuperano esattamente i valori del CSV.
+_DECIMALS = 3
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_atomic(path, writer):
+    """Scrive su file temporaneo e lo sostituisce in un colpo solo."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as fp:
+        writer(fp)
+    os.replace(tmp_path, path)
+
+
+def parse_food_csv(csv_path, column_mapping, numeric_cols):
+    """
+    Parsing "classico" del CSV: tiene solo le colonne mappate, le rinomina e
+    converte i nutrienti in numeri (mancanti -> 0).
+    """
+    df = pd.read_csv(csv_path, usecols=lambda c: c in column_mapping, dtype=str)
+    df = df.rename(columns=column_mapping)
+
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(float)
+        else:
+            df[col] = 0.0  # Se manca del tutto nel CSV
+
+    return df
+
+
+def build_snapshot(csv_path, cache_dir, column_mapping, numeric_cols, sha256=None):
+    """
+    Compila il CSV nello snapshot colonnare e restituisce il dizionario meta.
+    """
+    df = parse_food_csv(csv_path, column_mapping, numeric_cols)
+    text_cols = [c for c in column_mapping.values() if c not in numeric_cols and c in df.columns]
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    matrix = np.ascontiguousarray(df[numeric_cols].to_numpy(dtype=np.float32))
+    _write_atomic(os.path.join(cache_dir, NUMERIC_FILE), lambda fp: np.save(fp, matrix))
+
+    for col in text_cols:
+        encoded = [str(v).encode("utf-8") if pd.notna(v) else b"" for v in df[col]]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        _write_atomic(os.path.join(cache_dir, f"{col}.str.bin"), lambda fp: fp.write(b"".join(encoded)))
+        _write_atomic(os.path.join(cache_dir, f"{col}.off.npy"), lambda fp: np.save(fp, offsets))
+
+    stat = os.stat(csv_path)
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "source": os.path.basename(csv_path),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": sha256 or _file_sha256(csv_path),
+        "rows": len(df),
+        "numeric_columns": list(numeric_cols),
+        "text_columns": text_cols,
+        "column_mapping": dict(column_mapping),
+    }
+    # meta.json per ultimo: finché non esiste, lo snapshot non è considerato valido
+    _write_atomic(os.path.join(cache_dir, META_FILE), lambda fp: fp.write(json.dumps(meta, indent=1).encode("utf-8")))
+    return meta
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, META_FILE), encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_is_fresh(csv_path, cache_dir, column_mapping, numeric_cols):
+    """
+    Controlla se lo snapshot corrisponde al CSV attuale.
+    Confronta prima mtime/size (costo nullo) e solo se differiscono ricalcola
+    l'hash: un semplice "touch" del file non forza la ricompilazione.
+    """
+    meta = _read_meta(cache_dir)
+    if (
+        meta is None
+        or meta.get("format") != SNAPSHOT_FORMAT
+        or meta.get("column_mapping") != dict(column_mapping)
+        or meta.get("numeric_columns") != list(numeric_cols)
+    ):
+        return False, None
+
+    stat = os.stat(csv_path)
+    if meta["mtime_ns"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+        return True, meta
+
+    sha = _file_sha256(csv_path)
+    if sha != meta["sha256"]:
+        return False, sha
+
+    # Contenuto identico: aggiorniamo solo l'impronta temporale
+    meta["mtime_ns"], meta["size"] = stat.st_mtime_ns, stat.st_size
+    try:
+        _write_atomic(os.path.join(cache_dir, META_FILE), lambda fp: fp.write(json.dumps(meta, indent=1).encode("utf-8")))
+    except OSError:
+        pass
+    return True, meta
+
+
+def _load_text_column(cache_dir, col, rows):
+    offsets = np.load(os.path.join(cache_dir, f"{col}.off.npy"))
+    with open(os.path.join(cache_dir, f"{col}.str.bin"), "rb") as fp:
+        blob = fp.read()
+    if len(offsets) != rows + 1:
+        raise ValueError(f"Snapshot corrotto: colonna '{col}'")
+    bounds = offsets.tolist()
+    return [sys.intern(blob[bounds[i]:bounds[i + 1]].decode("utf-8")) for i in range(rows)]
+
+
+def load_snapshot(cache_dir, meta):
+    """
+    Ricostruisce il DataFrame dallo snapshot. I nutrienti restano in float64
+    come nel parsing del CSV: arrotondati a _DECIMALS ridanno i valori esatti.
+    """
+    matrix = np.load(os.path.join(cache_dir, NUMERIC_FILE))
+    rows = meta["rows"]
+    if matrix.shape != (rows, len(meta["numeric_columns"])):
+        raise ValueError("Snapshot corrotto: matrice numerica")
+
+    values = np.round(matrix.astype(np.float64), _DECIMALS)
+    data = {col: _load_text_column(cache_dir, col, rows) for col in meta["text_columns"]}
+    for j, col in enumerate(meta["numeric_columns"]):
+        data[col] = values[:, j]
+
+    df = pd.DataFrame(data)
+    df.attrs["food_db_sha256"] = meta["sha256"]
+    return df
+
+
+def load_food_table(csv_path, cache_dir, column_mapping, numeric_cols):
+    """
+    Punto di ingresso: restituisce il DataFrame alimenti dallo snapshot,
+    ricompilandolo se il CSV è cambiato. Se la cartella di cache non è
+    scrivibile ripiega sul parsing diretto del CSV.
+    """
+    fresh, info = snapshot_is_fresh(csv_path, cache_dir, column_mapping, numeric_cols)
+    try:
+        meta = info if fresh else build_snapshot(csv_path, cache_dir, column_mapping, numeric_cols, sha256=info)
+        return load_snapshot(cache_dir, meta)
+    except (OSError, ValueError):
+        return parse_food_csv(csv_path, column_mapping, numeric_cols)
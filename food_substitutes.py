@@ -0,0 +1,127 @@
+"""
+Indice dei sostituti: alimenti vicini nello spazio dei nutrienti.
+
+Ogni alimento è un vettore (macro + micro per 100 g) con le colonne divise
+per la loro deviazione standard nel DB e le righe normalizzate: la
+somiglianza coseno confronta la composizione, non la quantità (100 g di
+pasta e 100 g di riso sono vicini anche se le kcal differiscono un po').
+I macro pesano più dei micro (MACRO_WEIGHT).
+
+I primi NEIGHBOURS vicini di ogni alimento (su tutto il DB e nella stessa
+categoria CREA) sono calcolati una volta alla costruzione: una ricerca è
+solo una lettura di righe già pronte. Se gli alimenti ammessi (esclusioni,
+regime) sono troppo pochi tra i vicini pronti, si ricalcola la riga intera.
+
+La grammatura del sostituto pareggia le kcal (o le proteine) dell'originale.
+Il modulo non dipende da Streamlit.
+"""
+import numpy as np
+
+NEIGHBOURS = 32
+MACRO_WEIGHT = 2.0
+MIN_SIMILARITY = 0.0
+GRAMS_STEP = 5.0
+GRAMS_RANGE = (5.0, 500.0)
+
+
+class SubstitutionIndex:
+    """
+    nutrients: matrice per 100 g (alimenti x nutrienti); macro_cols: indici
+    delle colonne dei macronutrienti; categories: categoria CREA per riga.
+    """
+
+    def __init__(self, nutrients, categories, macro_cols=(), kcal_col=0, protein_col=1):
+        nutrients = np.asarray(nutrients, dtype=np.float64)
+        self.nutrients = nutrients
+        self.kcal_col = kcal_col
+        self.protein_col = protein_col
+        self.categories = np.asarray(categories, dtype=object)
+
+        std = nutrients.std(axis=0)
+        vectors = nutrients / np.where(std > 0, std, 1.0)
+        vectors[:, list(macro_cols)] *= MACRO_WEIGHT
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = (vectors / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+
+        similarity = self.vectors @ self.vectors.T
+        np.fill_diagonal(similarity, -np.inf)  # un alimento non sostituisce se stesso
+        self.neighbours = self._top(similarity)
+        same = self.categories[:, None] == self.categories[None, :]
+        self.neighbours_category = self._top(np.where(same, similarity, -np.inf))
+
+    @staticmethod
+    def _top(similarity):
+        """(indici, punteggi) dei primi NEIGHBOURS per riga, in ordine decrescente."""
+        k = min(NEIGHBOURS, similarity.shape[1] - 1)
+        if k <= 0:
+            empty = np.zeros((similarity.shape[0], 0))
+            return empty.astype(np.intp), empty
+        idx = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(similarity, idx, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def _candidates(self, food, same_category, allowed):
+        idx, scores = (self.neighbours_category if same_category else self.neighbours)
+        idx, scores = idx[food], scores[food]
+        keep = np.isfinite(scores) & (scores > MIN_SIMILARITY)
+        if allowed is not None:
+            keep &= allowed[idx]
+        return idx[keep], scores[keep]
+
+    def _full_row(self, food, same_category, allowed):
+        # Vicini pronti insufficienti (molti alimenti esclusi): riga intera
+        scores = self.vectors @ self.vectors[food]
+        keep = scores > MIN_SIMILARITY
+        keep[food] = False
+        if same_category:
+            keep &= self.categories == self.categories[food]
+        if allowed is not None:
+            keep &= allowed
+        idx = np.flatnonzero(keep)
+        order = np.argsort(-scores[idx], kind="stable")
+        return idx[order], scores[idx][order]
+
+    def matching_grams(self, food, substitute, grams, match="kcal"):
+        """Grammi del sostituto con le stesse kcal (o proteine) di `grams` dell'originale."""
+        col = self.protein_col if match == "protein" else self.kcal_col
+        original, other = self.nutrients[food, col], self.nutrients[substitute, col]
+        if original <= 0 or other <= 0:
+            if match == "protein":
+                return self.matching_grams(food, substitute, grams, "kcal")
+            return float(np.clip(grams, *GRAMS_RANGE))
+        value = grams * original / other
+        return float(np.clip(np.round(value / GRAMS_STEP) * GRAMS_STEP, *GRAMS_RANGE))
+
+    def substitutes(self, food, grams=100.0, k=5, same_category=True, allowed=None, match="kcal"):
+        """
+        I k sostituti migliori: lista di (indice, somiglianza, grammi).
+        allowed: maschera booleana degli alimenti ammessi (None = tutti).
+        """
+        idx, scores = self._candidates(food, same_category, allowed)
+        if len(idx) < k:
+            idx, scores = self._full_row(food, same_category, allowed)
+        return [(int(i), float(s), self.matching_grams(food, int(i), grams, match))
+                for i, s in zip(idx[:k], scores[:k])]
+
+    def batch_substitutes(self, foods, grams, k=1, same_category=True, allowed=None, match="kcal"):
+        """
+        substitutes() per una lista di alimenti (es. tutta la settimana); una
+        lista per alimento. Se la categoria è esclusa per intero (es. "no
+        pesce") si cerca su tutto il DB.
+        """
+        cache = {}
+        results = []
+        for food, g in zip(foods, grams):
+            food = int(food)
+            if food not in cache:
+                found = self.substitutes(food, 100.0, k, same_category, allowed, match)
+                if not found and same_category:
+                    found = self.substitutes(food, 100.0, k, False, allowed, match)
+                cache[food] = found
+            # Le somiglianze non dipendono dai grammi: si riscalano solo le porzioni
+            results.append([(i, s, self.matching_grams(food, i, g, match)) for i, s, _ in cache[food]])
+        return results
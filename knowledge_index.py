@@ -0,0 +1,541 @@
+"""
+Costruzione e caricamento dell'indice vettoriale (FAISS) sui PDF di documenti/.
+
+Il modulo non dipende da Streamlit: lo usa app.py, ma l'indice si può
+costruire anche da riga di comando (CI, deploy) senza avviare l'interfaccia:
+
+    python knowledge_index.py --provider hashing
+    GOOGLE_API_KEY=... python knowledge_index.py --provider google
+
+L'aggiornamento è incrementale: manifest.json (nella cartella dell'indice)
+registra per ogni PDF hash del contenuto, ID dei chunk e modello di embedding.
+Solo i PDF nuovi o modificati vengono estratti e indicizzati; i vettori dei
+PDF rimossi vengono cancellati dallo store. Accanto a FAISS si mantiene un
+indice lessicale BM25 degli stessi chunk (lexical_index.py), per la ricerca
+ibrida o solo lessicale (retrieve()).
+
+Provider di embedding disponibili:
+  - google:   GoogleGenerativeAIEmbeddings (rete, limiti di quota -> pause)
+  - sentence: modello sentence-transformers locale su CPU (se installato)
+  - hashing:  embedder locale a feature hashing, senza dipendenze né rete
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import time
+import unicodedata
+import zipfile
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.document import Document
+
+try:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+except ImportError:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import pdf_text
+import lexical_index
+
+DOCS_DIR = "documenti"
+INDEX_DIR = "faiss_index_store"
+MANIFEST_FILE = "manifest.json"
+LEGACY_INFO_FILE = "embedding.json"
+MANIFEST_FORMAT = 1
+BACKUP_DIR = ".index_backup"
+logger = logging.getLogger(__name__)
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 200
+
+# Parametri per provider: modello, dimensione dei batch e pausa tra batch
+# (la pausa serve solo per restare nei limiti di quota delle API remote)
+PROVIDERS = {
+    "google": {"model": "models/text-embedding-004", "batch_size": 10, "pause": 1.5},
+    "sentence": {"model": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", "batch_size": 64, "pause": 0.0},
+    "hashing": {"model": "hashing-768", "batch_size": 256, "pause": 0.0},
+}
+DEFAULT_PROVIDER = "google"
+
+
+# =========================================================
+# 1. EMBEDDING
+# =========================================================
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Embedder locale a feature hashing: parole e coppie di parole (senza accenti)
+    vengono proiettate con hash stabile e segno casuale su `dim` componenti,
+    con peso 1 + log(tf) e normalizzazione L2. Nessun modello da scaricare:
+    serve come sostituto offline degli embedding remoti.
+    """
+
+    def __init__(self, dim=768):
+        self.dim = dim
+
+    def _tokens(self, text):
+        decomposed = unicodedata.normalize("NFKD", text.lower())
+        folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+        words = _TOKEN.findall(folded)
+        return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+    def _embed(self, text):
+        counts = {}
+        for token in self._tokens(text):
+            counts[token] = counts.get(token, 0) + 1
+
+        vector = [0.0] * self.dim
+        for token, tf in counts.items():
+            h = zlib.crc32(token.encode("utf-8"))
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            vector[h % self.dim] += sign * (1.0 + math.log(tf))
+
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def create_embeddings(provider=DEFAULT_PROVIDER, api_key=None):
+    """
+    Istanzia il provider di embedding richiesto.
+    Restituisce (embeddings, info) dove info contiene provider, modello e batching.
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(f"Provider di embedding sconosciuto: '{provider}'")
+    info = dict(PROVIDERS[provider], provider=provider)
+
+    if provider == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        embeddings = GoogleGenerativeAIEmbeddings(model=info["model"], google_api_key=api_key)
+    elif provider == "sentence":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=info["model"], encode_kwargs={"normalize_embeddings": True})
+    else:
+        embeddings = HashingEmbeddings(dim=int(info["model"].split("-")[1]))
+    return embeddings, info
+
+
+def read_manifest(index_dir=INDEX_DIR):
+    """Manifest dell'indice (None se assente o illeggibile)."""
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), encoding="utf-8") as fp:
+            manifest = json.load(fp)
+        return manifest if manifest.get("format") == MANIFEST_FORMAT else None
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(index_dir, manifest):
+    tmp_path = os.path.join(index_dir, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        json.dump(manifest, fp, indent=1)
+    os.replace(tmp_path, os.path.join(index_dir, MANIFEST_FILE))
+
+
+def read_index_info(index_dir=INDEX_DIR):
+    """Provider/modello con cui è stato costruito l'indice (None se assente)."""
+    manifest = read_manifest(index_dir)
+    if manifest is not None:
+        return manifest["embedding"]
+    try:
+        with open(os.path.join(index_dir, LEGACY_INFO_FILE), encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+# =========================================================
+# 2. DOCUMENTI
+# =========================================================
+def list_pdf_files(docs_dir=DOCS_DIR):
+    if not os.path.exists(docs_dir):
+        return []
+    return sorted(f for f in os.listdir(docs_dir) if f.endswith('.pdf'))
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def split_documents(docs):
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return text_splitter.split_documents(docs)
+
+
+def chunk_document(doc, sha256):
+    """
+    Spezza un documento in chunk con ID deterministici "<chiave>:<n>" (chiave
+    da nome file + hash del contenuto) e posizione nel documento (metadata "chunk").
+    """
+    splits = split_documents([doc])
+    for i, split in enumerate(splits):
+        split.metadata["chunk"] = i
+    key = hashlib.sha256(f"{doc.metadata.get('source')}|{sha256}".encode("utf-8")).hexdigest()[:16]
+    ids = [f"{key}:{i}" for i in range(len(splits))]
+    return splits, ids
+
+
+# =========================================================
+# 3. INDICE
+# =========================================================
+def load_index(index_dir=INDEX_DIR, api_key=None):
+    """
+    Carica l'indice salvato usando lo stesso provider con cui è stato costruito
+    (gli indici senza manifest/embedding.json sono stati creati con Google).
+    Restituisce (vector_store, info) oppure (None, None).
+    """
+    if not os.path.exists(index_dir):
+        return None, None
+    saved = read_index_info(index_dir) or {"provider": "google"}
+    try:
+        embeddings, info = create_embeddings(saved["provider"], api_key)
+        vector_store = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+        return vector_store, info
+    except Exception:
+        return None, None
+
+
+def search_candidates(vector_store, query_vector, k):
+    """
+    Ricerca per similarità che restituisce anche i vettori dei chunk (per il
+    reranking MMR in context_builder): lista di (chunk, vettore), chunk =
+    {"id", "source", "chunk", "text"}, dal più simile.
+    """
+    query = np.asarray([query_vector], dtype=np.float32)
+    _, positions = vector_store.index.search(query, min(k, vector_store.index.ntotal))
+    candidates = []
+    for pos in positions[0]:
+        if pos < 0:
+            continue
+        doc_id = vector_store.index_to_docstore_id[int(pos)]
+        doc = vector_store.docstore.search(doc_id)
+        if not isinstance(doc, Document):
+            continue
+        chunk = {"id": doc_id, "source": doc.metadata.get("source"), "chunk": doc.metadata.get("chunk"),
+                 "text": doc.page_content}
+        candidates.append((chunk, vector_store.index.reconstruct(int(pos))))
+    return candidates
+
+
+def chunk_vectors(vector_store, chunk_ids):
+    """Vettori salvati nell'indice FAISS per gli ID dati (None se l'ID manca)."""
+    positions = {doc_id: pos for pos, doc_id in vector_store.index_to_docstore_id.items()}
+    return [vector_store.index.reconstruct(int(positions[cid])) if cid in positions else None for cid in chunk_ids]
+
+
+def retrieve(query, k, vector_store=None, lexical=None, mode="hybrid", query_vector=None, embed=None):
+    """
+    Candidati per il context builder: lista di (chunk, vettore | None).
+      - "vector":  ricerca densa FAISS
+      - "lexical": solo BM25, nessun embedding della query (funziona offline)
+      - "hybrid":  fusione RRF delle due classifiche
+    Se l'embedding della query fallisce (rete, quota) si ripiega sul lessicale.
+    Restituisce (candidati, vettore_query | None, modalità_usata).
+    """
+    if mode != "lexical" and vector_store is not None and query_vector is None:
+        try:
+            query_vector = (embed or vector_store.embeddings.embed_query)(query)
+        except Exception:
+            query_vector = None
+    if vector_store is None or query_vector is None:
+        if lexical is None:
+            return [], None, mode
+        return [(chunk, None) for chunk, _ in lexical.search(query, k)], None, "lexical"
+
+    dense = search_candidates(vector_store, query_vector, k)
+    if mode == "vector" or lexical is None or not len(lexical):
+        return dense, query_vector, "vector"
+
+    sparse = lexical.search(query, k)
+    by_id = {chunk["id"]: (chunk, vector) for chunk, vector in dense}
+    for chunk, _ in sparse:
+        by_id.setdefault(chunk["id"], (chunk, None))
+    fused = lexical_index.reciprocal_rank_fusion([[c["id"] for c, _ in dense], [c["id"] for c, _ in sparse]])
+    fused_ids = [cid for cid, _ in fused[:k]]
+    missing = [cid for cid in fused_ids if by_id[cid][1] is None]
+    for cid, vector in zip(missing, chunk_vectors(vector_store, missing)):
+        by_id[cid] = (by_id[cid][0], vector)
+    return [by_id[cid] for cid in fused_ids], query_vector, "hybrid"
+
+
+def _manifest_from_store(vector_store, info):
+    """
+    Manifest ricostruito da un indice creato prima del manifest: gli ID dei
+    chunk si raggruppano per sorgente dal docstore; l'hash verrà registrato
+    al primo confronto con i file su disco.
+    """
+    documents = {}
+    for doc_id in vector_store.index_to_docstore_id.values():
+        doc = vector_store.docstore.search(doc_id)
+        source = getattr(doc, "metadata", {}).get("source")
+        if source:
+            entry = documents.setdefault(source, {"sha256": None, "size": None, "mtime_ns": None,
+                                                  "model": info["model"], "chunk_ids": []})
+            entry["chunk_ids"].append(doc_id)
+    return {"format": MANIFEST_FORMAT, "embedding": {"provider": info["provider"], "model": info["model"]},
+            "documents": documents}
+
+
+def _scan_documents(docs_dir, known):
+    """
+    Confronta i PDF su disco con il manifest. Restituisce
+    (stato_per_file, da_indicizzare) dove da_indicizzare elenca i file nuovi,
+    modificati o rimasti incompleti. L'hash si ricalcola solo se size/mtime
+    sono cambiati.
+    """
+    current, pending = {}, []
+    for file_name in list_pdf_files(docs_dir):
+        path = os.path.join(docs_dir, file_name)
+        stat = os.stat(path)
+        entry = known.get(file_name)
+        if entry and entry.get("incompleto"):
+            # Embedding fallito in parte al giro precedente: si rifà tutto il documento
+            current[file_name] = {"sha256": file_sha256(path), "size": stat.st_size,
+                                  "mtime_ns": stat.st_mtime_ns, "chunk_ids": []}
+            pending.append(file_name)
+            continue
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            current[file_name] = entry
+            continue
+        sha = file_sha256(path)
+        if entry and entry["sha256"] in (sha, None):
+            # Stesso contenuto (o indice pre-manifest): aggiorniamo solo l'impronta
+            current[file_name] = dict(entry, sha256=sha, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            continue
+        current[file_name] = {"sha256": sha, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "chunk_ids": []}
+        pending.append(file_name)
+    return current, pending
+
+
+def _add_chunks(vector_store, embeddings, info, splits, ids, progress=None):
+    """
+    Aggiunge i chunk allo store a batch (con pausa solo per i provider remoti).
+    Restituisce (vector_store, id_aggiunti, errori): un batch che fallisce non
+    ferma gli altri, ma il suo errore viene registrato.
+    """
+    batch_size = info["batch_size"]
+    added, errors = set(), []
+    for i in range(0, len(splits), batch_size):
+        batch, batch_ids = splits[i : i + batch_size], ids[i : i + batch_size]
+        try:
+            if vector_store is None:
+                vector_store = FAISS.from_documents(batch, embeddings, ids=batch_ids)
+            else:
+                vector_store.add_documents(batch, ids=batch_ids)
+            added.update(batch_ids)
+            if info["pause"]:
+                time.sleep(info["pause"])
+        except Exception as e:
+            logger.warning("Embedding fallito per %d chunk: %s", len(batch_ids), e)
+            errors.append(f"{type(e).__name__}: {e}")
+            if info["pause"]:
+                time.sleep(5)
+            continue
+        finally:
+            if progress is not None:
+                progress(min(1.0, (i + batch_size) / len(splits)))
+    return vector_store, added, errors
+
+
+def sync_index(docs_dir=DOCS_DIR, index_dir=INDEX_DIR, provider=DEFAULT_PROVIDER, api_key=None, progress=None,
+               max_workers=None):
+    """
+    Porta l'indice in linea con i PDF di docs_dir, lavorando solo sulle differenze.
+    Se l'indice non esiste viene costruito da zero con `provider`; altrimenti si
+    continua con il provider registrato nell'indice.
+    max_workers: processi per l'estrazione del testo (default: tutti i core).
+    Restituisce (vector_store, numero_file, report) con report =
+    {"aggiunti": [...], "modificati": [...], "rimossi": [...], "invariati": n,
+     "estrazione": {file: {"pagine", "secondi", "cache"}},
+     "incompleti": {file: chunk_non_indicizzati}, "errori": [messaggi],
+     "illeggibili": [file senza testo estratto]}.
+    Documenti incompleti e illeggibili restano segnati nel manifest e si
+    ritentano al sync successivo.
+    """
+    vector_store, info = load_index(index_dir, api_key)
+    if vector_store is None:
+        embeddings, info = create_embeddings(provider, api_key)
+        manifest = {"format": MANIFEST_FORMAT, "embedding": {"provider": info["provider"], "model": info["model"]},
+                    "documents": {}}
+    else:
+        embeddings = vector_store.embeddings
+        manifest = read_manifest(index_dir) or _manifest_from_store(vector_store, info)
+
+    known = manifest["documents"]
+    current, pending = _scan_documents(docs_dir, known)
+    removed = [f for f in known if f not in current]
+    report = {
+        "aggiunti": [f for f in pending if f not in known],
+        "modificati": [f for f in pending if f in known],
+        "rimossi": removed,
+        "invariati": len(current) - len(pending),
+    }
+
+    # 1. Via i vettori dei documenti rimossi o da reindicizzare
+    stale_ids = [cid for f in removed + report["modificati"] for cid in known[f]["chunk_ids"]]
+    if vector_store is not None and stale_ids:
+        vector_store.delete(stale_ids)
+
+    # 2. Estrazione (parallela, con cache per hash) e indicizzazione dei soli
+    #    documenti nuovi/modificati: ogni PDF passa allo splitter appena pronto
+    splits, ids, owners = [], [], []
+    report["estrazione"], report["illeggibili"] = {}, []
+    items = [(f, os.path.join(docs_dir, f), current[f]["sha256"]) for f in pending]
+    for file_name, text, timing in pdf_text.extract_texts(items, max_workers=max_workers):
+        report["estrazione"][file_name] = timing
+        if text is None:
+            # PDF illeggibile o estrazione scaduta: niente chunk, ma il manifest lo
+            # segna incompleto, così un errore temporaneo non lo esclude per sempre
+            report["illeggibili"].append(file_name)
+            current[file_name]["incompleto"] = "estrazione"
+            continue
+        doc = Document(page_content=text, metadata={"source": file_name})
+        doc_splits, doc_ids = chunk_document(doc, current[file_name]["sha256"])
+        splits += doc_splits
+        ids += doc_ids
+        owners += [file_name] * len(doc_ids)
+
+    report["incompleti"], report["errori"] = {}, []
+    if splits:
+        vector_store, added, report["errori"] = _add_chunks(vector_store, embeddings, info, splits, ids, progress)
+        for file_name, chunk_id in zip(owners, ids):
+            if chunk_id in added:
+                current[file_name]["chunk_ids"].append(chunk_id)
+            else:
+                report["incompleti"][file_name] = report["incompleti"].get(file_name, 0) + 1
+        # Documenti con chunk mancanti: il manifest li segna incompleti, così il
+        # prossimo sync li reindicizza invece di considerarli aggiornati
+        for file_name, missing in report["incompleti"].items():
+            current[file_name]["incompleto"] = missing
+    for file_name in pending:
+        current[file_name]["model"] = info["model"]
+        if file_name in report["estrazione"]:
+            current[file_name]["estrazione"] = report["estrazione"][file_name]
+
+    manifest["documents"] = current
+    if vector_store is not None and (pending or removed or not os.path.exists(os.path.join(index_dir, MANIFEST_FILE))):
+        vector_store.save_local(index_dir)
+        write_manifest(index_dir, manifest)
+    if vector_store is not None:
+        # Indice BM25 dagli stessi chunk (solo le differenze, nessun embedding)
+        lexical_index.sync_lexical(index_dir, vector_store,
+                                   [cid for entry in current.values() for cid in entry["chunk_ids"]])
+
+    return vector_store, len(current), report
+
+
+def build_index(docs_dir=DOCS_DIR, index_dir=INDEX_DIR, provider=DEFAULT_PROVIDER, api_key=None, progress=None):
+    """
+    Ricostruisce l'indice da zero (estrazione, chunking, embedding di tutti i PDF).
+    Restituisce (vector_store, numero_file).
+    """
+    if os.path.exists(index_dir):
+        shutil.rmtree(index_dir)
+    vector_store, n_files, _ = sync_index(docs_dir, index_dir, provider, api_key, progress)
+    return vector_store, n_files
+
+
+# =========================================================
+# 4. BACKUP
+# =========================================================
+def index_fingerprint(index_dir=INDEX_DIR):
+    """Impronta dell'indice da nome, dimensione e mtime dei suoi file."""
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(index_dir)):
+        stat = os.stat(os.path.join(index_dir, name))
+        h.update(f"{name}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def backup_archive(index_dir=INDEX_DIR, backup_dir=BACKUP_DIR):
+    """
+    Percorso dello ZIP di backup dell'indice. Lo ZIP si ricrea solo quando
+    l'impronta dell'indice cambia; gli archivi superati vengono eliminati.
+    """
+    fingerprint = index_fingerprint(index_dir)
+    path = os.path.join(backup_dir, f"{os.path.basename(index_dir)}-{fingerprint}.zip")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(backup_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name in sorted(os.listdir(index_dir)):
+            archive.write(os.path.join(index_dir, name), arcname=name)
+    os.replace(tmp_path, path)
+
+    for old in os.listdir(backup_dir):
+        if old.endswith(".zip") and os.path.join(backup_dir, old) != path:
+            os.remove(os.path.join(backup_dir, old))
+    return path
+
+
+def read_backup_archive(index_dir=INDEX_DIR, backup_dir=BACKUP_DIR):
+    """Contenuto dello ZIP di backup (usato al momento del download)."""
+    with open(backup_archive(index_dir, backup_dir), "rb") as fp:
+        return fp.read()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Costruisce/aggiorna l'indice FAISS dei documenti fuori da Streamlit.")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default=DEFAULT_PROVIDER,
+                        help="provider per un indice nuovo (un indice esistente mantiene il suo)")
+    parser.add_argument("--docs", default=DOCS_DIR, help="cartella dei PDF")
+    parser.add_argument("--index", default=INDEX_DIR, help="cartella di destinazione dell'indice")
+    parser.add_argument("--rebuild", action="store_true", help="ignora l'indice esistente e ricostruisce tutto")
+    parser.add_argument("--workers", type=int, default=None, help="processi per l'estrazione dei PDF (default: tutti i core)")
+    args = parser.parse_args(argv)
+
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    saved = None if args.rebuild else read_index_info(args.index)
+    if (saved or {"provider": args.provider})["provider"] == "google" and not api_key:
+        parser.error("il provider 'google' richiede la variabile d'ambiente GOOGLE_API_KEY")
+
+    start = time.perf_counter()
+    if args.rebuild and os.path.exists(args.index):
+        shutil.rmtree(args.index)
+    vector_store, n_files, report = sync_index(args.docs, args.index, args.provider, api_key,
+                                               progress=lambda f: print(f"\r{f:6.1%}", end="", flush=True),
+                                               max_workers=args.workers)
+    print()
+    if report["estrazione"]:
+        print(f"{'PDF':<50} {'pagine':>7} {'secondi':>8}")
+        for file_name, timing in sorted(report["estrazione"].items(), key=lambda kv: -kv[1]["secondi"]):
+            pages = "cache" if timing["cache"] else timing["pagine"]
+            print(f"{file_name[:50]:<50} {pages:>7} {timing['secondi']:>8.2f}")
+    if vector_store is None:
+        print("Nessun documento indicizzato.")
+        return 1
+    print(f"Aggiunti: {len(report['aggiunti'])} · Modificati: {len(report['modificati'])} · "
+          f"Rimossi: {len(report['rimossi'])} · Invariati: {report['invariati']}")
+    if report["incompleti"]:
+        print(f"ATTENZIONE: {sum(report['incompleti'].values())} chunk non indicizzati in "
+              f"{len(report['incompleti'])} PDF (verranno ritentati al prossimo avvio): {report['errori'][0]}")
+    if report["illeggibili"]:
+        print(f"ATTENZIONE: testo non estratto da {len(report['illeggibili'])} PDF "
+              f"(verranno ritentati al prossimo avvio): {', '.join(report['illeggibili'])}")
+    print(f"Indice '{args.index}': {n_files} PDF, {vector_store.index.ntotal} chunk, "
+          f"provider {read_index_info(args.index)['provider']}, {time.perf_counter() - start:.1f}s")
+    return 2 if report["incompleti"] or report["illeggibili"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+"""
+Indice lessicale BM25 sui chunk dell'indice vettoriale.
+
+Si salva accanto all'indice FAISS (lexical.json nella stessa cartella) ed è
+costruito dagli stessi chunk, con gli stessi ID: sync_lexical() lo allinea
+agli ID del manifest prendendo i testi dal docstore FAISS, quindi non serve
+nessuna chiamata di embedding né una nuova estrazione dei PDF.
+
+I termini clinici ("celiachia", "low-fodmap", "potassio") vengono trovati
+per corrispondenza esatta, anche quando la ricerca densa li manca; la
+ricerca lessicale da sola risponde senza rete (nessun embedding della query).
+reciprocal_rank_fusion() combina le classifiche lessicale e vettoriale.
+"""
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+LEXICAL_FILE = "lexical.json"
+LEXICAL_FORMAT = 1
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+STOPWORDS = {
+    "il", "lo", "la", "i", "gli", "le", "un", "uno", "una", "di", "del", "dello", "della", "dei", "degli",
+    "delle", "da", "dal", "dalla", "dai", "dalle", "in", "nel", "nello", "nella", "nei", "nelle", "con",
+    "su", "sul", "sulla", "per", "tra", "fra", "al", "allo", "alla", "ai", "agli", "alle", "e", "ed", "o",
+    "che", "non", "si", "come", "piu", "anche", "sono", "essere", "ha", "hanno", "questo", "questa",
+    "the", "of", "and", "or", "to", "in", "for", "with", "on", "is", "are", "by", "an", "a", "at", "as",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Termini del testo: minuscolo, senza accenti, senza stopword."""
+    folded = unicodedata.normalize("NFKD", str(text).lower()).encode("ascii", "ignore").decode("ascii")
+    return [t for t in _TOKEN.findall(folded) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Indice BM25 aggiornabile per chunk. Le strutture di ricerca (liste di
+    posting come array NumPy) si ricalcolano solo dopo una modifica.
+    """
+
+    def __init__(self, chunks=None):
+        self.chunks = chunks or {}  # id -> {"source", "chunk", "text", "terms": {termine: frequenza}}
+        self._postings = None
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @classmethod
+    def load(cls, index_dir):
+        try:
+            with open(os.path.join(index_dir, LEXICAL_FILE), encoding="utf-8") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if data.get("format") != LEXICAL_FORMAT:
+            return None
+        return cls(data["chunks"])
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        path = os.path.join(index_dir, LEXICAL_FILE)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump({"format": LEXICAL_FORMAT, "chunks": self.chunks}, fp, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def add(self, chunk_id, source, chunk, text):
+        self.chunks[chunk_id] = {"source": source, "chunk": chunk, "text": text,
+                                 "terms": dict(Counter(tokenize(text)))}
+        self._postings = None
+
+    def remove(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            self.chunks.pop(chunk_id, None)
+        self._postings = None
+
+    def _prepare(self):
+        self._ids = list(self.chunks)
+        rows, tfs = {}, {}
+        lengths = np.zeros(len(self._ids), dtype=np.float32)
+        for row, chunk_id in enumerate(self._ids):
+            terms = self.chunks[chunk_id]["terms"]
+            lengths[row] = sum(terms.values())
+            for term, tf in terms.items():
+                rows.setdefault(term, []).append(row)
+                tfs.setdefault(term, []).append(tf)
+        n = len(self._ids)
+        avgdl = float(lengths.mean()) if n else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (avgdl or 1.0))
+        self._postings = {}
+        for term, term_rows in rows.items():
+            r = np.asarray(term_rows, dtype=np.int32)
+            tf = np.asarray(tfs[term], dtype=np.float32)
+            idf = np.log(1 + (n - len(r) + 0.5) / (len(r) + 0.5))
+            # Contributo BM25 già calcolato: la query fa solo somme
+            self._postings[term] = (r, idf * tf * (BM25_K1 + 1) / (tf + norm[r]))
+
+    def search(self, query, k=10):
+        """Lista di (chunk, punteggio) in ordine decrescente; chunk = {"id", "source", "chunk", "text"}."""
+        if self._postings is None:
+            self._prepare()
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        results = []
+        for row in hits:
+            chunk_id = self._ids[row]
+            entry = self.chunks[chunk_id]
+            results.append(({"id": chunk_id, "source": entry["source"], "chunk": entry["chunk"],
+                             "text": entry["text"]}, float(scores[row])))
+        return results
+
+
+def sync_lexical(index_dir, vector_store, chunk_ids):
+    """
+    Allinea l'indice BM25 di index_dir agli ID dei chunk (quelli del manifest):
+    rimuove gli ID scomparsi e aggiunge i mancanti leggendo il testo dal
+    docstore dello store vettoriale. Salva solo se qualcosa è cambiato.
+    """
+    lexical = BM25Index.load(index_dir) or BM25Index()
+    wanted = set(chunk_ids)
+    stale = [cid for cid in lexical.chunks if cid not in wanted]
+    missing = [cid for cid in chunk_ids if cid not in lexical.chunks]
+    lexical.remove(stale)
+    for chunk_id in missing:
+        doc = vector_store.docstore.search(chunk_id)
+        if hasattr(doc, "page_content"):
+            lexical.add(chunk_id, doc.metadata.get("source"), doc.metadata.get("chunk"), doc.page_content)
+    if stale or missing or not os.path.exists(os.path.join(index_dir, LEXICAL_FILE)):
+        lexical.save(index_dir)
+    return lexical
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    rankings: liste di ID ordinate per rilevanza. Restituisce [(id, punteggio)]
+    con punteggio = somma di 1 / (k + posizione).
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: -kv[1])
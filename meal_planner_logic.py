@@ -1,37 +1,28 @@
+"""
+Adattatore Streamlit del Meal Planner.
+
+Tutta la logica sta in planner_core (senza Streamlit); qui restano solo:
+  - il DB alimenti in cache (st.cache_data) con gli errori mostrati a video
+  - il piano dell'utente in st.session_state['weekly_plan']
+  - il profilo paziente letto da st.session_state['profilo_paziente']
+  - le tabelle dei pasti in cache per versione (rerun economici)
+  - l'archivio dei piani e delle chat (plan_storage), attivo quando il
+    profilo ha un codice paziente
+Le funzioni mantengono le firme usate dalle pagine.
+"""
+import sqlite3
+
 import streamlit as st
 import pandas as pd
-import os
-
-# --- COSTANTI DI CONFIGURAZIONE ---
-CSV_DB_PATH = "crea_food_composition_tables.csv"
-
-# Mappatura colonne: {Nome_Colonna_CSV : Nome_Visualizzato_UI}
-COLUMN_MAPPING = {
-    # Macro
-    "name": "Nome",
-    "energy_kcal": "Kcal",
-    "proteins": "Proteine",
-    "available_carbohydrates": "Carboidrati",
-    "lipids": "Grassi",
-    "total_fiber": "Fibre",
-    # Micro Minerali (selezionati in base alla copertura > 60%)
-    "calcium": "Calcio",
-    "iron": "Ferro",
-    "phosphorus": "Fosforo",
-    "potassium": "Potassio",
-    "sodium": "Sodio",
-    # Micro Vitamine (selezionati in base alla copertura > 55%)
-    "thiamine": "Vit B1",
-    "riboflavin": "Vit B2",
-    "niacin": "Vit B3"
-}
-
-# Lista tecnica dei Micro (usata per i cicli di calcolo)
-MICRO_LIST = ["Calcio", "Ferro", "Fosforo", "Potassio", "Sodio", "Vit B1", "Vit B2", "Vit B3"]
-
-# Struttura temporale del piano
-DAYS_OF_WEEK = ["Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato", "Domenica"]
-MEAL_TYPES = ["Colazione", "Spuntino Mattina", "Pranzo", "Spuntino Pomeriggio", "Cena"]
+
+import plan_storage
+import planner_core as core
+from planner_core import (  # noqa: F401 (riesportati per le pagine e gli script)
+    CSV_DB_PATH, FOOD_DB_CACHE_DIR, COLUMN_MAPPING, MICRO_LIST, NUMERIC_COLS, TOTAL_KEYS, ITEM_TOTAL_COLUMNS,
+    NUTRIENT_UNITS, DAYS_OF_WEEK, MEAL_TYPES, normalize_day_name, week_analytics_markdown,
+    suggest_foods, find_closest_food_match, match_foods_batch, get_food_search_index,
+)
+from weekly_plan import WeeklyPlan
 
 # --- 1. CARICAMENTO DATI EFFICIENTE ---
 
@@ -41,191 +32,248 @@ def load_food_db():
     Carica, pulisce e prepara il database degli alimenti.
     Gestisce Macro e Micro nutrienti.
     """
-    if not os.path.exists(CSV_DB_PATH):
-        st.error(f"Errore: File database '{CSV_DB_PATH}' non trovato.")
-        return pd.DataFrame()
-
     try:
-        df = pd.read_csv(CSV_DB_PATH)
-        
-        # Filtriamo solo le colonne che esistono sia nel CSV che nel Mapping
-        cols_available = list(set(COLUMN_MAPPING.keys()).intersection(df.columns))
-        df = df[cols_available].rename(columns=COLUMN_MAPPING)
-        
-        # Pulizia Numerica (Macro + Micro)
-        numeric_cols = ["Kcal", "Proteine", "Carboidrati", "Grassi", "Fibre"] + MICRO_LIST
-        
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            else:
-                df[col] = 0.0 # Se manca del tutto nel CSV
-            
-        # Creazione colonna "Etichetta" per UI
-        df["Etichetta"] = (
-            df["Nome"] + " (" + df["Kcal"].astype(int).astype(str) + " kcal)"
-        )
-        
-        return df
-
+        return core.load_food_db()
+    except FileNotFoundError as e:
+        st.error(f"Errore: {e}")
     except Exception as e:
         st.error(f"Errore parsing DB: {e}")
-        return pd.DataFrame()
+    return pd.DataFrame()
+
+def get_nutrient_matrix(db_df=None):
+    return core.get_nutrient_matrix(load_food_db() if db_df is None else db_df)
+
+def get_label_index(db_df=None):
+    return core.get_label_index(load_food_db() if db_df is None else db_df)
+
+def food_row_by_label(label, db_df=None):
+    """Riga del DB per l'etichetta mostrata nel picker (None se sconosciuta)."""
+    return core.food_row_by_label(label, load_food_db() if db_df is None else db_df)
 
 # --- 2. GESTIONE STATO E STRUTTURA DATI ---
 
+@st.cache_resource
+def get_plan_store():
+    """
+    Archivio di piani e chat condiviso da tutte le sessioni (SQLite locale).
+    None se il DB non ha i codici CREA o il disco non è scrivibile: in quel
+    caso il piano resta solo nella sessione, come prima.
+    """
+    df_db = load_food_db()
+    if "Codice" not in df_db.columns:
+        return None
+    try:
+        return plan_storage.PlanStore(plan_storage.SQLiteBackend(), df_db["Codice"].tolist())
+    except (sqlite3.Error, OSError):
+        return None
+
+def _patient_code(profile=None):
+    return str(_profile(profile).get("codice") or "").strip()
+
+def _attach_store(plan):
+    """Collega il piano della sessione all'archivio del codice paziente."""
+    code = _patient_code()
+    if st.session_state.get('plan_conflict') not in (None, code):
+        st.session_state.pop('plan_conflict', None)
+    stored = st.session_state.get('stored_plan')
+    if stored is not None and stored.plan is not plan:
+        # Piano sostituito nella sessione: va ricollegato
+        st.session_state.pop('stored_plan', None)
+        stored = None
+    if stored is not None and stored.key == code:
+        return
+    store = get_plan_store() if code or stored is not None else None
+    if stored is not None:
+        # Cambio paziente: si salva il piano precedente e si riparte da zero
+        if store is not None:
+            store.sync(stored)
+        plan = st.session_state['weekly_plan'] = core.new_plan(load_food_db())
+        st.session_state.pop('_meal_frames', None)
+        st.session_state.pop('stored_plan', None)
+    if not code or store is None or st.session_state.get('plan_conflict') == code:
+        return
+    if store.has_plan(code) and len(plan):
+        # Piano compilato nella sessione e piano già salvato per il codice:
+        # nessuna sostituzione silenziosa, decide l'utente (resolve_plan_conflict)
+        st.session_state['plan_conflict'] = code
+        return
+    # Piano salvato: i giorni si leggono quando servono. Altrimenti il piano
+    # della sessione (anche già compilato) viene adottato dal paziente
+    st.session_state['stored_plan'] = store.open(code, plan=plan)
+
+def plan_conflict():
+    """Codice paziente con un piano salvato in attesa di scelta (None se nessuno)."""
+    code = st.session_state.get('plan_conflict')
+    return code if code and code == _patient_code() else None
+
+def resolve_plan_conflict(resume):
+    """
+    Scelta dell'utente per plan_conflict(): resume=True riprende il piano
+    salvato (quello della sessione si scarta), False lo sovrascrive con il
+    piano della sessione.
+    """
+    code = plan_conflict()
+    store = get_plan_store() if code else None
+    st.session_state.pop('plan_conflict', None)
+    if store is None:
+        return False
+    plan = st.session_state['weekly_plan']
+    if resume:
+        plan = st.session_state['weekly_plan'] = core.new_plan(load_food_db())
+        st.session_state.pop('_meal_frames', None)
+    st.session_state['stored_plan'] = store.open(code, plan=plan, replace=not resume)
+    if not resume:
+        persist_plan(now=True)
+    return True
+
 def initialize_meal_plan_state():
-    if 'weekly_plan' not in st.session_state:
-        st.session_state['weekly_plan'] = {
-            day: {meal: [] for meal in MEAL_TYPES} 
-            for day in DAYS_OF_WEEK
-        }
+    plan = st.session_state.get('weekly_plan')
+    if not isinstance(plan, WeeklyPlan):
+        plan = st.session_state['weekly_plan'] = core.new_plan(load_food_db())
+    elif plan.nutrients is None:
+        plan.attach_nutrients(get_nutrient_matrix())
+    _attach_store(plan)
+
+def get_plan(day=None):
+    """
+    Piano della sessione. Con l'archivio attivo carica (una volta sola) il
+    giorno richiesto, o tutta la settimana se day è None.
+    """
+    initialize_meal_plan_state()
+    stored = st.session_state.get('stored_plan')
+    if stored is not None:
+        get_plan_store().load_days(stored, None if day is None else [DAYS_OF_WEEK.index(day)])
+    return st.session_state['weekly_plan']
+
+def plan_storage_active():
+    return st.session_state.get('stored_plan') is not None
+
+def persist_plan(now=False):
+    """
+    Accoda all'archivio i giorni modificati del piano: la scrittura su disco
+    è differita e raggruppata (now=True: subito). False se non c'è archivio.
+    """
+    stored = st.session_state.get('stored_plan')
+    store = get_plan_store() if stored is not None else None
+    if store is None:
+        return False
+    store.sync(stored)
+    if now:
+        store.flush()
+    return True
+
+def _profile(profile=None):
+    return profile or st.session_state.get("profilo_paziente", {})
 
 def add_food_to_meal(day, meal, food_row, grams):
     """
-    Aggiunge un alimento calcolando proporzionalmente tutti i valori (Macro e Micro).
+    Aggiunge un alimento al pasto. Nel piano si salvano solo indice DB e
+    grammi: i valori nutrizionali si ricavano dalla matrice del DB.
+    """
+    core.add_food_to_meal(get_plan(day), load_food_db(), day, meal, food_row, grams)
+
+def clear_day(day):
+    core.clear_day(get_plan(day), day)
+
+def get_meal_items_df(day, meal):
+    """
+    Tabella del pasto per l'editor: Nome, Grammi, totali Macro/Micro e ID riga.
+    La tabella è memorizzata per versione del pasto: i pasti non modificati
+    non vengono ricostruiti a ogni rerun.
+    """
+    plan = get_plan(day)
+    d, m = DAYS_OF_WEEK.index(day), MEAL_TYPES.index(meal)
+    cache = st.session_state.setdefault('_meal_frames', {})
+    version = int(plan.slot_version[d, m])
+    hit = cache.get((d, m))
+    if hit is not None and hit[0] == version:
+        return hit[1]
+
+    items = core.meal_items_df(plan, load_food_db(), day, meal)
+    cache[(d, m)] = (version, items)
+    return items
+
+def editor_key(day, meal):
     """
-    factor = grams / 100.0
-    
-    # 1. Base Item con Macro
-    food_item = {
-        "Nome": food_row["Nome"],
-        "Grammi": grams,
-        "Kcal_tot": round(food_row.get("Kcal", 0) * factor, 1),
-        "Prot_tot": round(food_row.get("Proteine", 0) * factor, 1),
-        "Carb_tot": round(food_row.get("Carboidrati", 0) * factor, 1),
-        "Grassi_tot": round(food_row.get("Grassi", 0) * factor, 1),
-        # Salviamo i valori base per 100g (utili se si modifica il peso dopo)
-        "Base_Kcal": food_row.get("Kcal", 0),
-        "Base_Prot": food_row.get("Proteine", 0),
-        "Base_Carb": food_row.get("Carboidrati", 0),
-        "Base_Grassi": food_row.get("Grassi", 0)
-    }
-
-    # 2. Aggiunta Dinamica Micronutrienti
-    for micro in MICRO_LIST:
-        val_base = food_row.get(micro, 0)
-        food_item[f"{micro}_tot"] = round(val_base * factor, 1)
-        food_item[f"Base_{micro}"] = val_base
-
-    st.session_state['weekly_plan'][day][meal].append(food_item)
-
-def update_meal_from_editor(day, meal, edited_df):
+    Chiave del data_editor di un pasto. Include la versione del pasto: dopo
+    aver applicato le modifiche l'editor riparte da uno stato pulito, così il
+    delta di Streamlit non viene riapplicato sui dati già aggiornati.
+    """
+    version = int(get_plan(day).slot_version[DAYS_OF_WEEK.index(day), MEAL_TYPES.index(meal)])
+    return f"editor_{day}_{meal}_{version}"
+
+def apply_editor_changes(day, meal, key, item_ids):
     """
-    Aggiorna lo stato quando l'utente modifica la tabella (cambia grammi o cancella righe).
+    Callback on_change del data_editor: applica solo il delta di Streamlit
+    (righe modificate o cancellate) al piano.
+    item_ids: ID delle righe nell'ordine in cui sono state mostrate.
     """
-    new_meal_list = []
-    
-    if edited_df is not None and not edited_df.empty:
-        for index, row in edited_df.iterrows():
-            try:
-                grams = float(row["Grammi"])
-                factor = grams / 100.0
-                
-                # Recuperiamo i valori base salvati
-                base_kcal = row.get("Base_Kcal", 0)
-                base_prot = row.get("Base_Prot", 0)
-                base_carb = row.get("Base_Carb", 0)
-                base_grassi = row.get("Base_Grassi", 0)
-                
-                updated_item = {
-                    "Nome": row["Nome"],
-                    "Grammi": grams,
-                    "Kcal_tot": round(base_kcal * factor, 1),
-                    "Prot_tot": round(base_prot * factor, 1),
-                    "Carb_tot": round(base_carb * factor, 1),
-                    "Grassi_tot": round(base_grassi * factor, 1),
-                    "Base_Kcal": base_kcal,
-                    "Base_Prot": base_prot,
-                    "Base_Carb": base_carb,
-                    "Base_Grassi": base_grassi
-                }
-                
-                # Aggiornamento Dinamico Micro
-                for micro in MICRO_LIST:
-                    base_val = row.get(f"Base_{micro}", 0)
-                    updated_item[f"{micro}_tot"] = round(base_val * factor, 1)
-                    updated_item[f"Base_{micro}"] = base_val
-                
-                new_meal_list.append(updated_item)
-            except ValueError:
-                continue # Salta righe con errori nei numeri
-            
-    st.session_state['weekly_plan'][day][meal] = new_meal_list
+    core.apply_editor_delta(get_plan(day), st.session_state.get(key) or {}, item_ids)
 
 # --- 3. FUNZIONI DI CALCOLO LIVE ---
 
 def calculate_daily_totals(day):
-    # Inizializza contatori a 0 per Macro e Micro
-    totals = {k: 0 for k in ["Kcal", "Proteine", "Carboidrati", "Grassi"] + MICRO_LIST}
-    
-    day_plan = st.session_state['weekly_plan'].get(day, {})
-    
-    for meal_type in MEAL_TYPES:
-        foods = day_plan.get(meal_type, [])
-        for food in foods:
-            # Somma Macro
-            totals["Kcal"] += food.get("Kcal_tot", 0)
-            totals["Proteine"] += food.get("Prot_tot", 0)
-            totals["Carboidrati"] += food.get("Carb_tot", 0)
-            totals["Grassi"] += food.get("Grassi_tot", 0)
-            
-            # Somma Micro
-            for micro in MICRO_LIST:
-                totals[micro] += food.get(f"{micro}_tot", 0)
-            
-    return {k: round(v, 1) for k, v in totals.items()}
-
-import difflib
+    return core.daily_totals(get_plan(day), day)
 
-# --- FUNZIONI DI INTEGRAZIONE AI (IMPORT PLAN) ---
+def calculate_week_totals():
+    """Totali per giorno della settimana (DataFrame giorni x nutrienti)."""
+    return core.week_totals(get_plan())
 
-def find_closest_food_match(search_term, db_df):
-    """
-    Cerca l'alimento più simile nel DB usando la comparazione di stringhe.
-    Restituisce la riga del DF o None se non trova nulla di decente.
-    """
-    # 1. Creiamo una lista di tutti i nomi nel DB
-    all_names = db_df['Nome'].tolist()
-    
-    # 2. Troviamo il match migliore (cutoff 0.5 significa che deve assomigliare almeno al 50%)
-    matches = difflib.get_close_matches(search_term, all_names, n=1, cutoff=0.5)
-    
-    if matches:
-        best_match_name = matches[0]
-        # Restituisce la riga corrispondente
-        return db_df[db_df['Nome'] == best_match_name].iloc[0]
-    
-    # Tentativo fallback: Cerca se la parola è contenuta (es. "Soia" in "Latte di soia")
-    # Questo aiuta se il fuzzy fallisce
-    search_lower = search_term.lower()
-    mask = db_df['Nome'].str.lower().str.contains(search_lower, regex=False)
-    if mask.any():
-        return db_df[mask].iloc[0]
-        
-    return None
-
-# --- IN SOSTITUZIONE NEL FILE meal_planner_logic.py ---
-
-def normalize_day_name(raw_day):
+def week_analytics(sex="Uomo", age=30, weight=None, plan=None):
+    """Analisi settimanale vs LARN/EFSA del piano (default: quello della sessione)."""
+    return core.week_analytics(plan or get_plan(), sex, age, weight)
+
+# --- OTTIMIZZATORE LOCALE (GENERAZIONE E RIPARAZIONE DEL PIANO) ---
+
+def estimate_kcal(profile=None):
+    """Fabbisogno energetico stimato dal profilo del paziente (Mifflin-St Jeor x attività)."""
+    return core.estimate_kcal(_profile(profile))
+
+def optimizer_targets(kcal=None, regime=None, profile=None):
+    """Obiettivi giornalieri per l'ottimizzatore (profilo: quello della sessione)."""
+    return core.optimizer_targets(_profile(profile), kcal, regime)
+
+def generate_week_plan(targets=None, regime=None, exclusions=None, seed=0, profile=None):
     """
-    Cerca di capire a quale giorno della settimana si riferisce la stringa,
-    gestendo errori di accenti, inglese o abbreviazioni.
+    Genera l'intera settimana in locale e sostituisce il piano corrente.
+    Regime ed esclusioni di default: quelli del profilo paziente.
     """
-    raw = raw_day.lower().strip()
-    
-    # Mappa flessibile
-    mapping = {
-        "lunedì": "Lunedì", "lunedi": "Lunedì", "monday": "Lunedì", "mon": "Lunedì",
-        "martedì": "Martedì", "martedi": "Martedì", "tuesday": "Martedì", "tue": "Martedì",
-        "mercoledì": "Mercoledì", "mercoledi": "Mercoledì", "wednesday": "Mercoledì", "wed": "Mercoledì",
-        "giovedì": "Giovedì", "giovedi": "Giovedì", "thursday": "Giovedì", "thu": "Giovedì",
-        "venerdì": "Venerdì", "venerdi": "Venerdì", "friday": "Venerdì", "fri": "Venerdì",
-        "sabato": "Sabato", "saturday": "Sabato", "sat": "Sabato",
-        "domenica": "Domenica", "sunday": "Domenica", "sun": "Domenica"
-    }
-    
-    return mapping.get(raw, None)
+    profile = _profile(profile)
+    regime = regime or profile.get("regime")
+    exclusions = profile.get("cibi_no", "") if exclusions is None else exclusions
+    targets = targets or core.optimizer_targets(profile, regime=regime)
+    return core.generate_week_plan(get_plan(), load_food_db(), targets, regime, exclusions, seed)
+
+def repair_week_plan(targets=None, profile=None):
+    """Ricalibra le grammature del piano corrente (None se il piano è vuoto)."""
+    return core.repair_week_plan(get_plan(), load_food_db(), targets or core.optimizer_targets(_profile(profile)))
+
+# --- SOSTITUZIONI (ALIMENTI VICINI NELLO SPAZIO DEI NUTRIENTI) ---
+
+def get_substitution_index(db_df=None):
+    return core.get_substitution_index(load_food_db() if db_df is None else db_df)
+
+def allowed_food_mask(regime=None, exclusions=None, profile=None):
+    """Alimenti ammessi da regime ed esclusioni (default: quelli del profilo paziente)."""
+    profile = _profile(profile)
+    regime = regime or profile.get("regime")
+    exclusions = profile.get("cibi_no", "") if exclusions is None else exclusions
+    return core.allowed_food_mask(load_food_db(), regime, exclusions)
+
+def substitute_options(item_id, k=5, same_category=True, match="kcal", allowed=None):
+    return core.substitute_options(get_plan(), load_food_db(), item_id, k, same_category, match, allowed)
+
+def swap_food(item_id, food_idx, grams):
+    core.swap_food(get_plan(), item_id, food_idx, grams)
+
+def propose_week_swaps(regime=None, exclusions=None, same_category=True, match="kcal", profile=None):
+    allowed = allowed_food_mask(regime, exclusions, profile)
+    return core.propose_week_swaps(get_plan(), load_food_db(), allowed, same_category, match)
+
+def apply_week_swaps(swaps):
+    return core.apply_week_swaps(get_plan(), swaps)
+
+# --- FUNZIONI DI INTEGRAZIONE AI (IMPORT PLAN) ---
 
 def import_ai_plan_to_state(ai_json_plan):
     """
@@ -233,47 +281,26 @@ def import_ai_plan_to_state(ai_json_plan):
     """
     df_db = load_food_db()
     if df_db.empty: return 0, ["Errore: Database vuoto"]
-    
-    # Assicuriamo che lo stato esista
-    initialize_meal_plan_state()
-    
-    meal_map = {
-        "colazione": "Colazione", "breakfast": "Colazione",
-        "spuntino mattina": "Spuntino Mattina", "snack 1": "Spuntino Mattina", "merenda mattina": "Spuntino Mattina",
-        "pranzo": "Pranzo", "lunch": "Pranzo",
-        "spuntino pomeriggio": "Spuntino Pomeriggio", "snack 2": "Spuntino Pomeriggio", "merenda": "Spuntino Pomeriggio",
-        "cena": "Cena", "dinner": "Cena"
-    }
-
-    count_added = 0
-    debug_log = [] # Raccogliamo info per capire cosa succede
-    
-    for item in ai_json_plan:
-        raw_day = item.get('day', '')
-        day = normalize_day_name(raw_day)
-        
-        if not day:
-            debug_log.append(f"❌ Giorno non riconosciuto: '{raw_day}'")
-            continue
-            
-        raw_meal = item.get('meal', '').lower()
-        target_meal = "Colazione" # Default
-        for key, val in meal_map.items():
-            if key in raw_meal:
-                target_meal = val
-                break
-        
-        food_query = item.get('food', '')
-        grams = item.get('grams', 100)
-        
-        # Tentativo di matching
-        match_row = find_closest_food_match(food_query, df_db)
-        
-        if match_row is not None:
-            add_food_to_meal(day, target_meal, match_row, grams)
-            count_added += 1
-            debug_log.append(f"✅ Aggiunto: {day} | {food_query} -> {match_row['Nome']}")
-        else:
-            debug_log.append(f"⚠️ Cibo non trovato: '{food_query}'")
-            
-    return count_added, debug_log
+    return core.import_ai_plan(get_plan(), df_db, ai_json_plan)
+
+# --- SESSIONI DI CHAT SALVATE (CODICE PAZIENTE) ---
+
+def load_chat_messages(profile=None):
+    """Messaggi salvati del paziente (None se l'archivio non è attivo)."""
+    code = _patient_code(profile)
+    store = get_plan_store() if code else None
+    if store is None:
+        return None
+    messages = store.load_messages(code)
+    st.session_state['_chat_salvati'] = (code, len(messages))
+    return messages
+
+def save_chat_messages(messages, profile=None):
+    """Salva i messaggi nuovi della chat sotto il codice paziente (se impostato)."""
+    code = _patient_code(profile)
+    store = get_plan_store() if code else None
+    if store is None:
+        return
+    saved = st.session_state.get('_chat_salvati')
+    start = saved[1] if saved and saved[0] == code else None
+    st.session_state['_chat_salvati'] = (code, store.save_messages(code, messages, start))
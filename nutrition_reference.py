@@ -0,0 +1,74 @@
+"""
+Valori di riferimento per l'adulto (LARN 2014 / EFSA), per sesso ed età.
+
+Tipi di riferimento:
+  - "minimo":    PRI/AI, il valore medio giornaliero dovrebbe raggiungerlo
+  - "massimo":   limite da non superare (es. Sodio, SDT 2 g/die)
+  - "energia":   intervallo in % dell'energia totale (RI dei macronutrienti)
+Le proteine (PRI 0.9 g/kg) richiedono il peso; senza peso non sono valutate.
+Il fabbisogno energetico è stimato con Mifflin-St Jeor x livello di attività.
+"""
+
+SEXES = ("Uomo", "Donna")
+
+# % dell'energia: intervalli di riferimento (RI) per i macronutrienti
+ENERGY_RANGES = {"Carboidrati": (45, 60, 4.0), "Grassi": (20, 35, 9.0)}  # (min %, max %, kcal/g)
+
+PROTEIN_PRI_G_PER_KG = 0.9
+
+# Fattori di attività (PAL) per le voci della sidebar, riconosciute dalla prima parola
+ACTIVITY_FACTORS = {"sedentario": 1.4, "leggero": 1.55, "moderato": 1.7, "intenso": 1.9}
+
+
+def energy_requirement(sex="Uomo", age=30, weight=70, height=170, activity="Sedentario"):
+    """Fabbisogno energetico giornaliero (kcal): metabolismo basale Mifflin-St Jeor x PAL."""
+    female = str(sex).lower().startswith(("d", "f"))
+    bmr = 10 * weight + 6.25 * height - 5 * age + (-161 if female else 5)
+    words = str(activity).lower().split()
+    factor = ACTIVITY_FACTORS.get(words[0] if words else "", ACTIVITY_FACTORS["sedentario"])
+    return round(bmr * factor, -1)
+
+
+def reference_intakes(sex="Uomo", age=30, weight=None):
+    """
+    Riferimenti giornalieri: {nutriente: {"valore", "tipo", "unita"}} con
+    "valore" = numero o (min, max) per il tipo "energia".
+    """
+    female = str(sex).lower().startswith(("d", "f"))
+    age = age or 30
+    refs = {
+        "Fibre":    {"valore": 25.0, "tipo": "minimo", "unita": "g"},
+        "Calcio":   {"valore": 1200.0 if (age >= 50 if female else age >= 60) else 1000.0,
+                     "tipo": "minimo", "unita": "mg"},
+        "Ferro":    {"valore": 18.0 if female and age < 50 else 10.0, "tipo": "minimo", "unita": "mg"},
+        "Fosforo":  {"valore": 700.0, "tipo": "minimo", "unita": "mg"},
+        "Potassio": {"valore": 3900.0, "tipo": "minimo", "unita": "mg"},
+        "Sodio":    {"valore": 2000.0, "tipo": "massimo", "unita": "mg"},
+        "Vit B1":   {"valore": 1.1 if female else 1.2, "tipo": "minimo", "unita": "mg"},
+        "Vit B2":   {"valore": 1.3 if female else 1.6, "tipo": "minimo", "unita": "mg"},
+        "Vit B3":   {"valore": 18.0, "tipo": "minimo", "unita": "mg"},
+    }
+    for nutrient, (low, high, _) in ENERGY_RANGES.items():
+        refs[nutrient] = {"valore": (low, high), "tipo": "energia", "unita": "% kcal"}
+    if weight:
+        refs["Proteine"] = {"valore": round(PROTEIN_PRI_G_PER_KG * weight, 1), "tipo": "minimo", "unita": "g"}
+    return refs
+
+
+def assess(nutrient, value, reference, kcal=None):
+    """
+    Confronta un valore medio giornaliero con il riferimento.
+    Restituisce (percentuale, stato) con stato "ok" | "basso" | "alto".
+    Per il tipo "energia" la percentuale è la quota di kcal del nutriente.
+    """
+    kind = reference["tipo"]
+    if kind == "energia":
+        if not kcal:
+            return None, None
+        low, high = reference["valore"]
+        share = value * ENERGY_RANGES[nutrient][2] / kcal * 100
+        return share, "basso" if share < low else "alto" if share > high else "ok"
+    share = value / reference["valore"] * 100 if reference["valore"] else None
+    if kind == "massimo":
+        return share, "alto" if value > reference["valore"] else "ok"
+    return share, "basso" if value < reference["valore"] else "ok"
@@ -1,6 +1,6 @@
 import streamlit as st
-import pandas as pd
 import meal_planner_logic as mpl
+from pdf_report import crea_pdf_html, report_key
 
 # --- CONFIGURAZIONE PAGINA ---
 st.set_page_config(
@@ -22,11 +22,28 @@ with st.sidebar:
     st.title("📅 Navigazione")
     selected_day = st.radio("Seleziona Giorno:", mpl.DAYS_OF_WEEK, index=0)
     st.markdown("---")
-    st.info("💡 Puoi modificare i grammi direttamente nella tabella. Metti 0 o usa il cestino per cancellare.")
+    st.info("💡 Puoi modificare i grammi direttamente nella tabella. Per cancellare un alimento seleziona "
+            "la riga (casella a sinistra) e premi il cestino sopra la tabella o il tasto Canc.")
     if st.button("🗑️ Svuota Giorno"):
-        for meal in mpl.MEAL_TYPES:
-            st.session_state['weekly_plan'][selected_day][meal] = []
+        mpl.clear_day(selected_day)
         st.rerun()
+    st.markdown("---")
+    if mpl.plan_conflict():
+        st.warning(f"Esiste già un piano salvato per **{mpl.plan_conflict()}**. "
+                   "Il piano attuale resta solo in questa sessione finché non scegli:")
+        if st.button("📂 Riprendi piano salvato", use_container_width=True):
+            mpl.resolve_plan_conflict(resume=True)
+            st.rerun()
+        if st.button("💾 Sovrascrivi con il piano attuale", use_container_width=True):
+            mpl.resolve_plan_conflict(resume=False)
+            st.rerun()
+    elif mpl.plan_storage_active():
+        st.caption(f"💾 Salvataggio automatico: **{st.session_state['profilo_paziente']['codice']}**")
+        if st.button("💾 Salva ora"):
+            mpl.persist_plan(now=True)
+            st.toast("Piano salvato", icon="💾")
+    else:
+        st.caption("Imposta un Codice Paziente nella pagina principale per salvare piano e chat.")
 
 # --- 3. DASHBOARD MACRO (STICKY KPI) ---
 st.title(f"Piano Alimentare: {selected_day}")
@@ -61,6 +78,100 @@ with st.expander("🔬 Analisi Micronutrienti (Stimata)", expanded=False):
     with col_info:
         st.info("⚠️ Vitamine volatili (C, D, A, B12) non tracciate per dati insufficienti nel DB Open Source.")
 
+# --- 4b. ANALISI SETTIMANALE (tutti i giorni in un solo calcolo) ---
+with st.expander("📊 Analisi Settimanale vs LARN/EFSA", expanded=False):
+    profilo = st.session_state.get("profilo_paziente", {})
+    a1, a2, a3 = st.columns(3)
+    sesso = a1.selectbox("Sesso", ["Uomo", "Donna"], index=1 if profilo.get("sesso") == "Donna" else 0, key="an_sesso")
+    eta = a2.number_input("Età", 18, 100, int(profilo.get("eta", 30)), key="an_eta")
+    peso = a3.number_input("Peso (kg)", 40, 150, int(profilo.get("peso", 70)), key="an_peso")
+
+    analisi = mpl.week_analytics(sesso, eta, peso)
+    vista = st.radio("Vista", ["Media giornaliera", "Per pasto", "Per giorno"], horizontal=True, key="an_vista")
+    colonne = {
+        "Media giornaliera": ["Unità", "Media", "Min", "Max", "Riferimento", "% Rif.", "Stato"],
+        "Per pasto": ["Unità"] + mpl.MEAL_TYPES,
+        "Per giorno": ["Unità"] + mpl.DAYS_OF_WEEK + ["Media"],
+    }[vista]
+    st.dataframe(analisi[colonne], use_container_width=True)
+    st.caption("Medie calcolate sui giorni compilati. Carboidrati/Grassi: quota % delle kcal; Proteine: PRI 0.9 g/kg.")
+
+    e1, e2 = st.columns(2)
+    e1.download_button("⬇️ Esporta CSV", data=analisi.to_csv().encode("utf-8"), file_name="analisi_settimanale.csv",
+                       mime="text/csv", use_container_width=True)
+    # PDF creato solo su richiesta; se pisa fallisce lo si segnala invece di scaricare un file vuoto
+    testo_paziente = profilo.get("testo", f"Paziente: {sesso}, {eta} anni, {peso}kg.")
+    testo_report = "## Analisi Settimanale\n\n" + mpl.week_analytics_markdown(analisi)
+    chiave_pdf = report_key(testo_paziente, testo_report)
+    if e2.button("🖨️ Prepara Report PDF", use_container_width=True):
+        with st.spinner("Generazione PDF..."):
+            st.session_state.report_pdf = (chiave_pdf, crea_pdf_html(testo_paziente, testo_report))
+    report_pdf = st.session_state.get("report_pdf")
+    if report_pdf and report_pdf[0] == chiave_pdf:
+        if report_pdf[1]:
+            e2.download_button("⬇️ Scarica Report PDF", data=report_pdf[1], file_name="Analisi_Settimanale.pdf",
+                               mime="application/pdf", use_container_width=True)
+        else:
+            st.error("Impossibile generare il PDF del report: riprova o usa l'export CSV.")
+
+# --- 4c. OTTIMIZZATORE LOCALE (nessuna chiamata AI) ---
+with st.expander("🤖 Genera / Ottimizza Settimana", expanded=False):
+    profilo = st.session_state.get("profilo_paziente", {})
+    regimi = ["Onnivora", "Vegetariana", "Vegana", "Pescatariana", "Chetogenica", "Low-Carb", "Paleo"]
+    o1, o2, o3 = st.columns([1, 1, 2])
+    kcal_stimate = mpl.estimate_kcal(profilo)
+    kcal_obiettivo = o1.number_input("Kcal/giorno", 1000, 5000, int(kcal_stimate), step=50, key="opt_kcal")
+    regime_opt = o2.selectbox("Regime", regimi, index=regimi.index(profilo.get("regime", "Onnivora")), key="opt_regime")
+    esclusioni = o3.text_input("Esclusioni", value=profilo.get("cibi_no", ""), key="opt_esclusioni",
+                               placeholder="Es. No Cipolla, Odia il pesce")
+
+    obiettivi = mpl.optimizer_targets(kcal_obiettivo, regime_opt, profilo)
+    st.caption("Obiettivi: " + ", ".join(f"{n} {v:.0f} g" for n, v in obiettivi["macro"].items())
+               + f", micro LARN minimi, sodio max {obiettivi['sodium_cap']:.0f} mg. Stima kcal profilo: {kcal_stimate:.0f}.")
+
+    b1, b2 = st.columns(2)
+    if b1.button("✨ Genera settimana", use_container_width=True, help="Sostituisce il piano attuale"):
+        seed = st.session_state.get("opt_seed", 0)
+        st.session_state["opt_report"] = mpl.generate_week_plan(obiettivi, regime_opt, esclusioni, seed=seed)
+        # Ogni nuova generazione propone alimenti diversi
+        st.session_state["opt_seed"] = seed + 1
+        st.rerun()
+    if b2.button("🛠️ Ottimizza piano attuale", use_container_width=True,
+                 help="Ricalibra solo le grammature (es. piano importato dall'AI)"):
+        st.session_state["opt_report"] = mpl.repair_week_plan(obiettivi, profilo)
+        st.rerun()
+    if "opt_report" in st.session_state:
+        if st.session_state["opt_report"] is None:
+            st.warning("Nessun risultato: piano vuoto o nessun alimento compatibile con regime ed esclusioni.")
+        else:
+            st.dataframe(st.session_state["opt_report"], use_container_width=True)
+
+# --- 4d. SOSTITUZIONI PER TUTTA LA SETTIMANA (regime ed esclusioni) ---
+with st.expander("🔄 Sostituzioni Settimana", expanded=False):
+    profilo = st.session_state.get("profilo_paziente", {})
+    s1, s2, s3 = st.columns([2, 1, 1])
+    esclusioni_sw = s1.text_input("Esclusioni", value=profilo.get("cibi_no", ""), key="sw_esclusioni",
+                                  placeholder="Es. No Cipolla, Odia il pesce")
+    stessa_categoria = s2.checkbox("Stessa categoria", value=True, key="sw_categoria")
+    pareggia = s3.radio("Pareggia", ["kcal", "proteine"], horizontal=True, key="sw_pareggia")
+    st.caption(f"Regime del profilo: {profilo.get('regime', 'Onnivora')}. "
+               "Per ogni alimento non ammesso si propone il più simile per nutrienti.")
+
+    if st.button("🔍 Proponi sostituzioni", use_container_width=True):
+        st.session_state["sw_proposte"] = mpl.propose_week_swaps(
+            exclusions=esclusioni_sw, same_category=stessa_categoria,
+            match="protein" if pareggia == "proteine" else "kcal")
+    proposte = st.session_state.get("sw_proposte")
+    if proposte is not None:
+        if proposte.empty:
+            st.success("Nessun alimento da sostituire.")
+        else:
+            st.dataframe(proposte.drop(columns=["ID", "indice"]), use_container_width=True, hide_index=True)
+            if st.button("✅ Applica tutte", use_container_width=True):
+                mpl.apply_week_swaps(proposte)
+                del st.session_state["sw_proposte"]
+                st.rerun()
+
 st.markdown("---")
 
 # --- 5. GESTIONE PASTI (EDITABLE) ---
@@ -68,15 +179,15 @@ for meal in mpl.MEAL_TYPES:
     with st.expander(f"🍽️ {meal}", expanded=True):
         
         # Recupero dati attuali
-        current_items = st.session_state['weekly_plan'][selected_day][meal]
-        df_display = pd.DataFrame(current_items)
+        df_display = mpl.get_meal_items_df(selected_day, meal)
         
         # A. TABELLA EDITABILE
         if not df_display.empty:
-            edited_df = st.data_editor(
+            key = mpl.editor_key(selected_day, meal)
+            st.data_editor(
                 df_display,
-                key=f"editor_{selected_day}_{meal}",
-                num_rows="dynamic", # Permette di cancellare/aggiungere righe
+                key=key,
+                num_rows="delete", # Righe cancellabili; gli alimenti si aggiungono dal form sotto
                 column_order=["Nome", "Grammi", "Kcal_tot", "Prot_tot", "Carb_tot", "Grassi_tot"],
                 column_config={
                     "Nome": st.column_config.TextColumn("Alimento", disabled=True),
@@ -87,33 +198,59 @@ for meal in mpl.MEAL_TYPES:
                     "Grassi_tot": st.column_config.NumberColumn("Grassi", disabled=True),
                 },
                 use_container_width=True,
-                hide_index=True
+                hide_index=True,
+                # Solo le modifiche dell'utente (delta) vengono applicate al piano:
+                # i pasti non toccati non costano nulla
+                on_change=mpl.apply_editor_changes,
+                args=(selected_day, meal, key, df_display["ID"].tolist()),
             )
             
-            # Callback manuale per salvare le modifiche
-            # Confrontiamo lo stato precedente con quello editato per capire se aggiornare
-            # Nota: Streamlit fa il rerun automatico, quindi basta salvare sempre.
-            mpl.update_meal_from_editor(selected_day, meal, edited_df)
-            
+            # Sostituto di un alimento: vicini nello spazio dei nutrienti, grammi a pari kcal
+            with st.popover("🔄 Sostituisci alimento"):
+                nomi = dict(zip(df_display["ID"].tolist(), df_display["Nome"].tolist()))
+                item_id = st.selectbox("Alimento", list(nomi), format_func=nomi.get,
+                                       key=f"sw_item_{selected_day}_{meal}")
+                categoria = st.checkbox("Stessa categoria", value=True, key=f"sw_cat_{selected_day}_{meal}")
+                sostituti = mpl.substitute_options(item_id, k=5, same_category=categoria,
+                                                   allowed=mpl.allowed_food_mask())
+                if sostituti:
+                    etichette = [f"{o['Nome']} — {o['Grammi']:.0f} g" for o in sostituti]
+                    scelta = st.radio("Sostituti", etichette, key=f"sw_scelta_{selected_day}_{meal}_{item_id}")
+                    if st.button("Sostituisci", key=f"sw_btn_{selected_day}_{meal}", use_container_width=True):
+                        opzione = sostituti[etichette.index(scelta)]
+                        mpl.swap_food(item_id, opzione["indice"], opzione["Grammi"])
+                        st.rerun()
+                else:
+                    st.caption("Nessun sostituto ammesso.")
+
         else:
             st.caption("Nessun alimento. Aggiungi qui sotto.")
 
         # B. WIDGET AGGIUNTA
-        c1, c2, c3 = st.columns([3, 1, 1])
+        # Ricerca lato server: al browser arrivano solo i primi risultati,
+        # non le ~900 etichette del DB per ogni pasto
+        c0, c1, c2, c3 = st.columns([2, 3, 1, 1])
+        with c0:
+            query = st.text_input("Cerca alimento", placeholder="Digita per cercare...",
+                                  key=f"q_{selected_day}_{meal}", label_visibility="collapsed")
         with c1:
+            options = mpl.suggest_foods(query, df_food) if query else []
             food_label = st.selectbox(
-                "Cerca alimento", 
-                options=df_food["Etichetta"].unique(),
-                index=None,
-                placeholder="Digita per cercare...",
-                key=f"sel_{selected_day}_{meal}",
+                "Risultati",
+                options=options,
+                index=0 if options else None,
+                placeholder="Nessun risultato" if query else "Scrivi a sinistra il nome dell'alimento",
+                key=f"sel_{selected_day}_{meal}_{query}",  # nuova query = nuova selezione
                 label_visibility="collapsed"
             )
         with c2:
             grams = st.number_input("Grammi", min_value=1, value=100, step=10, key=f"num_{selected_day}_{meal}", label_visibility="collapsed")
         with c3:
             if st.button("➕ Aggiungi", key=f"btn_{selected_day}_{meal}", use_container_width=True):
-                if food_label:
-                    selected_row = df_food[df_food["Etichetta"] == food_label].iloc[0]
+                selected_row = mpl.food_row_by_label(food_label, df_food) if food_label else None
+                if selected_row is not None:
                     mpl.add_food_to_meal(selected_day, meal, selected_row, grams)
                     st.rerun()
+
+# --- 6. SALVATAGGIO (scrittura differita, solo i giorni modificati) ---
+mpl.persist_plan()
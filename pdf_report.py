@@ -0,0 +1,282 @@
+"""
+Generazione del report PDF (xhtml2pdf) del piano nutrizionale.
+
+Il modulo non dipende da Streamlit. In app.py il PDF si crea solo quando
+l'utente clicca "Prepara PDF": PdfRenderer esegue pisa in un thread di
+background e memorizza i risultati per hash di (profilo, testo AI, data),
+così lo stesso report non viene mai renderizzato due volte.
+
+Modalità batch: rende in parallelo (pool di processi) i report di molte
+sessioni salvate, senza avviare l'interfaccia:
+
+    python pdf_report.py sessioni/ --out report/
+    python pdf_report.py sessioni.jsonl --out report/ --workers 4
+
+Una sessione è un file .json (o una riga di un .jsonl) con le chiavi
+"profilo" e "messages" (stesso formato di st.session_state.messages);
+il report usa l'ultima risposta dell'assistente. "id" opzionale = nome del PDF.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from io import BytesIO
+
+import markdown
+from xhtml2pdf import pisa
+
+CSS_STYLE = """
+    @page {
+        size: A4;
+        margin: 1.5cm;
+        @frame footer_frame {
+            -pdf-frame-content: footerContent;
+            bottom: 0cm;
+            margin-left: 1.5cm;
+            margin-right: 1.5cm;
+            height: 1cm;
+        }
+    }
+    body { font-family: Helvetica, sans-serif; font-size: 11px; color: #333; line-height: 1.4; }
+    .header-bar { background-color: #008080; color: white; padding: 15px; text-align: center; border-radius: 5px; margin-bottom: 20px; }
+    h1 { margin:0; font-size: 20px; text-transform: uppercase; }
+    .subtitle { font-size: 10px; font-weight: normal; margin-top: 5px; }
+    h2 { color: #008080; font-size: 14px; border-bottom: 2px solid #008080; padding-bottom: 5px; margin-top: 25px; }
+    .box-paziente { background-color: #f0f7f7; border-left: 5px solid #008080; padding: 15px; margin-bottom: 20px; font-size: 10px; }
+    table { width: 100%; border-collapse: collapse; margin-top: 10px; margin-bottom: 15px; font-size: 10px; }
+    th { background-color: #008080; color: white; font-weight: bold; padding: 8px; text-align: left; border: 1px solid #006666; }
+    td { border: 1px solid #ddd; padding: 6px; color: #444; }
+    tr:nth-child(even) { background-color: #f9f9f9; }
+"""
+
+
+def _today():
+    return datetime.date.today().strftime('%d/%m/%Y')
+
+
+def crea_pdf_html(dati_paziente, testo_ai, data_report=None):
+    """Rende il report e restituisce i byte del PDF (None se pisa fallisce)."""
+    html_ai = markdown.markdown(testo_ai, extensions=['tables'])
+    html_paziente = dati_paziente.replace("\n", "<br>")
+
+    html_template = f"""
+    <html>
+    <head>
+        <style>
+            {CSS_STYLE}
+        </style>
+    </head>
+    <body>
+        <div class="header-bar">
+            <h1>Piano Clinico Nutrizionale</h1>
+            <div class="subtitle">Generato con Nutri-AI Assistant</div>
+        </div>
+
+        <div class="box-paziente">
+            <strong>QUADRO CLINICO:</strong><br><br>
+            {html_paziente}
+        </div>
+
+        {html_ai}
+
+        <div id="footerContent" style="text-align:center; color:#999; font-size:9px;">
+            Report generato il {data_report or _today()}
+        </div>
+    </body>
+    </html>
+    """
+
+    result_file = BytesIO()
+    pisa_status = pisa.CreatePDF(html_template, dest=result_file)
+    if pisa_status.err: return None
+    return result_file.getvalue()
+
+
+def report_key(dati_paziente, testo_ai, data_report=None):
+    """Chiave di memoizzazione: il footer contiene la data, che quindi entra nell'hash."""
+    h = hashlib.sha256()
+    for part in (dati_paziente, testo_ai, data_report or _today()):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def _resolved(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class PdfRenderer:
+    """
+    Rendering PDF in background con memoizzazione LRU.
+    submit() accoda il lavoro e restituisce subito un Future; richieste
+    identiche ancora in corso condividono lo stesso Future.
+    """
+
+    def __init__(self, maxsize=32, max_workers=1):
+        self.maxsize = maxsize
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdf")
+        self._done = OrderedDict()  # chiave -> byte del PDF
+        self._pending = {}          # chiave -> Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+        self.seconds = 0.0
+
+    def _render(self, key, dati_paziente, testo_ai, data_report):
+        t0 = time.perf_counter()
+        pdf = None
+        try:
+            pdf = crea_pdf_html(dati_paziente, testo_ai, data_report)
+        finally:
+            with self._lock:
+                if pdf is not None:
+                    self._done[key] = pdf
+                    while len(self._done) > self.maxsize:
+                        self._done.popitem(last=False)
+                self._pending.pop(key, None)
+                self.renders += 1
+                self.seconds += time.perf_counter() - t0
+        return pdf
+
+    def submit(self, dati_paziente, testo_ai):
+        data_report = _today()
+        key = report_key(dati_paziente, testo_ai, data_report)
+        with self._lock:
+            if key in self._done:
+                self._done.move_to_end(key)
+                self.hits += 1
+                return _resolved(self._done[key])
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pool.submit(self._render, key, dati_paziente, testo_ai, data_report)
+                self._pending[key] = future
+            return future
+
+    def get(self, dati_paziente, testo_ai, timeout=None):
+        """Byte del PDF (attende il worker); None se il rendering fallisce."""
+        return self.submit(dati_paziente, testo_ai).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {"memorizzati": len(self._done), "in_corso": len(self._pending), "hit": self.hits,
+                    "rendering": self.renders, "secondi": self.seconds}
+
+
+# =========================================================
+# MODALITÀ BATCH (sessioni salvate -> PDF)
+# =========================================================
+
+def load_sessions(path):
+    """Sessioni da una cartella di .json/.jsonl o da un singolo file. Restituisce [(id, sessione)]."""
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith((".json", ".jsonl")))
+    else:
+        files = [path]
+    sessions = []
+    for file_path in files:
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        with open(file_path, encoding="utf-8") as fp:
+            if file_path.endswith(".jsonl"):
+                records = [json.loads(line) for line in fp if line.strip()]
+            else:
+                records = [json.load(fp)]
+        for i, record in enumerate(records):
+            default_id = stem if len(records) == 1 else f"{stem}_{i + 1}"
+            session_id = os.path.basename(str(record.get("id") or default_id))
+            sessions.append((session_id, record))
+    return sessions
+
+
+def session_report_text(session):
+    """Ultima risposta dell'assistente della sessione (None se assente)."""
+    if session.get("testo"):
+        return session["testo"]
+    for message in reversed(session.get("messages", [])):
+        if message.get("role") == "assistant" and message.get("content"):
+            return message["content"]
+    return None
+
+
+def _render_to_file(out_path, dati_paziente, testo_ai, data_report):
+    """Task del pool: scrive il PDF su disco. Restituisce (ok, secondi)."""
+    t0 = time.perf_counter()
+    pdf = crea_pdf_html(dati_paziente, testo_ai, data_report)
+    if pdf is not None:
+        with open(out_path, "wb") as fp:
+            fp.write(pdf)
+    return pdf is not None, time.perf_counter() - t0
+
+
+def render_sessions(sessions, out_dir, max_workers=None, progress=None):
+    """
+    Rende in parallelo i report delle sessioni in out_dir/<id>.pdf.
+    Sessioni con profilo e testo identici vengono rese una volta sola.
+    Restituisce {id: {"file", "secondi", "errore"}}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    data_report = _today()
+    results, by_key = {}, {}
+    for session_id, session in sessions:
+        testo = session_report_text(session)
+        if testo is None:
+            results[session_id] = {"file": None, "secondi": 0.0, "errore": "nessuna risposta dell'assistente"}
+            continue
+        key = report_key(session.get("profilo", ""), testo, data_report)
+        by_key.setdefault(key, (session.get("profilo", ""), testo, []))[2].append(session_id)
+
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {}
+        for key, (profilo, testo, ids) in by_key.items():
+            out_path = os.path.join(out_dir, f"{ids[0]}.pdf")
+            futures[pool.submit(_render_to_file, out_path, profilo, testo, data_report)] = (out_path, ids)
+        for done, future in enumerate(as_completed(futures), start=1):
+            out_path, ids = futures[future]
+            try:
+                ok, seconds = future.result()
+                error = None if ok else "rendering fallito"
+            except Exception as e:
+                ok, seconds, error = False, 0.0, str(e)
+            for session_id in ids:
+                target = os.path.join(out_dir, f"{session_id}.pdf")
+                if ok and target != out_path:
+                    with open(out_path, "rb") as src, open(target, "wb") as dst:
+                        dst.write(src.read())
+                results[session_id] = {"file": target if ok else None, "secondi": seconds, "errore": error}
+            if progress:
+                progress(done / len(futures))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera in parallelo i report PDF delle sessioni salvate.")
+    parser.add_argument("sessions", help="cartella di sessioni .json/.jsonl o singolo file")
+    parser.add_argument("--out", default="report", help="cartella di destinazione dei PDF")
+    parser.add_argument("--workers", type=int, default=None, help="processi di rendering (default: tutti i core)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    sessions = load_sessions(args.sessions)
+    if not sessions:
+        print("Nessuna sessione trovata.")
+        return 1
+    results = render_sessions(sessions, args.out, max_workers=args.workers,
+                              progress=lambda f: print(f"\r{f:6.1%}", end="", flush=True))
+    print()
+    failed = {k: v for k, v in results.items() if v["errore"]}
+    for session_id, result in sorted(failed.items()):
+        print(f"⚠️ {session_id}: {result['errore']}")
+    print(f"{len(results) - len(failed)}/{len(results)} report in '{args.out}', {time.perf_counter() - start:.1f}s")
+    return 0 if not failed else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
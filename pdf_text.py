@@ -0,0 +1,114 @@
+"""
+Estrazione parallela del testo dai PDF, con cache su disco.
+
+Le pagine di ogni PDF vengono distribuite a blocchi su un pool di processi;
+il testo di un documento viene restituito appena tutte le sue pagine sono
+pronte (i documenti completati escono subito, senza attendere gli altri).
+Il testo estratto è salvato in cache per hash del file: le ricostruzioni
+successive non passano più da pypdf.
+
+Il modulo importa solo pypdf, così i processi del pool partono in fretta.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pypdf import PdfReader
+
+TEXT_CACHE_DIR = ".pdf_text_cache"
+PAGES_PER_TASK = 8
+
+
+def _cache_path(cache_dir, sha256):
+    return os.path.join(cache_dir, f"{sha256}.txt")
+
+
+def read_cached_text(sha256, cache_dir=TEXT_CACHE_DIR):
+    try:
+        with open(_cache_path(cache_dir, sha256), encoding="utf-8") as fp:
+            return fp.read()
+    except OSError:
+        return None
+
+
+def write_cached_text(sha256, text, cache_dir=TEXT_CACHE_DIR):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{_cache_path(cache_dir, sha256)}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            fp.write(text)
+        os.replace(tmp_path, _cache_path(cache_dir, sha256))
+    except OSError:
+        pass  # Cache non scrivibile: si estrae di nuovo la prossima volta
+
+
+def _extract_pages(path, start, stop):
+    """Task del pool: testo delle pagine [start, stop). Restituisce (start, testi, secondi)."""
+    t0 = time.perf_counter()
+    reader = PdfReader(path)
+    texts = [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+    return start, texts, time.perf_counter() - t0
+
+
+def _page_count(path):
+    try:
+        return len(PdfReader(path).pages)
+    except Exception:
+        return None
+
+
+def extract_texts(items, max_workers=None, cache_dir=TEXT_CACHE_DIR):
+    """
+    items: lista di (nome, percorso, sha256).
+    Genera (nome, testo | None, timing) man mano che i documenti sono completi;
+    timing = {"pagine": n, "secondi": tempo di estrazione, "cache": bool}.
+    Testo None = PDF illeggibile.
+    """
+    pending = {}
+    for name, path, sha in items:
+        cached = read_cached_text(sha, cache_dir)
+        if cached is not None:
+            yield name, cached, {"pagine": None, "secondi": 0.0, "cache": True}
+            continue
+        pages = _page_count(path)
+        if pages is None:
+            yield name, None, {"pagine": 0, "secondi": 0.0, "cache": False}
+            continue
+        pending[name] = {"path": path, "sha": sha, "pagine": pages, "testi": [None] * pages,
+                         "mancanti": 0, "secondi": 0.0}
+
+    if not pending:
+        return
+
+    workers = max_workers or os.cpu_count() or 1
+    # "spawn": sicuro anche dentro il server Streamlit (multi-thread)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {}
+        for name, doc in pending.items():
+            for start in range(0, doc["pagine"], PAGES_PER_TASK):
+                stop = min(start + PAGES_PER_TASK, doc["pagine"])
+                futures[pool.submit(_extract_pages, doc["path"], start, stop)] = name
+                doc["mancanti"] += 1
+            if doc["pagine"] == 0:
+                yield name, "", {"pagine": 0, "secondi": 0.0, "cache": False}
+
+        for future in as_completed(futures):
+            name = futures[future]
+            doc = pending[name]
+            if doc["testi"] is None:
+                continue  # Documento già scartato per un errore
+            try:
+                start, texts, seconds = future.result()
+            except Exception:
+                doc["testi"] = None
+                yield name, None, {"pagine": doc["pagine"], "secondi": doc["secondi"], "cache": False}
+                continue
+
+            doc["testi"][start:start + len(texts)] = texts
+            doc["secondi"] += seconds
+            doc["mancanti"] -= 1
+            if doc["mancanti"] == 0:
+                text = "".join(doc["testi"])
+                write_cached_text(doc["sha"], text, cache_dir)
+                yield name, text, {"pagine": doc["pagine"], "secondi": doc["secondi"], "cache": False}
@@ -0,0 +1,344 @@
+"""
+Ottimizzatore locale del piano settimanale (solo NumPy, nessuna chiamata AI).
+
+Due fasi:
+  1. scelta degli alimenti: ogni pasto ha uno schema di "ruoli" (cereali,
+     fonte proteica, verdura, ...) coperti da alimenti del DB filtrati per
+     categoria CREA, regime alimentare ed esclusioni; la rotazione tra i
+     giorni è deterministica (seed)
+  2. grammature: minimi quadrati con vincoli di intervallo, risolti con
+     gradiente proiettato accelerato (FISTA) su tutti i giorni insieme.
+     Obiettivi: kcal e macro del giorno, ripartizione delle kcal tra i pasti,
+     soglie minime dei micronutrienti e tetto del sodio (penalità a una via),
+     vicinanza alle porzioni tipiche.
+
+La riparazione usa lo stesso solutore sugli alimenti già presenti (es. piano
+importato dall'AI), con intervalli attorno ai grammi attuali (repair_bounds):
+cambiano solo le grammature.
+"""
+import re
+
+import numpy as np
+
+from food_search import fold_text
+
+# Ripartizione delle kcal giornaliere tra i 5 pasti (ordine di MEAL_TYPES)
+MEAL_KCAL_SHARE = (0.20, 0.10, 0.35, 0.10, 0.25)
+
+# kcal per grammo dei macronutrienti
+MACRO_KCAL = {"Proteine": 4.0, "Carboidrati": 4.0, "Grassi": 9.0}
+
+# Ripartizione % delle kcal (proteine, carboidrati, grassi) per regime
+REGIME_MACRO_SPLIT = {
+    "Low-Carb": (0.25, 0.25, 0.50),
+    "Chetogenica": (0.20, 0.05, 0.75),
+}
+DEFAULT_MACRO_SPLIT = (0.20, 0.50, 0.30)
+
+MEAT = ("Carni fresche", "Carni trasformate e conservate", "Frattaglie", "Fast-food a base di carne")
+FISH = ("Prodotti della pesca",)
+DAIRY = ("Formaggi e latticini", "Latte e yogurt")
+
+# Categorie CREA escluse per regime
+REGIME_EXCLUDED_CATEGORIES = {
+    "Vegetariana": MEAT + FISH,
+    "Vegana": MEAT + FISH + DAIRY + ("Uova",),
+    "Pescatariana": MEAT,
+    "Chetogenica": ("Cereali e derivati", "Dolci", "Frutta", "Legumi"),
+    "Low-Carb": ("Dolci",),
+    "Paleo": ("Cereali e derivati", "Legumi") + DAIRY,
+}
+
+# Piatti pronti/ricette (altre categorie) riconosciuti dal nome
+MEAT_WORDS = ("carne", "carni", "pollo", "tacchino", "manzo", "bovino", "vitell", "maiale", "suino", "agnello",
+              "capretto", "coniglio", "cavallo", "prosciutto", "salame", "salsiccia", "mortadella", "bresaola",
+              "speck", "pancetta", "wurstel", "kebab", "ragu", "spezzatino", "scaloppin", "cotolett", "polpett",
+              "lasagn", "tortellini", "ravioli", "strutto", "lardo", "brasato", "carbonara", "amatriciana", "gricia",
+              "bolognese", "ossobuco", "arrosto", "bollito", "trippa", "fegato", "cotechino", "zampone")
+FISH_WORDS = ("pesce", "tonno", "salmone", "merluzzo", "baccala", "trota", "sogliola", "orata", "spigola",
+              "acciugh", "alici", "sardin", "sgombro", "gamber", "calamar", "seppi", "polpo", "cozze", "vongole",
+              "frutti di mare", "surimi")
+DAIRY_WORDS = ("latte", "formaggi", "mozzarella", "ricotta", "parmigian", "grana", "pecorino", "cacio", "yogurt",
+               "burro", "panna", "besciamella", "gelato", "pizza", "cannoli", "pesto", "tiramisu")
+REGIME_EXCLUDED_WORDS = {
+    "Vegetariana": MEAT_WORDS + FISH_WORDS,
+    "Vegana": MEAT_WORDS + FISH_WORDS + DAIRY_WORDS + ("uova", "uovo", "frittata", "maionese", "miele", "pappa reale",
+                                                       "torta", "gateau", "pan di spagna", "pastiera", "cantonese"),
+    "Pescatariana": MEAT_WORDS,
+}
+
+# Parole delle esclusioni libere ("No pesce, odia la cipolla") che indicano categorie intere
+EXCLUSION_CATEGORIES = {
+    "pesce": FISH, "pesci": FISH, "carne": MEAT, "carni": MEAT, "latticini": DAIRY,
+    "formaggi": ("Formaggi e latticini",), "formaggio": ("Formaggi e latticini",),
+    "lattosio": DAIRY, "uova": ("Uova",), "uovo": ("Uova",), "legumi": ("Legumi",),
+    "frutta secca": ("Frutta secca a guscio e semi oleaginosi",),
+}
+# Esclusioni che corrispondono a parole nel nome degli alimenti
+EXCLUSION_KEYWORDS = {
+    "glutine": ("frumento", "pasta", "pane", "farro", "orzo", "segale", "couscous", "biscott", "cracker",
+                "fette biscottate", "grissini", "semola", "pizza", "muesli", "cornetti", "croissant"),
+}
+_EXCLUSION_STOPWORDS = {"no", "non", "senza", "odia", "odio", "evitare", "evita", "allergia", "allergico",
+                        "allergica", "intollerante", "intolleranza", "a", "al", "alla", "il", "lo", "la", "i",
+                        "gli", "le", "di", "del", "della", "e", "ed", "niente", "poco", "gusti"}
+
+# Ruoli: (categorie, parole preferite nel nome | None, parole da evitare, porzione tipica, min, max) in grammi
+ROLES = {
+    "colazione": (("Cereali e derivati",),
+                  ("fiocchi d avena", "fette biscottate", "muesli", "pane di tipo integrale", "corn flakes",
+                   "biscotti secchi"), (), 40, 20, 90),
+    "cereali": (("Cereali e derivati",),
+                ("pasta di semola", "riso", "farro", "orzo", "quinoa", "couscous", "grano saraceno",
+                 "pane di tipo integrale", "miglio"), ("cott", "soffiato", "farina"), 80, 40, 140),
+    "proteico": (("Carni fresche", "Prodotti della pesca", "Legumi", "Uova", "Formaggi e latticini"), None,
+                 ("cott", "fritt", "scatola", "sott", "salamoia", "polvere", "farina", "isolato", "essicc",
+                  "affumic", "grattugiat", "fuso"), 120, 40, 250),
+    "verdura": (("Verdure e ortaggi",), None,
+                ("cott", "scatola", "sott", "surgel", "essicc", "fritt", "patat", "concentrat", "succo", "prezzemolo",
+                 "basilico", "rosmarino", "salvia", "aglio", "peperoncin", "capperi", "menta", "origano", "erba"),
+                200, 100, 400),
+    "frutta": (("Frutta",), None,
+               ("sciropp", "essicc", "disidrat", "candit", "secc", "succo", "marmellat", "cott", "sott", "oliv"),
+               150, 80, 300),
+    "latte": (("Latte e yogurt", "Prodotti vari"),
+              ("yogurt", "latte di vacca pastorizzato parzialmente", "latte di vacca uht parzialmente",
+               "soia bevanda", "soia yogurt"), ("polvere", "condensat", "evaporat", "panna", "crema"), 150, 100, 300),
+    "secca": (("Frutta secca a guscio e semi oleaginosi",), None, ("salat", "tostat", "farina", "burro", "essicc", "castagn"),
+              20, 10, 40),
+    "formaggio": (("Formaggi e latticini",), None, ("fuso", "light", "magro", "ricotta"), 50, 20, 100),
+    "olio": (("Oli e grassi",), ("olio di oliva extra vergine", "olio di oliva", "olio di girasole", "olio di mais"),
+             (), 10, 5, 25),
+}
+
+# Ruoli di ogni pasto (ordine di MEAL_TYPES)
+MEAL_TEMPLATES = (
+    ("latte", "colazione", "frutta"),
+    ("frutta", "secca"),
+    ("cereali", "proteico", "verdura", "olio"),
+    ("latte", "frutta"),
+    ("cereali", "proteico", "verdura", "olio"),
+)
+
+# Regimi senza cereali: grassi e proteine in più pasti
+LOW_CARB_TEMPLATES = (
+    ("latte", "proteico", "secca"),
+    ("secca",),
+    ("proteico", "formaggio", "verdura", "olio"),
+    ("latte", "secca"),
+    ("proteico", "formaggio", "verdura", "olio"),
+)
+REGIME_TEMPLATES = {"Chetogenica": LOW_CARB_TEMPLATES, "Paleo": LOW_CARB_TEMPLATES}
+
+# Pesi della funzione obiettivo
+W_MACRO = 4.0
+W_MEAL = 1.0
+W_MICRO = 0.5
+W_SODIUM = 10.0
+W_PORTION = 0.05
+ITERATIONS = 400
+
+
+def macro_targets(kcal, regime=None):
+    """Grammi di proteine, carboidrati e grassi per le kcal date e il regime."""
+    split = REGIME_MACRO_SPLIT.get(regime, DEFAULT_MACRO_SPLIT)
+    return {name: round(kcal * share / MACRO_KCAL[name], 1) for name, share in zip(MACRO_KCAL, split)}
+
+
+def _stem(word):
+    # "cipolla" deve escludere anche "Cipolle, crude"
+    return word[:-1] if len(word) > 4 and word[-1] in "aeio" else word
+
+
+def parse_exclusions(text):
+    """
+    Esclusioni in testo libero -> (categorie, parole). Separatori: virgola,
+    punto e virgola, "e"; le parole di servizio ("no", "odia", ...) si ignorano.
+    """
+    categories, keywords = set(), set()
+    parts = [p for chunk in re.split(r"[,;/\n]", text) for p in re.split(r"\be\b", fold_text(chunk))]
+    for part in parts:
+        words = [w for w in part.split() if w not in _EXCLUSION_STOPWORDS]
+        if not words:
+            continue
+        phrase = " ".join(words)
+        if phrase in EXCLUSION_CATEGORIES:
+            categories.update(EXCLUSION_CATEGORIES[phrase])
+            continue
+        for word in words:
+            if word in EXCLUSION_CATEGORIES:
+                categories.update(EXCLUSION_CATEGORIES[word])
+            elif word in EXCLUSION_KEYWORDS:
+                keywords.update(EXCLUSION_KEYWORDS[word])
+            elif len(word) >= 3:
+                keywords.add(_stem(word))
+    return categories, keywords
+
+
+def allowed_foods(names, categories, regime=None, exclusions=""):
+    """Maschera booleana degli alimenti ammessi da regime ed esclusioni."""
+    categories = np.asarray(categories, dtype=object)
+    excluded_categories, keywords = parse_exclusions(exclusions or "")
+    excluded_categories |= set(REGIME_EXCLUDED_CATEGORIES.get(regime, ()))
+    mask = ~np.isin(categories, list(excluded_categories))
+    if keywords:
+        folded = [fold_text(n) for n in names]
+        pattern = re.compile(r"\b(" + "|".join(re.escape(k) for k in sorted(keywords)) + r")")
+        mask &= np.array([pattern.search(n) is None for n in folded])
+    regime_words = REGIME_EXCLUDED_WORDS.get(regime)
+    if regime_words:
+        # Ricette e piatti pronti stanno in altre categorie: si riconoscono dal nome
+        # ("Soia, yogurt" resta ammesso: è il sostituto vegetale)
+        pattern = re.compile(r"\b(" + "|".join(re.escape(k) for k in regime_words) + r")")
+        mask &= np.array([pattern.search(n) is None or n.startswith("soia") for n in map(fold_text, names)])
+    return mask
+
+
+def role_candidates(names, categories, mask, nutrients=None, protein_col=None, kcal_col=None):
+    """Indici DB candidati per ogni ruolo (preferiti, altrimenti tutta la categoria)."""
+    folded = np.array([fold_text(n) for n in names], dtype=object)
+    categories = np.asarray(categories, dtype=object)
+    result = {}
+    for role, (cats, preferred, avoid, *_) in ROLES.items():
+        base = mask & np.isin(categories, cats)
+        if avoid:
+            base &= np.array([not any(a in n for a in avoid) for n in folded])
+        pool = np.flatnonzero(base)
+        if preferred:
+            chosen = [i for i in pool if any(folded[i].startswith(p) for p in preferred)]
+            pool = np.asarray(chosen, dtype=np.intp) if chosen else pool
+        if role == "proteico" and nutrients is not None and len(pool) > 4:
+            # Fonti proteiche vere: metà più ricca di proteine per kcal
+            density = nutrients[pool, protein_col] / np.maximum(nutrients[pool, kcal_col], 1.0)
+            pool = pool[density >= np.median(density)]
+        result[role] = pool
+    return result
+
+
+def choose_foods(candidates, n_days, seed=0, templates=MEAL_TEMPLATES):
+    """
+    Alimenti della settimana: lista di (giorno, pasto, indice DB, ruolo).
+    Ogni ruolo scorre una permutazione dei suoi candidati, così i giorni (e
+    pranzo/cena) non ripetono lo stesso alimento finché ce ne sono altri.
+    """
+    rng = np.random.default_rng(seed)
+    order = {role: rng.permutation(pool) for role, pool in candidates.items() if len(pool)}
+    cursor = {role: 0 for role in order}
+    items = []
+    for day in range(n_days):
+        for meal, roles in enumerate(templates):
+            used = set()
+            for role in roles:
+                if role not in order:
+                    continue  # Nessun alimento ammesso per il ruolo (es. latte per i vegani)
+                pool = order[role]
+                for _ in range(len(pool)):
+                    food = int(pool[cursor[role] % len(pool)])
+                    cursor[role] += 1
+                    if food not in used:
+                        break
+                used.add(food)
+                items.append((day, meal, food, role))
+    return items
+
+
+def _solve(A, meal_onehot, g0, lo, hi, terms, meal_share, portion_weight, iterations=ITERATIONS):
+    """
+    Risolve tutti i giorni insieme. A: (giorni, alimenti, nutrienti) per grammo;
+    meal_onehot: (giorni, alimenti, pasti); le righe di riempimento hanno
+    lo = hi = 0. terms: lista di (colonna, obiettivo, peso, tipo) con tipo
+    0 = uguaglianza, 1 = soglia minima, 2 = tetto. Restituisce i grammi
+    (giorni, alimenti).
+    """
+    # Termini lineari: colonne di B (giorni, alimenti, termini), obiettivo t, peso w, tipo
+    blocks, targets, weights, kinds = [], [], [], []
+    for col, target, weight, kind in terms:
+        blocks.append(A[:, :, [col]]); targets.append([target]); weights.append([weight]); kinds.append([kind])
+    if meal_share is not None:
+        kcal_col, kcal = terms[0][0], terms[0][1]
+        blocks.append(A[:, :, [kcal_col]] * meal_onehot)
+        targets.append(list(np.asarray(meal_share) * kcal))
+        weights.append([W_MEAL] * meal_onehot.shape[2]); kinds.append([0] * meal_onehot.shape[2])
+
+    B = np.concatenate(blocks, axis=2)
+    t = np.concatenate([np.asarray(x, dtype=np.float64) for x in targets])
+    w = np.concatenate([np.asarray(x, dtype=np.float64) for x in weights])
+    kind = np.concatenate([np.asarray(x) for x in kinds])
+    scale = np.where(t > 0, t, 1.0)
+    Bs = B / scale                                    # residui relativi
+    ts = t / scale
+    active = (hi > 0).astype(np.float64)
+    pw = portion_weight * active / np.maximum(g0, 1.0) ** 2
+
+    # Passo: 1 / costante di Lipschitz (limite superiore per giorno)
+    lipschitz = 2 * (np.einsum("dnq,q->d", Bs ** 2, w) + pw.max(axis=1))
+    step = (1.0 / np.maximum(lipschitz, 1e-12))[:, None]
+
+    def gradient(g):
+        r = np.einsum("dn,dnq->dq", g, Bs) - ts
+        r = np.where(kind == 1, np.minimum(r, 0.0), np.where(kind == 2, np.maximum(r, 0.0), r))
+        return 2 * np.einsum("dq,dnq->dn", r * w, Bs) + 2 * pw * (g - g0)
+
+    g = np.clip(g0, lo, hi)
+    y, momentum = g.copy(), 1.0
+    for _ in range(iterations):
+        g_next = np.clip(y - step * gradient(y), lo, hi)
+        momentum_next = (1 + np.sqrt(1 + 4 * momentum ** 2)) / 2
+        y = g_next + ((momentum - 1) / momentum_next) * (g_next - g)
+        g, momentum = g_next, momentum_next
+    return g
+
+
+def optimize_grams(nutrients, day, meal, food_idx, g0, lo, hi, n_days, n_meals, targets, meal_share=MEAL_KCAL_SHARE,
+                   portion_weight=W_PORTION, iterations=ITERATIONS):
+    """
+    Grammature ottimali per una lista di alimenti (arrays paralleli).
+    nutrients: matrice per 100 g (DB x nutrienti); targets: dict con
+    "kcal", "macro" {colonna: g}, "floors" {colonna: valore}, "sodium_cap"
+    e "cols" {"kcal", "sodium"} (indici di colonna). I giorni senza alimenti
+    restano vuoti. Restituisce i grammi nello stesso ordine.
+    """
+    day, meal = np.asarray(day, dtype=np.intp), np.asarray(meal, dtype=np.intp)
+    food_idx = np.asarray(food_idx, dtype=np.intp)
+    counts = np.bincount(day, minlength=n_days)
+    width = max(int(counts.max()) if len(counts) else 0, 1)
+    slot = np.zeros(len(day), dtype=np.intp)
+    for d in range(n_days):
+        slot[day == d] = np.arange(counts[d])
+
+    A = np.zeros((n_days, width, nutrients.shape[1]))
+    onehot = np.zeros((n_days, width, n_meals))
+    G0, LO, HI = (np.zeros((n_days, width)) for _ in range(3))
+    A[day, slot] = nutrients[food_idx] / 100.0
+    onehot[day, slot, meal] = 1.0
+    G0[day, slot], LO[day, slot], HI[day, slot] = g0, lo, hi
+
+    # Il primo termine è sempre quello delle kcal (serve alla ripartizione tra i pasti)
+    terms = [(targets["cols"]["kcal"], targets["kcal"], W_MACRO, 0)]
+    terms += [(col, value, W_MACRO, 0) for col, value in targets["macro"].items()]
+    terms += [(col, value, W_MICRO, 1) for col, value in targets.get("floors", {}).items()]
+    if targets.get("sodium_cap") and targets["cols"].get("sodium") is not None:
+        terms.append((targets["cols"]["sodium"], targets["sodium_cap"], W_SODIUM, 2))
+    grams = _solve(A, onehot, G0, LO, HI, terms, meal_share, portion_weight, iterations)
+    # Grammature "da cucina": multipli di 5 g
+    return np.clip(np.round(grams[day, slot] / 5.0) * 5.0, lo, hi)
+
+
+def role_bounds(roles):
+    """Porzione tipica, minimo e massimo per ogni ruolo della lista."""
+    spec = np.array([ROLES[r][3:] for r in roles], dtype=np.float64).reshape(-1, 3)
+    return spec[:, 0], spec[:, 1], spec[:, 2]
+
+
+def repair_bounds(grams, low_factor=0.3, high_factor=2.5):
+    """Intervalli per la riparazione: attorno ai grammi attuali, entro 5-500 g."""
+    grams = np.asarray(grams, dtype=np.float64)
+    return np.clip(grams * low_factor, 5, 500), np.clip(grams * high_factor, 5, 500)
+
+
+def day_totals(nutrients, day, food_idx, grams, n_days):
+    """Totali per giorno (giorni x nutrienti) di una lista di alimenti."""
+    totals = np.zeros((n_days, nutrients.shape[1]))
+    np.add.at(totals, np.asarray(day, dtype=np.intp), nutrients[np.asarray(food_idx, dtype=np.intp)]
+              * (np.asarray(grams, dtype=np.float64)[:, None] / 100.0))
+    return totals
@@ -0,0 +1,369 @@
+"""
+Archivio persistente dei piani settimanali e delle sessioni di chat.
+
+Del piano si salva il minimo: una riga per alimento con giorno, posizione,
+pasto, codice CREA (food_code, stabile tra versioni del DB a differenza
+dell'indice di riga) e grammi. I valori nutrizionali si ricavano dal DB al
+caricamento, come nel WeeklyPlan in memoria.
+
+  - backend intercambiabile: SQLiteBackend (default, file locale) o
+    MemoryBackend (solo processo corrente, per script e prove); un nuovo
+    backend implementa i metodi astratti di StorageBackend
+  - caricamento pigro per giorno: load_days() legge solo i giorni richiesti
+  - scrittura differita (write-behind): sync() confronta le versioni dei
+    pasti con l'ultimo salvataggio, copia le righe dei soli giorni cambiati
+    e le accoda; un timer le scrive in un'unica transazione ogni
+    FLUSH_INTERVAL secondi (scritture ripetute dello stesso giorno si
+    fondono). flush() forza la scrittura, anche all'uscita del processo;
+    close() scrive e rilascia l'archivio
+  - sessioni di chat: messaggi salvati in coda (solo quelli nuovi)
+
+Il modulo non dipende da Streamlit.
+"""
+import abc
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+import numpy as np
+
+from weekly_plan import WeeklyPlan
+
+DEFAULT_PATH = os.path.join(".plan_store", "plans.sqlite")
+FLUSH_INTERVAL = 2.0  # secondi tra una scrittura su disco e la successiva
+
+# Archivi aperti: un solo handler atexit li scrive tutti all'uscita del processo
+_OPEN_STORES = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_stores():
+    for store in list(_OPEN_STORES):
+        store.flush()
+
+
+class StorageBackend(abc.ABC):
+    """Interfaccia dei backend: righe compatte (meal, food_code, grams) per (piano, giorno)."""
+
+    @abc.abstractmethod
+    def read_days(self, plan_key, days):
+        """{giorno: [(meal, food_code, grams), ...]} in ordine di posizione."""
+
+    @abc.abstractmethod
+    def write_days(self, batch):
+        """batch: {(plan_key, giorno): righe}; sostituisce i giorni indicati in blocco."""
+
+    @abc.abstractmethod
+    def has_plan(self, plan_key):
+        """True se l'archivio contiene il piano."""
+
+    @abc.abstractmethod
+    def list_plans(self):
+        """[(plan_key, ultimo aggiornamento, alimenti)] dal più recente."""
+
+    @abc.abstractmethod
+    def delete_plan(self, plan_key):
+        """Cancella tutte le righe del piano."""
+
+    @abc.abstractmethod
+    def read_messages(self, session_key):
+        """Messaggi della sessione in ordine ([] se non esiste)."""
+
+    @abc.abstractmethod
+    def append_messages(self, session_key, start, messages):
+        """Scrive i messaggi a partire dalla posizione start (sovrascrive le successive)."""
+
+    def close(self):
+        """Rilascia le risorse del backend (connessioni, file)."""
+
+
+class MemoryBackend(StorageBackend):
+    """Backend in memoria (processo corrente)."""
+
+    def __init__(self):
+        self._days = {}
+        self._updated = {}
+        self._messages = {}
+        self._lock = threading.Lock()
+
+    def read_days(self, plan_key, days):
+        with self._lock:
+            return {d: list(self._days.get((plan_key, d), [])) for d in days}
+
+    def write_days(self, batch):
+        with self._lock:
+            now = time.time()
+            for (plan_key, day), rows in batch.items():
+                self._days[(plan_key, day)] = list(rows)
+                self._updated[plan_key] = now
+
+    def has_plan(self, plan_key):
+        return plan_key in self._updated
+
+    def list_plans(self):
+        with self._lock:
+            plans = [(key, updated, sum(len(r) for (k, _), r in self._days.items() if k == key))
+                     for key, updated in self._updated.items()]
+        return sorted(plans, key=lambda p: -p[1])
+
+    def delete_plan(self, plan_key):
+        with self._lock:
+            self._days = {k: v for k, v in self._days.items() if k[0] != plan_key}
+            self._updated.pop(plan_key, None)
+
+    def read_messages(self, session_key):
+        with self._lock:
+            return [dict(m) for m in self._messages.get(session_key, [])]
+
+    def append_messages(self, session_key, start, messages):
+        with self._lock:
+            stored = self._messages.setdefault(session_key, [])
+            del stored[start:]
+            stored.extend(dict(m) for m in messages)
+
+
+class SQLiteBackend(StorageBackend):
+    """Backend SQLite su file: una connessione condivisa dai thread, protetta da lock."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS plans (plan_key TEXT PRIMARY KEY, updated REAL);
+            CREATE TABLE IF NOT EXISTS plan_items (
+                plan_key TEXT, day INTEGER, pos INTEGER, meal INTEGER, food_code TEXT, grams REAL,
+                PRIMARY KEY (plan_key, day, pos)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                session_key TEXT, pos INTEGER, role TEXT, content TEXT, extra TEXT,
+                PRIMARY KEY (session_key, pos)) WITHOUT ROWID;
+        """)
+        self._db.commit()
+
+    def read_days(self, plan_key, days):
+        days = [int(d) for d in days]
+        result = {d: [] for d in days}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT day, meal, food_code, grams FROM plan_items WHERE plan_key = ? "
+                f"AND day IN ({','.join('?' * len(days))}) ORDER BY day, pos", (plan_key, *days)).fetchall()
+        for day, meal, code, grams in rows:
+            result[day].append((meal, code, grams))
+        return result
+
+    def write_days(self, batch):
+        now = time.time()
+        with self._lock, self._db:
+            for (plan_key, day), rows in batch.items():
+                self._db.execute("DELETE FROM plan_items WHERE plan_key = ? AND day = ?", (plan_key, day))
+                self._db.executemany("INSERT INTO plan_items VALUES (?, ?, ?, ?, ?, ?)",
+                                     [(plan_key, day, pos, meal, code, grams)
+                                      for pos, (meal, code, grams) in enumerate(rows)])
+            self._db.executemany("INSERT OR REPLACE INTO plans VALUES (?, ?)",
+                                 [(key, now) for key in {k for k, _ in batch}])
+
+    def has_plan(self, plan_key):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM plans WHERE plan_key = ?", (plan_key,)).fetchone() is not None
+
+    def list_plans(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT p.plan_key, p.updated, COUNT(i.pos) FROM plans p "
+                "LEFT JOIN plan_items i ON i.plan_key = p.plan_key "
+                "GROUP BY p.plan_key ORDER BY p.updated DESC").fetchall()
+
+    def delete_plan(self, plan_key):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM plan_items WHERE plan_key = ?", (plan_key,))
+            self._db.execute("DELETE FROM plans WHERE plan_key = ?", (plan_key,))
+
+    def read_messages(self, session_key):
+        with self._lock:
+            rows = self._db.execute("SELECT role, content, extra FROM chat_messages WHERE session_key = ? "
+                                    "ORDER BY pos", (session_key,)).fetchall()
+        return [{"role": role, "content": content, **json.loads(extra or "{}")} for role, content, extra in rows]
+
+    def append_messages(self, session_key, start, messages):
+        rows = []
+        for pos, message in enumerate(messages, start=start):
+            extra = {k: v for k, v in message.items() if k not in ("role", "content")}
+            rows.append((session_key, pos, message.get("role"), message.get("content"),
+                         json.dumps(extra, ensure_ascii=False, default=str) if extra else None))
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM chat_messages WHERE session_key = ? AND pos >= ?", (session_key, start))
+            self._db.executemany("INSERT INTO chat_messages VALUES (?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class StoredPlan:
+    """Piano aperto dall'archivio: giorni già caricati e versioni dei pasti all'ultimo salvataggio."""
+
+    def __init__(self, key, plan):
+        self.key = key
+        self.plan = plan
+        self.loaded = np.zeros(plan.n_days, dtype=bool)
+        self.saved = plan.slot_version.copy()
+        self.missing_codes = []  # codici salvati che non esistono più nel DB
+
+
+class PlanStore:
+    """
+    Piani e chat salvati su un backend, con caricamento per giorno e
+    scrittura differita. food_codes: codice CREA per riga del DB alimenti.
+    """
+
+    def __init__(self, backend, food_codes, flush_interval=FLUSH_INTERVAL):
+        self.backend = backend
+        self.food_codes = np.asarray(food_codes, dtype=object)
+        self._code_index = {code: row for row, code in enumerate(food_codes)}
+        self.flush_interval = flush_interval
+        self._pending = {}  # (plan_key, giorno) -> righe non ancora scritte
+        self._lock = threading.Lock()
+        self._timer = None
+        self.flushes = 0
+        self.last_error = None
+        _OPEN_STORES.add(self)
+
+    # --- Piani ---
+
+    def open(self, key, nutrients=None, n_days=7, n_meals=5, plan=None, replace=False):
+        """
+        Collega un piano alla chiave key senza leggere nulla: i giorni si
+        caricano con load_days(). Se si passa un piano già pieno e la chiave
+        non esiste ancora nell'archivio, il piano viene adottato così com'è;
+        con replace=True il piano passato sostituisce per intero quello salvato.
+        """
+        if plan is None:
+            plan = WeeklyPlan(n_days, n_meals, nutrients=nutrients)
+        stored = StoredPlan(key, plan)
+        if replace or (len(plan) and not self.has_plan(key)):
+            stored.loaded[:] = True
+            stored.saved[:] = -1  # tutto da salvare al prossimo sync
+        return stored
+
+    def has_plan(self, key):
+        with self._lock:
+            if any(k == key for k, _ in self._pending):
+                return True
+        return self.backend.has_plan(key)
+
+    def load_days(self, stored, days=None):
+        """Carica nel piano i giorni richiesti (None: tutti) non ancora letti."""
+        plan = stored.plan
+        wanted = range(plan.n_days) if days is None else days
+        todo = [int(d) for d in wanted if not stored.loaded[d]]
+        if not todo:
+            return 0
+        with self._lock:
+            pending = {d: self._pending[(stored.key, d)] for d in todo if (stored.key, d) in self._pending}
+        rows_by_day = self.backend.read_days(stored.key, [d for d in todo if d not in pending])
+        rows_by_day.update(pending)
+
+        count = 0
+        for day in todo:
+            by_meal = {}
+            for meal, code, grams in rows_by_day.get(day, []):
+                row = self._code_index.get(code)
+                if row is None:
+                    stored.missing_codes.append(code)
+                    continue
+                foods, weights = by_meal.setdefault(int(meal), ([], []))
+                foods.append(row)
+                weights.append(grams)
+            for meal, (foods, weights) in by_meal.items():
+                plan.add_many(day, meal, foods, weights)
+                count += len(foods)
+            stored.loaded[day] = True
+            stored.saved[day] = plan.slot_version[day]
+        return count
+
+    def sync(self, stored):
+        """
+        Accoda le righe dei giorni modificati dall'ultimo sync (senza
+        scrivere su disco). Restituisce il numero di giorni accodati.
+        """
+        plan = stored.plan
+        dirty = np.flatnonzero((plan.slot_version != stored.saved).any(axis=1))
+        if len(dirty) == 0:
+            return 0
+        # Un giorno mai letto ma modificato: prima si recuperano le righe salvate
+        self.load_days(stored, [d for d in dirty if not stored.loaded[d]])
+
+        batch = {}
+        for day in dirty.tolist():
+            pos = plan.positions(day=day)
+            batch[(stored.key, day)] = list(zip(plan.meal[pos].tolist(), self.food_codes[plan.food_idx[pos]].tolist(),
+                                                np.round(plan.grams[pos].astype(np.float64), 2).tolist()))
+        stored.saved = plan.slot_version.copy()
+        with self._lock:
+            self._pending.update(batch)
+            if self.flush_interval > 0 and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.flush_interval <= 0:
+            self.flush()
+        return len(batch)
+
+    def flush(self):
+        """Scrive subito tutte le modifiche in coda (una transazione)."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not batch:
+            return 0
+        try:
+            self.backend.write_days(batch)
+        except sqlite3.Error as e:
+            # Scrittura fallita (disco pieno, DB bloccato): le righe tornano in
+            # coda senza sovrascrivere quelle più recenti, si riprova al prossimo sync
+            self.last_error = e
+            with self._lock:
+                for key, rows in batch.items():
+                    self._pending.setdefault(key, rows)
+            return 0
+        self.last_error = None
+        self.flushes += 1
+        return len(batch)
+
+    def close(self):
+        """Scrive le modifiche in coda e chiude il backend (l'archivio non è più utilizzabile)."""
+        _OPEN_STORES.discard(self)
+        self.flush()
+        self.backend.close()
+
+    def list_plans(self):
+        self.flush()
+        return self.backend.list_plans()
+
+    def delete_plan(self, key):
+        with self._lock:
+            self._pending = {k: v for k, v in self._pending.items() if k[0] != key}
+        self.backend.delete_plan(key)
+
+    # --- Sessioni di chat ---
+
+    def load_messages(self, session_key):
+        return self.backend.read_messages(session_key)
+
+    def save_messages(self, session_key, messages, start=None):
+        """
+        Salva i messaggi della sessione. start: quanti sono già salvati
+        (default: letti dal backend); si scrivono solo quelli successivi.
+        """
+        if start is None:
+            start = len(self.backend.read_messages(session_key))
+        if len(messages) > start:
+            self.backend.append_messages(session_key, start, messages[start:])
+        return len(messages)
@@ -0,0 +1,625 @@
+"""
+Motore del Meal Planner, senza Streamlit.
+
+DB alimenti, matching dei nomi, piano settimanale (WeeklyPlan), totali,
+analisi, ottimizzatore e sostituzioni. Ogni funzione riceve lo stato in modo
+esplicito (il DataFrame del DB, il piano): niente session state, niente
+messaggi a video, gli errori sono eccezioni. Si può quindi usare da job
+batch, pool di processi e server.
+
+meal_planner_logic è l'adattatore Streamlit: tiene il piano nel session
+state, mette in cache il DB e mostra gli errori.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import food_snapshot
+import nutrition_reference
+import plan_optimizer
+from ai_plan_parser import parse_grams_cell
+from food_search import FoodSearchIndex, fold_text, normalize_query
+from food_substitutes import SubstitutionIndex
+from weekly_plan import WeeklyPlan
+
+# --- COSTANTI DI CONFIGURAZIONE ---
+CSV_DB_PATH = "crea_food_composition_tables.csv"
+# Snapshot colonnare pre-compilato del CSV (vedi food_snapshot.py)
+FOOD_DB_CACHE_DIR = ".food_db_cache"
+
+# Mappatura colonne: {Nome_Colonna_CSV : Nome_Visualizzato_UI}
+COLUMN_MAPPING = {
+    # Macro
+    "name": "Nome",
+    "food_code": "Codice",
+    "english_name": "Nome Inglese",
+    "category": "Categoria",
+    "energy_kcal": "Kcal",
+    "proteins": "Proteine",
+    "available_carbohydrates": "Carboidrati",
+    "lipids": "Grassi",
+    "total_fiber": "Fibre",
+    # Micro Minerali (selezionati in base alla copertura > 60%)
+    "calcium": "Calcio",
+    "iron": "Ferro",
+    "phosphorus": "Fosforo",
+    "potassium": "Potassio",
+    "sodium": "Sodio",
+    # Micro Vitamine (selezionati in base alla copertura > 55%)
+    "thiamine": "Vit B1",
+    "riboflavin": "Vit B2",
+    "niacin": "Vit B3"
+}
+
+# Lista tecnica dei Micro (usata per i cicli di calcolo)
+MICRO_LIST = ["Calcio", "Ferro", "Fosforo", "Potassio", "Sodio", "Vit B1", "Vit B2", "Vit B3"]
+
+# Colonne numeriche del DB (Macro + Micro)
+NUMERIC_COLS = ["Kcal", "Proteine", "Carboidrati", "Grassi", "Fibre"] + MICRO_LIST
+
+# Nutrienti riportati nei totali giornalieri
+TOTAL_KEYS = ["Kcal", "Proteine", "Carboidrati", "Grassi"] + MICRO_LIST
+
+# Nome delle colonne "totale" nella tabella di un pasto
+ITEM_TOTAL_COLUMNS = {"Kcal": "Kcal_tot", "Proteine": "Prot_tot", "Carboidrati": "Carb_tot", "Grassi": "Grassi_tot", "Fibre": "Fibre_tot"}
+ITEM_TOTAL_COLUMNS.update({micro: f"{micro}_tot" for micro in MICRO_LIST})
+
+# Unità di misura per nutriente (per 100 g nel DB, per giorno nei totali)
+NUTRIENT_UNITS = {"Kcal": "kcal", "Proteine": "g", "Carboidrati": "g", "Grassi": "g", "Fibre": "g"}
+NUTRIENT_UNITS.update({micro: "mg" for micro in MICRO_LIST})
+
+# Struttura temporale del piano
+DAYS_OF_WEEK = ["Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato", "Domenica"]
+MEAL_TYPES = ["Colazione", "Spuntino Mattina", "Pranzo", "Spuntino Pomeriggio", "Cena"]
+
+# --- 1. DATABASE ALIMENTI ---
+
+def load_food_db(csv_path=CSV_DB_PATH, cache_dir=FOOD_DB_CACHE_DIR):
+    """
+    Carica il database degli alimenti (Macro e Micro nutrienti) dallo
+    snapshot colonnare. Solleva FileNotFoundError se il CSV non esiste.
+    """
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"File database '{csv_path}' non trovato.")
+
+    # Snapshot colonnare pre-compilato: niente parsing pandas del CSV completo
+    df = food_snapshot.load_food_table(csv_path, cache_dir, COLUMN_MAPPING, NUMERIC_COLS)
+
+    # Creazione colonna "Etichetta" per UI
+    df["Etichetta"] = (
+        df["Nome"] + " (" + df["Kcal"].astype(int).astype(str) + " kcal)"
+    )
+    return df
+
+# Risorse derivate dal DB (matrice nutrienti, indici), per impronta del DB:
+# chi usa st.cache_data riceve ogni volta una copia del DataFrame, quindi
+# non possiamo usare l'id dell'oggetto
+_DB_RESOURCES = {}
+
+def _db_fingerprint(db_df):
+    sha = db_df.attrs.get("food_db_sha256")
+    if sha is None:
+        sha = hash(tuple(db_df['Nome']))
+    return sha, len(db_df)
+
+def get_nutrient_matrix(db_df):
+    """
+    Matrice dei nutrienti per 100 g (righe DB x NUMERIC_COLS), in float64.
+    """
+    key = ("nutrienti", _db_fingerprint(db_df))
+    matrix = _DB_RESOURCES.get(key)
+    if matrix is None:
+        matrix = db_df[NUMERIC_COLS].to_numpy(dtype=float)
+        matrix.setflags(write=False)
+        _DB_RESOURCES[key] = matrix
+    return matrix
+
+def get_label_index(db_df):
+    """
+    Mappa Etichetta -> indice di riga del DB (prima occorrenza), calcolata una
+    sola volta per DB: l'aggiunta dal picker non scansiona più la tabella.
+    """
+    key = ("etichette", _db_fingerprint(db_df))
+    mapping = _DB_RESOURCES.get(key)
+    if mapping is None:
+        mapping = {}
+        for row, label in enumerate(db_df["Etichetta"].tolist()):
+            mapping.setdefault(label, row)
+        _DB_RESOURCES[key] = mapping
+    return mapping
+
+def food_row_by_label(label, db_df):
+    """Riga del DB per l'etichetta mostrata nel picker (None se sconosciuta)."""
+    row = get_label_index(db_df).get(label)
+    return None if row is None else db_df.iloc[row]
+
+def food_row_index(food_row, db_df):
+    """Indice di riga nel DB per una riga restituita da load_food_db()."""
+    if isinstance(food_row.name, (int, np.integer)):
+        return int(food_row.name)
+    return int(np.flatnonzero(db_df['Nome'].to_numpy() == food_row["Nome"])[0])
+
+# --- 2. MATCHING DEI NOMI ---
+
+def get_food_search_index(db_df):
+    """
+    Restituisce l'indice di ricerca sui nomi del DB, costruendolo una sola volta.
+    """
+    key = ("ricerca", _db_fingerprint(db_df))
+    index = _DB_RESOURCES.get(key)
+    if index is None:
+        aliases = db_df['Nome Inglese'].tolist() if 'Nome Inglese' in db_df.columns else None
+        index = FoodSearchIndex(db_df['Nome'].tolist(), aliases)
+        _DB_RESOURCES[key] = index
+    return index
+
+def suggest_foods(query, db_df, k=10):
+    """
+    Etichette dei k alimenti più vicini alla query, per il picker
+    "cerca mentre scrivi": al browser arrivano solo questi, non tutto il DB.
+    Prima i nomi che contengono tutte le parole digitate (anche come inizio
+    parola), poi gli altri per similarità dei trigrammi.
+    """
+    words = fold_text(query).split()
+    if not words:
+        return []
+    labels = db_df["Etichetta"]
+    names = db_df["Nome"]
+    hits = get_food_search_index(db_df).search(query, k=k * 3)
+
+    def rank(hit):
+        name_words = fold_text(names.iat[hit[0]]).split()
+        contains = all(any(nw.startswith(w) for nw in name_words) for w in words)
+        return (not contains, -hit[1])
+
+    return [labels.iat[row] for row, _ in sorted(hits, key=rank)[:k]]
+
+def find_closest_food_match(search_term, db_df):
+    """
+    Cerca l'alimento più simile nel DB usando l'indice di ricerca.
+    Restituisce la riga del DF o None se non trova nulla di decente.
+    """
+    # 1. Match "fuzzy" (cutoff 0.5 significa che deve assomigliare almeno al 50%)
+    # 2. Fallback: Cerca se la parola è contenuta (es. "Soia" in "Latte di soia")
+    # 3. Ultimo tentativo: trigrammi senza accenti, sinonimi e nomi inglesi
+    match = get_food_search_index(db_df).best_match(search_term)
+    if match is None:
+        return None
+    return db_df.iloc[match[0]]
+
+def match_foods_batch(food_queries, db_df):
+    """
+    Matching in blocco: deduplica le query e risolve ogni alimento distinto
+    una sola volta. Restituisce due dizionari indicizzati per query
+    normalizzata: {query: riga DF o None} e {query: confidenza 0-1}.
+    """
+    matches = get_food_search_index(db_df).match_many(food_queries)
+    rows, confidence = {}, {}
+    for query, match in matches.items():
+        rows[query] = db_df.iloc[match[0]] if match is not None else None
+        confidence[query] = round(match[1], 3) if match is not None else 0.0
+    return rows, confidence
+
+# --- 3. PIANO SETTIMANALE ---
+
+def new_plan(db_df):
+    """Piano vuoto collegato alla matrice nutrienti del DB (totali incrementali)."""
+    return WeeklyPlan(len(DAYS_OF_WEEK), len(MEAL_TYPES), nutrients=get_nutrient_matrix(db_df))
+
+def add_food_to_meal(plan, db_df, day, meal, food_row, grams):
+    """
+    Aggiunge un alimento al pasto. Nel piano si salvano solo indice DB e
+    grammi: i valori nutrizionali si ricavano dalla matrice del DB.
+    """
+    plan.add(DAYS_OF_WEEK.index(day), MEAL_TYPES.index(meal), food_row_index(food_row, db_df), float(grams))
+
+def clear_day(plan, day):
+    plan.clear(day=DAYS_OF_WEEK.index(day))
+
+def meal_items_df(plan, db_df, day, meal):
+    """Tabella del pasto: Nome, Grammi, totali Macro/Micro e ID riga."""
+    positions = plan.positions(DAYS_OF_WEEK.index(day), MEAL_TYPES.index(meal))
+    if len(positions) == 0:
+        return pd.DataFrame()
+    totals = plan.item_totals(positions, get_nutrient_matrix(db_df)).round(1)
+    items = pd.DataFrame({
+        "Nome": db_df['Nome'].to_numpy()[plan.food_idx[positions]],
+        "Grammi": plan.grams[positions].astype(float),
+    })
+    for j, col in enumerate(NUMERIC_COLS):
+        items[ITEM_TOTAL_COLUMNS[col]] = totals[:, j]
+    items["ID"] = plan.item_id[positions]
+    return items
+
+def apply_editor_delta(plan, delta, item_ids):
+    """
+    Applica al piano il delta di un data_editor (righe modificate o cancellate;
+    l'editor non permette di aggiungerne). item_ids: ID delle righe nell'ordine
+    in cui sono state mostrate.
+    """
+    to_remove = [item_ids[pos] for pos in delta.get("deleted_rows", []) if pos < len(item_ids)]
+
+    for pos, changes in delta.get("edited_rows", {}).items():
+        pos = int(pos)
+        if pos >= len(item_ids) or "Grammi" not in changes:
+            continue
+        try:
+            grams = float(changes["Grammi"])
+        except (TypeError, ValueError):
+            continue # Salta valori non numerici
+        if grams > 0:
+            plan.set_grams(item_ids[pos], grams)
+        else:
+            to_remove.append(item_ids[pos]) # 0 grammi = cancella
+
+    if to_remove:
+        plan.remove(to_remove)
+
+# --- 4. IMPORT DEI PIANI AI ---
+
+MEAL_MAP = {
+    "colazione": "Colazione", "breakfast": "Colazione",
+    "spuntino mattina": "Spuntino Mattina", "snack 1": "Spuntino Mattina", "merenda mattina": "Spuntino Mattina",
+    "pranzo": "Pranzo", "lunch": "Pranzo",
+    "spuntino pomeriggio": "Spuntino Pomeriggio", "snack 2": "Spuntino Pomeriggio", "merenda": "Spuntino Pomeriggio",
+    "cena": "Cena", "dinner": "Cena"
+}
+
+def normalize_day_name(raw_day):
+    """
+    Cerca di capire a quale giorno della settimana si riferisce la stringa,
+    gestendo errori di accenti, inglese o abbreviazioni.
+    """
+    if not isinstance(raw_day, str):
+        return None # null/numeri nel JSON dell'AI: giorno non riconosciuto
+    raw = raw_day.lower().strip()
+
+    # Mappa flessibile
+    mapping = {
+        "lunedì": "Lunedì", "lunedi": "Lunedì", "monday": "Lunedì", "mon": "Lunedì",
+        "martedì": "Martedì", "martedi": "Martedì", "tuesday": "Martedì", "tue": "Martedì",
+        "mercoledì": "Mercoledì", "mercoledi": "Mercoledì", "wednesday": "Mercoledì", "wed": "Mercoledì",
+        "giovedì": "Giovedì", "giovedi": "Giovedì", "thursday": "Giovedì", "thu": "Giovedì",
+        "venerdì": "Venerdì", "venerdi": "Venerdì", "friday": "Venerdì", "fri": "Venerdì",
+        "sabato": "Sabato", "saturday": "Sabato", "sat": "Sabato",
+        "domenica": "Domenica", "sunday": "Domenica", "sun": "Domenica"
+    }
+
+    return mapping.get(raw, None)
+
+def normalize_meal_name(raw_meal):
+    """Pasto del piano per la stringa dell'AI (default: Colazione)."""
+    raw_meal = raw_meal.lower() if isinstance(raw_meal, str) else ""
+    for key, val in MEAL_MAP.items():
+        if key in raw_meal:
+            return val
+    return "Colazione"
+
+def normalize_grams(raw_grams):
+    """
+    Grammi della riga dell'AI: numeri o testi come "80", "80 g", "80-100 g"
+    (valore medio); null vale 100 g come il campo mancante. None se il valore
+    non si interpreta o non è positivo.
+    """
+    if raw_grams is None:
+        return 100.0
+    if isinstance(raw_grams, str):
+        grams = parse_grams_cell(raw_grams)
+    elif isinstance(raw_grams, (int, float, np.number)) and not isinstance(raw_grams, bool):
+        grams = float(raw_grams)
+    else:
+        grams = None
+    return grams if grams is not None and np.isfinite(grams) and grams > 0 else None
+
+def match_ai_plan(db_df, ai_json_plan):
+    """
+    Risolve le righe {"day", "meal", "food", "grams"} estratte dall'AI senza
+    toccare il piano: giorni e pasti normalizzati, matching in blocco.
+    Restituisce una lista di dict (uno per riga) con "stato" "ok",
+    "giorno" (giorno non riconosciuto), "non_trovato" (anche alimento
+    vuoto o null) o "grammi" (quantità non valida), "riga" del DB, "nome"
+    e "confidenza".
+    """
+    # Un solo passaggio di matching per tutti gli alimenti distinti del piano
+    food_rows, food_conf = match_foods_batch([item.get('food', '') for item in ai_json_plan], db_df)
+
+    matches = []
+    for item in ai_json_plan:
+        raw_day = item.get('day', '')
+        food_query = item.get('food', '')
+        record = {"day": raw_day, "meal": item.get('meal', ''), "food": food_query,
+                  "grams": normalize_grams(item.get('grams', 100)), "giorno": normalize_day_name(raw_day),
+                  "pasto": normalize_meal_name(item.get('meal', '')),
+                  "stato": "ok", "riga": None, "nome": None, "confidenza": 0.0}
+        if not record["giorno"]:
+            record["stato"] = "giorno"
+        elif record["grams"] is None:
+            record["stato"] = "grammi"
+            record["grams"] = item.get('grams')
+        else:
+            # Match già risolto in blocco
+            query_key = normalize_query(food_query)
+            match_row = food_rows.get(query_key)
+            if match_row is None:
+                record["stato"] = "non_trovato"
+            else:
+                record["riga"] = food_row_index(match_row, db_df)
+                record["nome"] = match_row['Nome']
+                record["confidenza"] = food_conf[query_key]
+        matches.append(record)
+    return matches
+
+def add_matches_to_plan(plan, matches):
+    """Aggiunge al piano le righe risolte da match_ai_plan (restituisce quante)."""
+    count_added = 0
+    for record in matches:
+        if record["stato"] == "ok":
+            plan.add(DAYS_OF_WEEK.index(record["giorno"]), MEAL_TYPES.index(record["pasto"]),
+                     record["riga"], record["grams"])
+            count_added += 1
+    return count_added
+
+def import_ai_plan(plan, db_df, ai_json_plan):
+    """
+    Importa nel piano le righe {"day", "meal", "food", "grams"} estratte
+    dall'AI: giorni normalizzati e matching tollerante, risolto in blocco.
+    Restituisce (alimenti aggiunti, log).
+    """
+    matches = match_ai_plan(db_df, ai_json_plan)
+    count_added = add_matches_to_plan(plan, matches)
+
+    debug_log = [] # Raccogliamo info per capire cosa succede
+    for record in matches:
+        if record["stato"] == "giorno":
+            debug_log.append(f"❌ Giorno non riconosciuto: '{record['day']}'")
+        elif record["stato"] == "non_trovato":
+            debug_log.append(f"⚠️ Cibo non trovato: '{record['food']}'")
+        elif record["stato"] == "grammi":
+            debug_log.append(f"⚠️ Grammi non validi per '{record['food']}': '{record['grams']}'")
+        else:
+            debug_log.append(f"✅ Aggiunto: {record['giorno']} | {record['food']} -> {record['nome']} "
+                             f"({record['confidenza']:.0%})")
+    return count_added, debug_log
+
+# --- 5. TOTALI E ANALISI ---
+
+def daily_totals(plan, day):
+    # I totali per pasto sono aggiornati in modo incrementale da aggiunte,
+    # modifiche e cancellazioni: qui si legge solo il valore già calcolato
+    totals = plan.day_totals(DAYS_OF_WEEK.index(day))
+    return {k: round(float(totals[NUMERIC_COLS.index(k)]), 1) for k in TOTAL_KEYS}
+
+def week_totals(plan):
+    """Totali per giorno della settimana (DataFrame giorni x nutrienti)."""
+    return pd.DataFrame(plan.week_totals(), index=DAYS_OF_WEEK, columns=NUMERIC_COLS).round(1)
+
+def week_analytics(plan, sex="Uomo", age=30, weight=None):
+    """
+    Analisi dell'intera settimana in un solo passaggio sui totali per pasto
+    (già aggiornati in modo incrementale), per tutti i NUMERIC_COLS:
+    media per pasto, totale per giorno, media/min/max giornaliera e
+    confronto con i riferimenti LARN/EFSA per sesso ed età.
+    Medie e min/max considerano solo i giorni con almeno un alimento.
+    Restituisce un DataFrame con una riga per nutriente (UI, PDF, export).
+    """
+    meal_totals = plan.meal_totals()                     # giorni x pasti x nutrienti
+    day_totals = meal_totals.sum(axis=1)                 # giorni x nutrienti
+    filled = np.bincount(plan.day[:len(plan)], minlength=plan.n_days) > 0
+    if filled.any():
+        per_meal = meal_totals[filled].mean(axis=0)      # pasti x nutrienti
+        days = day_totals[filled]
+        mean, low, high = days.mean(axis=0), days.min(axis=0), days.max(axis=0)
+    else:
+        per_meal = np.zeros(meal_totals.shape[1:])
+        mean = low = high = np.zeros(len(NUMERIC_COLS))
+
+    table = pd.DataFrame(index=pd.Index(NUMERIC_COLS, name="Nutriente"))
+    table["Unità"] = [NUTRIENT_UNITS[n] for n in NUMERIC_COLS]
+    for m, meal in enumerate(MEAL_TYPES):
+        table[meal] = per_meal[m]
+    for d, day in enumerate(DAYS_OF_WEEK):
+        table[day] = day_totals[d]
+    table["Media"], table["Min"], table["Max"] = mean, low, high
+    table = table.round(1)
+
+    refs = nutrition_reference.reference_intakes(sex, age, weight)
+    kcal = float(mean[NUMERIC_COLS.index("Kcal")])
+    riferimento, percentuale, stato = [], [], []
+    for n, nutrient in enumerate(NUMERIC_COLS):
+        ref = refs.get(nutrient)
+        if ref is None or not filled.any():
+            riferimento.append(_format_reference(ref))
+            percentuale.append(np.nan)
+            stato.append("")
+            continue
+        share, esito = nutrition_reference.assess(nutrient, float(mean[n]), ref, kcal)
+        riferimento.append(_format_reference(ref))
+        percentuale.append(np.nan if share is None else round(share))
+        stato.append({"ok": "OK", "basso": "Basso", "alto": "Alto"}.get(esito, ""))
+    table["Riferimento"] = riferimento
+    table["% Rif."] = percentuale
+    table["Stato"] = stato
+    return table
+
+def _format_reference(ref):
+    if ref is None:
+        return ""
+    if ref["tipo"] == "energia":
+        return f"{ref['valore'][0]}–{ref['valore'][1]} {ref['unita']}"
+    # "min"/"max" in chiaro: i simboli ≥/≤ non esistono nei font base del PDF
+    sign = "max" if ref["tipo"] == "massimo" else "min"
+    return f"{sign} {ref['valore']:g} {ref['unita']}"
+
+def week_analytics_markdown(table, columns=("Unità", "Media", "Min", "Max", "Riferimento", "% Rif.", "Stato")):
+    """Tabella Markdown compatta dell'analisi (per il report PDF)."""
+    columns = list(columns)
+    lines = ["| Nutriente | " + " | ".join(columns) + " |", "|" + "---|" * (len(columns) + 1)]
+    for nutrient, row in table[columns].iterrows():
+        cells = ["" if isinstance(v, float) and np.isnan(v) else f"{v:g}" if isinstance(v, float) else str(v)
+                 for v in row]
+        lines.append(f"| {nutrient} | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+# --- 6. OTTIMIZZATORE LOCALE (GENERAZIONE E RIPARAZIONE DEL PIANO) ---
+
+def estimate_kcal(profile):
+    """Fabbisogno energetico stimato dal profilo del paziente (Mifflin-St Jeor x attività)."""
+    return nutrition_reference.energy_requirement(profile.get("sesso", "Uomo"), profile.get("eta", 30),
+                                                  profile.get("peso", 70), profile.get("altezza", 170),
+                                                  profile.get("attivita", "Sedentario"))
+
+def optimizer_targets(profile, kcal=None, regime=None):
+    """
+    Obiettivi giornalieri per l'ottimizzatore: kcal (stimate dal profilo se
+    non date), macro per regime, soglie minime dei micro LARN e tetto del sodio.
+    profile: dict {"sesso", "eta", "peso", "altezza", "attivita", "regime", ...}.
+    """
+    sex, age, weight = profile.get("sesso", "Uomo"), profile.get("eta", 30), profile.get("peso", 70)
+    kcal = kcal or estimate_kcal(profile)
+    regime = regime or profile.get("regime")
+    refs = nutrition_reference.reference_intakes(sex, age, weight)
+    floors = {n: r["valore"] for n, r in refs.items() if r["tipo"] == "minimo" and n in NUMERIC_COLS and n != "Proteine"}
+    return {
+        "kcal": float(kcal),
+        "macro": plan_optimizer.macro_targets(kcal, regime),
+        "floors": floors,
+        "sodium_cap": refs["Sodio"]["valore"],
+    }
+
+def _solver_targets(targets):
+    """Obiettivi con gli indici di colonna della matrice nutrienti."""
+    return {
+        "kcal": targets["kcal"],
+        "macro": {NUMERIC_COLS.index(n): v for n, v in targets["macro"].items()},
+        "floors": {NUMERIC_COLS.index(n): v for n, v in targets.get("floors", {}).items()},
+        "sodium_cap": targets.get("sodium_cap"),
+        "cols": {"kcal": NUMERIC_COLS.index("Kcal"), "sodium": NUMERIC_COLS.index("Sodio")},
+    }
+
+def optimizer_report(db_df, day, food_idx, grams, targets):
+    """Totali per giorno vs obiettivi (DataFrame giorni x Kcal/macro/Sodio)."""
+    totals = plan_optimizer.day_totals(get_nutrient_matrix(db_df), day, food_idx, grams, len(DAYS_OF_WEEK))
+    cols = ["Kcal"] + list(targets["macro"]) + ["Fibre", "Sodio"]
+    report = pd.DataFrame(totals[:, [NUMERIC_COLS.index(c) for c in cols]], index=DAYS_OF_WEEK, columns=cols).round(0)
+    report.loc["Obiettivo"] = [targets["kcal"]] + list(targets["macro"].values()) + \
+        [targets["floors"].get("Fibre", np.nan), targets.get("sodium_cap", np.nan)]
+    return report
+
+def allowed_food_mask(db_df, regime=None, exclusions=""):
+    """Alimenti ammessi da regime ed esclusioni (maschera per riga del DB, memorizzata)."""
+    key = ("ammessi", _db_fingerprint(db_df), regime, exclusions)
+    mask = _DB_RESOURCES.get(key)
+    if mask is None:
+        mask = plan_optimizer.allowed_foods(db_df["Nome"].tolist(), db_df["Categoria"].tolist(), regime, exclusions)
+        mask.setflags(write=False)
+        _DB_RESOURCES[key] = mask
+    return mask
+
+def generate_week_plan(plan, db_df, targets, regime=None, exclusions="", seed=0):
+    """
+    Genera l'intera settimana in locale (nessuna chiamata AI) e sostituisce
+    il contenuto del piano. Gli alimenti rispettano regime ed esclusioni
+    (colonna CREA "Categoria" + nomi); le grammature arrivano
+    dall'ottimizzatore. Restituisce il report per giorno (optimizer_report).
+    """
+    nutrients = get_nutrient_matrix(db_df)
+    mask = allowed_food_mask(db_df, regime, exclusions)
+    candidates = plan_optimizer.role_candidates(db_df["Nome"].tolist(), db_df["Categoria"].tolist(), mask, nutrients,
+                                                NUMERIC_COLS.index("Proteine"), NUMERIC_COLS.index("Kcal"))
+    templates = plan_optimizer.REGIME_TEMPLATES.get(regime, plan_optimizer.MEAL_TEMPLATES)
+    items = plan_optimizer.choose_foods(candidates, len(DAYS_OF_WEEK), seed=seed, templates=templates)
+    if not items:
+        return None
+    day, meal, food_idx, roles = (list(col) for col in zip(*items))
+    g0, lo, hi = plan_optimizer.role_bounds(roles)
+    grams = plan_optimizer.optimize_grams(nutrients, day, meal, food_idx, g0, lo, hi, len(DAYS_OF_WEEK),
+                                          len(MEAL_TYPES), _solver_targets(targets))
+
+    plan.clear()
+    for d in range(len(DAYS_OF_WEEK)):
+        for m in range(len(MEAL_TYPES)):
+            sel = [i for i in range(len(day)) if day[i] == d and meal[i] == m]
+            if sel:
+                plan.add_many(d, m, [food_idx[i] for i in sel], [float(grams[i]) for i in sel])
+    return optimizer_report(db_df, day, food_idx, grams, targets)
+
+def repair_week_plan(plan, db_df, targets):
+    """
+    Ricalibra le grammature del piano (es. importato dall'AI) per
+    avvicinarlo agli obiettivi, senza cambiare gli alimenti e senza chiamare
+    il modello. Restituisce il report per giorno (None se il piano è vuoto).
+    """
+    n = len(plan)
+    if n == 0:
+        return None
+    day, meal = plan.day[:n].astype(int), plan.meal[:n].astype(int)
+    food_idx, current = plan.food_idx[:n].astype(int), plan.grams[:n].astype(float)
+    lo, hi = plan_optimizer.repair_bounds(current)
+    grams = plan_optimizer.optimize_grams(get_nutrient_matrix(db_df), day, meal, food_idx, current, lo, hi,
+                                          len(DAYS_OF_WEEK), len(MEAL_TYPES), _solver_targets(targets),
+                                          portion_weight=plan_optimizer.W_PORTION * 4)
+    # Stesso ordine delle righe del piano: un solo aggiornamento incrementale
+    plan.set_grams(plan.item_id[:n].copy(), grams)
+    return optimizer_report(db_df, day, food_idx, grams, targets)
+
+# --- 7. SOSTITUZIONI (ALIMENTI VICINI NELLO SPAZIO DEI NUTRIENTI) ---
+
+def get_substitution_index(db_df):
+    """Indice k-NN dei sostituti, costruito una volta per DB."""
+    key = ("sostituti", _db_fingerprint(db_df))
+    index = _DB_RESOURCES.get(key)
+    if index is None:
+        macro = [NUMERIC_COLS.index(c) for c in ("Kcal", "Proteine", "Carboidrati", "Grassi", "Fibre")]
+        index = SubstitutionIndex(get_nutrient_matrix(db_df), db_df["Categoria"].tolist(), macro,
+                                  NUMERIC_COLS.index("Kcal"), NUMERIC_COLS.index("Proteine"))
+        _DB_RESOURCES[key] = index
+    return index
+
+def substitute_options(plan, db_df, item_id, k=5, same_category=True, match="kcal", allowed=None):
+    """
+    Sostituti per una riga del piano: lista di dict {"indice", "Nome",
+    "Grammi", "Somiglianza"} con i grammi che pareggiano kcal o proteine.
+    """
+    pos = plan._position_of(item_id)
+    if len(pos) == 0:
+        return []
+    names = db_df["Nome"].to_numpy()
+    food, grams = int(plan.food_idx[pos[0]]), float(plan.grams[pos[0]])
+    return [{"indice": i, "Nome": names[i], "Grammi": g, "Somiglianza": round(score, 3)}
+            for i, score, g in get_substitution_index(db_df).substitutes(food, grams, k, same_category, allowed, match)]
+
+def swap_food(plan, item_id, food_idx, grams):
+    """Sostituisce l'alimento di una riga del piano (stessa posizione nel pasto)."""
+    plan.set_food([item_id], [food_idx], [float(grams)])
+
+def propose_week_swaps(plan, db_df, allowed, same_category=True, match="kcal"):
+    """
+    Proposte per tutta la settimana: per ogni alimento non ammesso (maschera
+    `allowed`) il sostituto ammesso più vicino. DataFrame con ID riga,
+    Giorno, Pasto, Alimento, Grammi, Sostituto, Grammi nuovi, Somiglianza e
+    l'indice DB del sostituto ("indice").
+    """
+    n = len(plan)
+    excluded = np.flatnonzero(~allowed[plan.food_idx[:n]])
+    columns = ["ID", "Giorno", "Pasto", "Alimento", "Grammi", "Sostituto", "Grammi nuovi", "Somiglianza", "indice"]
+    if len(excluded) == 0:
+        return pd.DataFrame(columns=columns)
+    names = db_df["Nome"].to_numpy()
+    foods, grams = plan.food_idx[excluded], plan.grams[excluded].astype(float)
+    proposals = get_substitution_index(db_df).batch_substitutes(foods, grams, 1, same_category, allowed, match)
+    rows = []
+    for pos, food, g, best in zip(excluded, foods, grams, proposals):
+        sub, score, new_g = best[0] if best else (None, None, None)
+        rows.append([int(plan.item_id[pos]), DAYS_OF_WEEK[plan.day[pos]], MEAL_TYPES[plan.meal[pos]], names[food], g,
+                     names[sub] if sub is not None else None, new_g,
+                     round(score, 3) if score is not None else None, sub])
+    return pd.DataFrame(rows, columns=columns)
+
+def apply_week_swaps(plan, swaps):
+    """Applica le proposte di propose_week_swaps (le righe senza sostituto restano invariate)."""
+    swaps = swaps.dropna(subset=["indice"])
+    if not swaps.empty:
+        plan.set_food(swaps["ID"].to_numpy(), swaps["indice"].astype(int).to_numpy(),
+                      swaps["Grammi nuovi"].to_numpy(dtype=float))
+    return len(swaps)
@@ -0,0 +1,132 @@
+"""
+Cache delle risposte della chat RAG (retrieval e generazione).
+
+ResponseCache è una cache LRU con scadenza (TTL) e contatori hit/miss,
+condivisibile tra sessioni (thread-safe). Due modalità di ricerca:
+  - "exact":    chiave = testo normalizzato (minuscolo, spazi compattati)
+  - "semantic": se non c'è il match esatto, si cerca la voce con embedding
+                più simile (coseno >= soglia) nello stesso "scope"
+
+Lo scope separa le voci che non devono mai mescolarsi: per la generazione
+contiene l'hash di profilo paziente, chunk recuperati e configurazione del
+modello, così una risposta non viene riusata per un paziente diverso.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_MODES = ("exact", "semantic")
+
+
+def normalize_text(text):
+    return " ".join(str(text).lower().split())
+
+
+def stable_hash(*parts):
+    """Hash stabile di stringhe/oggetti JSON (per chiavi e scope)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, default=str)
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """Cache LRU + TTL con ricerca esatta o per similarità di embedding."""
+
+    def __init__(self, maxsize=256, ttl=3600, mode="exact", threshold=0.92, embed=None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Modalità cache sconosciuta: '{mode}'")
+        if mode == "semantic" and embed is None:
+            raise ValueError("La modalità 'semantic' richiede una funzione di embedding")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.mode = mode
+        self.threshold = threshold
+        self.embed = embed
+        self._entries = OrderedDict()  # (scope, testo) -> (scadenza, valore, vettore)
+        self._lock = threading.Lock()
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _purge_expired(self, now):
+        expired = [k for k, (deadline, _, _) in self._entries.items() if deadline < now]
+        for key in expired:
+            del self._entries[key]
+
+    def _vector(self, text):
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, text, scope=""):
+        """
+        Restituisce (valore | None, vettore). Il vettore (solo in modalità
+        "semantic") va ripassato a store() per non ricalcolare l'embedding.
+        """
+        key = (scope, normalize_text(text))
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits_exact += 1
+                return entry[1], entry[2]
+            candidates = [(k, e) for k, e in self._entries.items() if k[0] == scope and e[2] is not None]
+
+        if self.mode != "semantic":
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        vector = self._vector(text)
+        if candidates:
+            matrix = np.stack([e[2] for _, e in candidates])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                with self._lock:
+                    if candidates[best][0] in self._entries:
+                        self._entries.move_to_end(candidates[best][0])
+                    self.hits_semantic += 1
+                return candidates[best][1][1], vector
+        with self._lock:
+            self.misses += 1
+        return None, vector
+
+    def store(self, text, value, scope="", vector=None):
+        key = (scope, normalize_text(text))
+        if self.mode == "semantic" and vector is None:
+            vector = self._vector(text)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits_exact = self.hits_semantic = self.misses = 0
+
+    def stats(self):
+        hits = self.hits_exact + self.hits_semantic
+        total = hits + self.misses
+        return {
+            "voci": len(self._entries),
+            "hit": hits,
+            "hit_semantici": self.hits_semantic,
+            "miss": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
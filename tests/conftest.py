@@ -0,0 +1,16 @@
+"""Moduli dell'app importabili dai test (root del progetto nel path, percorsi relativi alla root)."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def in_root(monkeypatch):
+    """Esegue il test dalla root del progetto (CSV del DB alimenti con percorso relativo)."""
+    monkeypatch.chdir(ROOT)
+    return ROOT
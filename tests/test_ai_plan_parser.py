@@ -0,0 +1,80 @@
+"""Parser locale delle tabelle Markdown dei piani AI."""
+from ai_plan_parser import parse_grams_cell, parse_plan_tables, parse_quantity, split_foods
+
+
+def test_full_rows_unitless_ranged_and_unit_grams():
+    text = """
+| Giorno | Pasto | Alimento | Grammi |
+|---|---|---|---|
+| Lunedì | Colazione | Fiocchi d'avena | 40 |
+| Lunedì | Pranzo | Pasta integrale | 80-100 |
+| Martedì | Cena | Salmone | 150 g |
+| Martedì | Cena | Uova | 2 |
+"""
+    assert parse_plan_tables(text) == [
+        {"day": "Lunedì", "meal": "Colazione", "food": "Fiocchi d'avena", "grams": 40.0},
+        {"day": "Lunedì", "meal": "Pranzo", "food": "Pasta integrale", "grams": 90.0},
+        {"day": "Martedì", "meal": "Cena", "food": "Salmone", "grams": 150.0},
+        {"day": "Martedì", "meal": "Cena", "food": "Uova", "grams": 2.0},
+    ]
+
+
+def test_quantity_header_with_unit_and_day_heading():
+    text = """
+### Mercoledì
+| Pasto | Alimenti | Quantità (g) |
+|---|---|---|
+| Pranzo | Riso, crudo | 70 |
+| | Zucchine | 200 g |
+"""
+    assert parse_plan_tables(text) == [
+        {"day": "Mercoledì", "meal": "Pranzo", "food": "Riso, crudo", "grams": 70.0},
+        {"day": "Mercoledì", "meal": "Pranzo", "food": "Zucchine", "grams": 200.0},
+    ]
+
+
+def test_missing_or_textual_grams_are_left_out():
+    text = """
+| Giorno | Pasto | Alimento | Grammi |
+|---|---|---|---|
+| Lunedì | Cena | Insalata mista | a volontà |
+| Lunedì | Cena | Pane | |
+"""
+    items = parse_plan_tables(text)
+    assert [i["food"] for i in items] == ["Insalata mista", "Pane"]
+    assert all("grams" not in i for i in items)
+
+
+def test_numbers_in_food_cells_still_need_a_unit():
+    # Fuori dalla colonna dei grammi un numero nudo non è una quantità
+    text = """
+| Pasto | Lunedì | Martedì |
+|---|---|---|
+| Colazione | Yogurt greco 0% 150 g | 2 fette biscottate |
+"""
+    items = parse_plan_tables(text)
+    assert items[0] == {"day": "Lunedì", "meal": "Colazione", "food": "Yogurt greco 0%", "grams": 150.0}
+    assert "grams" not in items[1]
+
+
+def test_parse_quantity_units_and_ranges():
+    assert parse_quantity("0,2 kg") == 200.0
+    assert parse_quantity("1 l") == 1000.0
+    assert parse_quantity("80–120 g") == 100.0
+    assert parse_quantity("40") is None
+    assert parse_grams_cell("40") == 40.0
+    assert parse_grams_cell("~ 150") == 150.0
+    assert parse_grams_cell("**60**") == 60.0
+    assert parse_grams_cell("q.b.") is None
+
+
+def test_slash_is_a_fraction_only_with_a_small_denominator():
+    assert parse_quantity("1/2 l") == 500.0
+    assert parse_quantity("3/4 kg") == 750.0
+    assert parse_quantity("80/100 g") == 90.0  # intervallo, non frazione
+    assert parse_grams_cell("80/100") == 90.0
+    assert split_foods("Latte 1/2 l, Avena 40 g") == [("Latte", 500.0), ("Avena", 40.0)]
+
+
+def test_text_without_tables_returns_empty():
+    assert parse_plan_tables("Nessuna tabella, solo consigli generali.") == []
@@ -0,0 +1,42 @@
+"""Import in blocco: un piano malformato non ferma il lotto."""
+import pandas as pd
+import pytest
+
+import batch_plans
+
+GOOD = [{"day": "Lunedì", "meal": "Pranzo", "food": "Riso brillato", "grams": 80},
+        {"day": "Martedì", "meal": "Cena", "food": "Petto di pollo", "grams": 120}]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bad_rows_are_recorded_and_the_batch_goes_on(in_root, workers):
+    jobs = [
+        ("buono", GOOD),
+        # Righe con tipi inattesi accanto a righe valide
+        ("giorno_null", GOOD + [{"day": None, "meal": "Cena", "food": "Mela", "grams": 150}]),
+        ("pasto_numerico", GOOD + [{"day": "Lunedì", "meal": 3, "food": "Mela", "grams": 150}]),
+        ("non_lista", {"plan": "testo"}),
+        ("json_rotto", "JSON non valido: riga 1"),
+    ]
+    tables = batch_plans.run_batch(iter(jobs), workers=workers)
+    summary = tables["piani"].set_index("piano")
+    assert list(summary.index) == [job[0] for job in jobs]
+    assert summary.loc["buono", "aggiunti"] == 2 and pd.isna(summary.loc["buono", "errore"])
+    # Giorno null: riga non attribuibile, il resto del piano è importato
+    assert summary.loc["giorno_null", "aggiunti"] == 2
+    assert summary.loc["giorno_null", "giorni_non_riconosciuti"] == 1
+    # Pasto non testuale: pasto di default, come per un pasto mancante
+    assert summary.loc["pasto_numerico", "aggiunti"] == 3
+    assert summary.loc["non_lista", "errore"] and summary.loc["json_rotto", "errore"]
+
+
+def test_unexpected_errors_become_the_plan_error(in_root, monkeypatch):
+    batch_plans.init_worker()
+
+    def explode(db_df, items):
+        raise AttributeError("'NoneType' object has no attribute 'lower'")
+
+    monkeypatch.setattr(batch_plans.core, "match_ai_plan", explode)
+    result = batch_plans.process_plan(("p1", GOOD))
+    assert result["piano"]["errore"].startswith("Errore import: AttributeError")
+    assert result["totali"] == [] and result["match"] == []
@@ -0,0 +1,29 @@
+"""Unione dei chunk consecutivi nel contesto RAG."""
+from context_builder import CHUNK_JOINER, MIN_OVERLAP, merge_adjacent
+
+
+def _chunk(n, text, source="linee_guida.pdf"):
+    return {"id": f"{source}-{n}", "source": source, "chunk": n, "text": text}
+
+
+def test_splitter_overlap_is_removed_once():
+    shared = "il potassio va monitorato nei pazienti con insufficienza renale"
+    left = "Introduzione al capitolo. " + shared
+    right = shared + " e la dose si adatta alla funzione residua."
+    [block] = merge_adjacent([_chunk(0, left), _chunk(1, right)])
+    assert block["text"] == left + " e la dose si adatta alla funzione residua."
+    assert block["ids"] == ["linee_guida.pdf-0", "linee_guida.pdf-1"]
+
+
+def test_short_coincidences_are_not_cut():
+    # Fine e inizio coincidono solo per ". Il" (e una parola ripetuta): non è sovrapposizione
+    left = "Limitare il sodio a 5 g al giorno. Il"
+    right = ". Il calcio resta invariato."
+    assert len(". Il") < MIN_OVERLAP
+    [block] = merge_adjacent([_chunk(3, left), _chunk(4, right)])
+    assert block["text"] == left + CHUNK_JOINER + right
+
+
+def test_non_adjacent_chunks_stay_separate_in_relevance_order():
+    blocks = merge_adjacent([_chunk(7, "settimo"), _chunk(2, "secondo"), _chunk(3, "terzo", source="altro.pdf")])
+    assert [b["chunks"] for b in blocks] == [[7], [2], [3]]
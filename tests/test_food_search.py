@@ -0,0 +1,87 @@
+"""Indice dei nomi: stessi risultati della scansione difflib + sottostringa storica."""
+import difflib
+import os
+
+import pytest
+
+import planner_core as core
+from conftest import ROOT
+from food_search import FoodSearchIndex
+
+QUERIES = [
+    # Nomi esatti, varianti e refusi
+    "Pasta di semola", "pasta di semola cotta", "Riso brillato", "riso basmati", "Petto di pollo",
+    "pollo petto", "Mela", "mele", "Yogurt greco", "yogurt intero", "Latte parzialmente scremato",
+    "latte scremato", "Pane integrale", "pane", "Olio extravergine di oliva", "olio evo", "Tonno",
+    "tonno al naturale", "Salmone affumicato", "Lenticchie secche", "ceci lessi", "Parmigiano",
+    "Mozzarella di vacca", "uova intere", "Zucchine", "insalata", "Banana", "fiocchi d'avena",
+    # Sottostringhe e casi senza match fuzzy
+    "soia", "avena", "merluzzo", "bresaola", "noci", "mandorle",
+    # Inglese e parole senza corrispondenza
+    "chicken breast", "oats", "apple", "xyzzy", "", "  ",
+]
+
+
+def _historical_match(names, lowered, query):
+    """Il matching originale: get_close_matches(n=1, cutoff=0.5), poi "contenuto nel nome"."""
+    close = difflib.get_close_matches(query, names, n=1, cutoff=0.5)
+    if close:
+        return names.index(close[0])
+    needle = query.lower()
+    return next((row for row, name in enumerate(lowered) if needle in name), None)
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    return core.load_food_db(os.path.join(ROOT, core.CSV_DB_PATH), str(tmp_path_factory.mktemp("food_db_cache")))
+
+
+def test_best_match_reproduces_difflib_and_substring(db):
+    names = db["Nome"].tolist()
+    lowered = [n.lower() for n in names]
+    index = FoodSearchIndex(names, db["Nome Inglese"].tolist() if "Nome Inglese" in db.columns else None)
+    for query in QUERIES:
+        expected = _historical_match(names, lowered, query)
+        match = index.best_match(query)
+        if expected is None:
+            # Il terzo passo (trigrammi) interviene solo dove prima non si trovava nulla
+            assert match is None or match[2] == "indice", query
+        else:
+            assert match is not None and match[2] in ("fuzzy", "substring"), query
+            assert match[0] == expected, query
+
+
+def test_close_match_ties_and_duplicates_follow_difflib():
+    # Stesso ratio: difflib sceglie il nome "maggiore"; nomi duplicati -> prima riga
+    names = ["mela rossa", "mela verde", "mela gialla", "mela verde", "pera"]
+    index = FoodSearchIndex(names)
+    for query in ("mela", "mela v", "mela rosa", "pere", "kiwi"):
+        expected = difflib.get_close_matches(query, names, n=1, cutoff=0.5)
+        match = index.close_match(query)
+        assert (names[match[0]] if match else None) == (expected[0] if expected else None), query
+    assert index.close_match("mela verde")[0] == 1
+
+
+def test_substring_match_returns_first_row_in_db_order():
+    index = FoodSearchIndex(["Latte di soia", "Soia, semi secchi", "Tofu"])
+    assert index.substring_match("soia") == 0
+    assert index.substring_match("SEMI") == 1
+    assert index.substring_match("riso") is None
+
+
+def test_match_many_resolves_each_normalized_query_once(db):
+    index = FoodSearchIndex(db["Nome"].tolist())
+    calls = []
+    original = index.best_match
+    index.best_match = lambda q: calls.append(q) or original(q)
+    first = index.match_many(["Mela", " Mela ", "Riso  brillato", "Riso brillato"])
+    assert len(first) == len(calls) == 2
+    index.match_many(["Riso brillato", "Pane"])
+    assert len(calls) == 3  # le query già risolte vengono dalla memo
+
+
+def test_empty_or_non_text_queries_match_nothing():
+    index = FoodSearchIndex(["None", "Storione", "Pane"])
+    result = index.match_many([None, "", "   ", "Pane"])
+    assert result[""] is None
+    assert result["Pane"][0] == 2
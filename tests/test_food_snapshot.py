@@ -0,0 +1,22 @@
+"""Snapshot del DB alimenti: stessi valori del parsing diretto del CSV."""
+import os
+
+import pandas as pd
+
+import food_snapshot
+import planner_core as core
+from conftest import ROOT
+
+CSV = os.path.join(ROOT, core.CSV_DB_PATH)
+
+
+def test_snapshot_matches_csv_parse(tmp_path):
+    expected = food_snapshot.parse_food_csv(CSV, core.COLUMN_MAPPING, core.NUMERIC_COLS)
+    # Nello snapshot i testi mancanti diventano stringhe vuote
+    expected = expected.fillna({c: "" for c in expected.columns if c not in core.NUMERIC_COLS})
+    cache_dir = str(tmp_path / "cache")
+    for _ in range(2):  # compilazione, poi lettura dello snapshot già valido
+        df = food_snapshot.load_food_table(CSV, cache_dir, core.COLUMN_MAPPING, core.NUMERIC_COLS)
+        pd.testing.assert_frame_equal(df[expected.columns], expected)
+        assert df[core.NUMERIC_COLS].dtypes.eq("float64").all()
+    assert food_snapshot.snapshot_is_fresh(CSV, cache_dir, core.COLUMN_MAPPING, core.NUMERIC_COLS)[0]
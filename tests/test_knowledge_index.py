@@ -0,0 +1,113 @@
+"""Aggiornamento incrementale dell'indice: manifest e fallimenti parziali dell'embedding."""
+import os
+import sys
+
+import pytest
+
+import knowledge_index as kidx
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+import synthetic  # noqa: E402
+
+
+class FlakyEmbeddings(kidx.HashingEmbeddings):
+    """Embedder locale che fallisce sulle chiamate indicate (numerate da 1)."""
+
+    def __init__(self, fail_calls=()):
+        super().__init__(dim=64)
+        self.fail_calls = set(fail_calls)
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls in self.fail_calls:
+            raise RuntimeError("quota esaurita")
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # cache del testo estratto nella cartella temporanea
+    docs = tmp_path / "documenti"
+    synthetic.write_pdf_corpus(str(docs), n_docs=2, pages=3)
+    embedder = FlakyEmbeddings()
+    info = {"provider": "hashing", "model": "hashing-64", "batch_size": 2, "pause": 0.0}
+    monkeypatch.setattr(kidx, "create_embeddings", lambda provider=None, api_key=None: (embedder, dict(info)))
+    return str(docs), str(tmp_path / "indice"), embedder
+
+
+def _sync(docs, index):
+    return kidx.sync_index(docs, index, provider="hashing", max_workers=1)
+
+
+def test_unchanged_documents_are_not_reembedded(corpus):
+    docs, index, embedder = corpus
+    store, n_files, report = _sync(docs, index)
+    assert n_files == 2 and sorted(report["aggiunti"]) == sorted(os.listdir(docs))
+    assert report["incompleti"] == {} and report["errori"] == []
+    total = store.index.ntotal
+
+    calls = embedder.calls
+    store, _, report = _sync(docs, index)
+    assert report["invariati"] == 2 and not report["aggiunti"] and not report["modificati"]
+    assert embedder.calls == calls and store.index.ntotal == total
+
+
+def test_partial_embedding_failure_is_reported_and_retried(corpus):
+    docs, index, embedder = corpus
+    embedder.fail_calls = {2}
+    store, _, report = _sync(docs, index)
+    assert report["errori"] and "quota esaurita" in report["errori"][0]
+    assert sum(report["incompleti"].values()) == 2  # un batch da 2 chunk
+    manifest = kidx.read_manifest(index)
+    incomplete = [f for f, e in manifest["documents"].items() if e.get("incompleto")]
+    assert incomplete == list(report["incompleti"])
+
+    # Il giro successivo rifà il documento incompleto (e solo quello)
+    embedder.fail_calls = set()
+    store, _, report = _sync(docs, index)
+    assert report["modificati"] == incomplete and report["invariati"] == 1
+    assert report["incompleti"] == {}
+    manifest = kidx.read_manifest(index)
+    assert not any(e.get("incompleto") for e in manifest["documents"].values())
+    stored_ids = set(store.index_to_docstore_id.values())
+    manifest_ids = {cid for e in manifest["documents"].values() for cid in e["chunk_ids"]}
+    assert stored_ids == manifest_ids
+
+
+def test_removed_document_leaves_the_index(corpus):
+    docs, index, _ = corpus
+    _sync(docs, index)
+    victim = sorted(os.listdir(docs))[0]
+    os.remove(os.path.join(docs, victim))
+    store, n_files, report = _sync(docs, index)
+    assert report["rimossi"] == [victim] and n_files == 1
+    sources = {store.docstore.search(i).metadata["source"] for i in store.index_to_docstore_id.values()}
+    assert sources == set(os.listdir(docs))
+
+
+def test_failed_extraction_is_retried(corpus, monkeypatch):
+    docs, index, _ = corpus
+    victim = sorted(os.listdir(docs))[0]
+    extract = kidx.pdf_text.extract_texts
+
+    def flaky_extract(items, max_workers=None):
+        # Estrazione scaduta per un PDF: il worker restituisce testo None
+        for name, text, timing in extract(items, max_workers=max_workers):
+            yield name, None if name == victim else text, timing
+
+    monkeypatch.setattr(kidx.pdf_text, "extract_texts", flaky_extract)
+    _, _, report = _sync(docs, index)
+    assert report["illeggibili"] == [victim]
+    manifest = kidx.read_manifest(index)
+    assert manifest["documents"][victim]["incompleto"] and manifest["documents"][victim]["chunk_ids"] == []
+
+    # Al giro successivo l'estrazione riesce: il documento entra nell'indice
+    monkeypatch.setattr(kidx.pdf_text, "extract_texts", extract)
+    store, _, report = _sync(docs, index)
+    assert report["modificati"] == [victim] and report["illeggibili"] == []
+    entry = kidx.read_manifest(index)["documents"][victim]
+    assert entry["chunk_ids"] and not entry.get("incompleto")
+    sources = {store.docstore.search(i).metadata["source"] for i in store.index_to_docstore_id.values()}
+    assert victim in sources
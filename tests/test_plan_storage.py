@@ -0,0 +1,94 @@
+"""Archivio dei piani: salvataggio, ripresa per giorno e sostituzione."""
+import numpy as np
+import pytest
+
+import plan_storage
+from weekly_plan import WeeklyPlan
+
+CODES = ["A01", "B02", "C03", "D04"]
+NUTRIENTS = np.array([[100.0, 10.0], [200.0, 0.0], [50.0, 5.0], [10.0, 1.0]])
+
+
+def _contents(plan):
+    n = len(plan)
+    return sorted(zip(plan.day[:n].tolist(), plan.meal[:n].tolist(), plan.food_idx[:n].tolist(),
+                      plan.grams[:n].tolist()))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return plan_storage.MemoryBackend()
+    return plan_storage.SQLiteBackend(str(tmp_path / "plans.sqlite"))
+
+
+@pytest.fixture
+def store(backend):
+    store = plan_storage.PlanStore(backend, CODES, flush_interval=0)
+    yield store
+    store.close()
+
+
+def _filled_plan():
+    plan = WeeklyPlan(nutrients=NUTRIENTS)
+    plan.add_many(0, 0, [0, 1], [80, 120])
+    plan.add_many(0, 3, [2], [150])
+    plan.add_many(4, 2, [3, 0], [40.5, 60])
+    return plan
+
+
+def test_save_and_resume_round_trip(store):
+    plan = _filled_plan()
+    stored = store.open("ROSSI-01", plan=plan)  # piano già pieno: adottato dal codice
+    assert store.sync(stored) == 7
+    assert store.has_plan("ROSSI-01")
+
+    resumed = store.open("ROSSI-01", nutrients=NUTRIENTS)
+    assert len(resumed.plan) == 0  # nessuna lettura finché non serve
+    assert store.load_days(resumed, [4]) == 2
+    assert store.load_days(resumed) == 3  # poi il resto della settimana, il giorno 4 non si rilegge
+    assert _contents(resumed.plan) == _contents(plan)
+    np.testing.assert_allclose(resumed.plan.week_totals(), plan.week_totals())
+
+
+def test_only_modified_days_are_written(store):
+    plan = _filled_plan()
+    stored = store.open("ROSSI-01", plan=plan)
+    store.sync(stored)
+    assert store.sync(stored) == 0
+
+    plan.set_grams(plan.item_id[0], 90)
+    plan.clear(day=4)
+    assert store.sync(stored) == 2
+    resumed = store.open("ROSSI-01", nutrients=NUTRIENTS)
+    store.load_days(resumed)
+    assert _contents(resumed.plan) == [(0, 0, 0, 90.0), (0, 0, 1, 120.0), (0, 3, 2, 150.0)]
+
+
+def test_replace_overwrites_the_stored_plan(store):
+    store.sync(store.open("ROSSI-01", plan=_filled_plan()))
+    session = WeeklyPlan(nutrients=NUTRIENTS)
+    session.add(2, 1, 3, 25)
+
+    # Senza replace un piano esistente non viene toccato dal piano della sessione
+    assert store.sync(store.open("ROSSI-01", plan=session)) == 0
+    assert store.sync(store.open("ROSSI-01", plan=session, replace=True)) == 7
+    resumed = store.open("ROSSI-01", nutrients=NUTRIENTS)
+    store.load_days(resumed)
+    assert _contents(resumed.plan) == [(2, 1, 3, 25.0)]
+
+
+def test_unknown_codes_are_reported_not_loaded(store):
+    store.backend.write_days({("ROSSI-01", 1): [(0, "A01", 50.0), (0, "ZZZ", 70.0)]})
+    resumed = store.open("ROSSI-01", nutrients=NUTRIENTS)
+    assert store.load_days(resumed, [1]) == 1
+    assert resumed.missing_codes == ["ZZZ"]
+
+
+def test_chat_messages_append_only_new_ones(store):
+    messages = [{"role": "user", "content": "Piano per IBS?"},
+                {"role": "assistant", "content": "Ecco il piano", "timing": {"cache": True}}]
+    assert store.save_messages("ROSSI-01", messages) == 2
+    messages.append({"role": "user", "content": "Senza lattosio"})
+    store.save_messages("ROSSI-01", messages, start=2)
+    assert store.load_messages("ROSSI-01") == messages
@@ -0,0 +1,45 @@
+"""Import dei piani AI nel WeeklyPlan: righe incomplete o con tipi inattesi."""
+import os
+
+import pytest
+
+import planner_core as core
+from conftest import ROOT
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    return core.load_food_db(os.path.join(ROOT, core.CSV_DB_PATH), str(tmp_path_factory.mktemp("food_db_cache")))
+
+
+def test_missing_or_null_foods_are_not_matched(db):
+    plan = core.new_plan(db)
+    rows = [{"day": "Lunedì", "meal": "Pranzo", "food": None, "grams": 80},
+            {"day": "Lunedì", "meal": "Pranzo", "grams": 80},
+            {"day": "Lunedì", "meal": "Pranzo", "food": "   ", "grams": 80},
+            {"day": "Lunedì", "meal": "Pranzo", "food": 42, "grams": 80}]
+    added, log = core.import_ai_plan(plan, db, rows)
+    assert added == 0 and len(plan) == 0
+    assert all(line.startswith("⚠️ Cibo non trovato") for line in log)
+
+
+def test_grams_are_coerced_or_the_row_is_skipped(db):
+    plan = core.new_plan(db)
+    rows = [{"day": "Lunedì", "meal": "Pranzo", "food": "Riso brillato", "grams": "80 g"},
+            {"day": "Lunedì", "meal": "Pranzo", "food": "Riso brillato", "grams": "60-80"},
+            {"day": "Lunedì", "meal": "Cena", "food": "Riso brillato", "grams": None},
+            {"day": "Lunedì", "meal": "Cena", "food": "Riso brillato", "grams": "una porzione"},
+            {"day": "Lunedì", "meal": "Cena", "food": "Riso brillato", "grams": -5}]
+    added, log = core.import_ai_plan(plan, db, rows)
+    assert added == 3
+    assert plan.grams[:len(plan)].tolist() == [80.0, 70.0, 100.0]
+    assert sum(line.startswith("⚠️ Grammi non validi") for line in log) == 2
+
+
+def test_normalize_grams():
+    assert core.normalize_grams(120) == 120.0
+    assert core.normalize_grams("1,5 kg") == 1500.0
+    assert core.normalize_grams(None) == 100.0
+    assert core.normalize_grams(True) is None
+    assert core.normalize_grams(float("nan")) is None
+    assert core.normalize_grams(0) is None
@@ -0,0 +1,35 @@
+"""Modifiche del WeeklyPlan e totali incrementali."""
+import numpy as np
+
+from weekly_plan import WeeklyPlan
+
+# Due nutrienti per 100 g: alimento 0 = (100, 10), 1 = (200, 0), 2 = (50, 5)
+NUTRIENTS = np.array([[100.0, 10.0], [200.0, 0.0], [50.0, 5.0]])
+
+
+def _plan():
+    plan = WeeklyPlan(n_days=2, n_meals=2, nutrients=NUTRIENTS)
+    ids = plan.add_many(0, 0, [0, 1, 2], [100, 100, 100])
+    return plan, ids
+
+
+def test_set_grams_follows_item_id_order():
+    plan, (a, b, c) = _plan()
+    plan.set_grams([c, a], [40, 250])
+    grams = dict(zip(plan.item_id[:len(plan)].tolist(), plan.grams[:len(plan)].tolist()))
+    assert grams == {a: 250, b: 100, c: 40}
+    np.testing.assert_allclose(plan.meal_totals()[0, 0], [250 + 200 + 20, 25 + 0 + 2])
+
+
+def test_set_grams_scalar_applies_to_every_row():
+    plan, (a, b, c) = _plan()
+    plan.set_grams([a, b], 50)
+    assert plan.grams[:len(plan)].tolist() == [50, 50, 100]
+    np.testing.assert_allclose(plan.meal_totals()[0, 0], [50 + 100 + 50, 5 + 0 + 5])
+
+
+def test_set_food_follows_item_id_order():
+    plan, (a, b, c) = _plan()
+    plan.set_food([b, a], [2, 1], [100, 100])
+    assert plan.food_idx[:len(plan)].tolist() == [1, 2, 2]
+    np.testing.assert_allclose(plan.meal_totals()[0, 0], [200 + 50 + 50, 0 + 5 + 5])
@@ -0,0 +1,231 @@
+"""
+Piano settimanale compatto, basato su array NumPy.
+
+Ogni alimento del piano è una riga con: indice nel DB alimenti, grammi,
+codice giorno, codice pasto e un ID stabile (serve all'editor per
+riconoscere le righe). I valori nutrizionali non vengono copiati nel piano:
+si ricavano dalla matrice per 100 g del DB con un unico prodotto matriciale.
+
+Se il piano conosce la matrice dei nutrienti, mantiene anche i totali per
+pasto in modo incrementale (aggiunte, modifiche, cancellazioni): i totali di
+giorno e settimana derivano da questi e sono memorizzati per versione.
+"""
+import numpy as np
+
+
+class WeeklyPlan:
+    """Contenitore array-based del piano (giorni x pasti)."""
+
+    def __init__(self, n_days=7, n_meals=5, capacity=64, nutrients=None):
+        self.n_days = n_days
+        self.n_meals = n_meals
+        self._n = 0
+        self._next_id = 0
+        self.food_idx = np.zeros(capacity, dtype=np.int32)
+        self.grams = np.zeros(capacity, dtype=np.float32)
+        self.day = np.zeros(capacity, dtype=np.int8)
+        self.meal = np.zeros(capacity, dtype=np.int8)
+        self.item_id = np.zeros(capacity, dtype=np.int64)
+
+        # Versioni: globale e per pasto (cambiano a ogni modifica)
+        self.version = 0
+        self.slot_version = np.zeros((n_days, n_meals), dtype=np.int64)
+
+        # Totali per pasto mantenuti in modo incrementale
+        self.nutrients = None
+        self._meal_totals = None
+        self._derived = {}  # chiave -> (versione, valore)
+        if nutrients is not None:
+            self.attach_nutrients(nutrients)
+
+    def __len__(self):
+        return self._n
+
+    # --- Gestione capacità ---
+
+    def _columns(self):
+        return ("food_idx", "grams", "day", "meal", "item_id")
+
+    def _reserve(self, extra):
+        needed = self._n + extra
+        capacity = len(self.food_idx)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name in self._columns():
+            old = getattr(self, name)
+            grown = np.zeros(new_capacity, dtype=old.dtype)
+            grown[:self._n] = old[:self._n]
+            setattr(self, name, grown)
+
+    def _keep(self, mask):
+        """Compatta gli array tenendo solo le righe con mask True."""
+        dropped = np.flatnonzero(~mask)
+        if len(dropped) == 0:
+            return
+        self._accumulate(dropped, -self.grams[dropped])
+        touched = set(zip(self.day[dropped].tolist(), self.meal[dropped].tolist()))
+
+        keep = np.flatnonzero(mask)
+        for name in self._columns():
+            arr = getattr(self, name)
+            arr[:len(keep)] = arr[keep]
+        self._n = len(keep)
+
+        # Pasti rimasti vuoti: azzeriamo per non accumulare errori di arrotondamento
+        if self._meal_totals is not None:
+            for d, m in touched:
+                if len(self.positions(d, m)) == 0:
+                    self._meal_totals[d, m] = 0.0
+        self._touch(touched)
+
+    # --- Totali incrementali ---
+
+    def attach_nutrients(self, nutrients):
+        """Collega la matrice per 100 g e ricalcola da zero i totali per pasto."""
+        self.nutrients = nutrients
+        self._meal_totals = self.slot_totals(nutrients)
+        self._derived = {}
+        self.version += 1
+
+    def _accumulate(self, positions, grams_delta):
+        """Somma ai totali dei pasti il contributo di grams_delta sulle righe indicate."""
+        if self._meal_totals is None or len(positions) == 0:
+            return
+        contrib = self.nutrients[self.food_idx[positions]] * (np.asarray(grams_delta, dtype=np.float64)[:, None] / 100.0)
+        np.add.at(self._meal_totals, (self.day[positions], self.meal[positions]), contrib)
+
+    def _touch(self, slots):
+        self.version += 1
+        for d, m in slots:
+            self.slot_version[d, m] += 1
+
+    def _cached(self, key, compute):
+        hit = self._derived.get(key)
+        if hit is not None and hit[0] == self.version:
+            return hit[1]
+        value = compute()
+        value.setflags(write=False)
+        self._derived[key] = (self.version, value)
+        return value
+
+    def meal_totals(self):
+        """Totali per (giorno, pasto): array (n_days, n_meals, n_nutrienti)."""
+        if self._meal_totals is None:
+            raise ValueError("Matrice nutrienti non collegata al piano")
+        return self._meal_totals
+
+    def day_totals(self, day):
+        """Totali del giorno, derivati dai totali per pasto (memorizzati per versione)."""
+        return self._cached(("giorno", day), lambda: self.meal_totals()[day].sum(axis=0))
+
+    def week_totals(self):
+        """Totali per giorno: array (n_days, n_nutrienti)."""
+        return self._cached(("settimana",), lambda: self.meal_totals().sum(axis=1))
+
+    # --- Modifica ---
+
+    def add(self, day, meal, food_idx, grams):
+        """Aggiunge un alimento e restituisce il suo ID."""
+        return self.add_many(day, meal, [food_idx], [grams])[0]
+
+    def add_many(self, day, meal, food_idx, grams):
+        """Aggiunge più alimenti allo stesso pasto. Restituisce gli ID."""
+        count = len(food_idx)
+        if count == 0:
+            return []
+        self._reserve(count)
+        sl = slice(self._n, self._n + count)
+        self.food_idx[sl] = food_idx
+        self.grams[sl] = grams
+        self.day[sl] = day
+        self.meal[sl] = meal
+        ids = np.arange(self._next_id, self._next_id + count, dtype=np.int64)
+        self.item_id[sl] = ids
+        self._n += count
+        self._next_id += count
+        self._accumulate(np.arange(sl.start, sl.stop), self.grams[sl])
+        self._touch([(day, meal)])
+        return ids.tolist()
+
+    def positions(self, day=None, meal=None):
+        """Posizioni (in ordine di inserimento) delle righe del giorno/pasto."""
+        mask = np.ones(self._n, dtype=bool)
+        if day is not None:
+            mask &= self.day[:self._n] == day
+        if meal is not None:
+            mask &= self.meal[:self._n] == meal
+        return np.flatnonzero(mask)
+
+    def _position_of(self, item_ids):
+        ids = np.atleast_1d(np.asarray(item_ids, dtype=np.int64))
+        return np.flatnonzero(np.isin(self.item_id[:self._n], ids))
+
+    def set_grams(self, item_id, grams):
+        """Imposta i grammi delle righe indicate (uno scalare o un valore per item_id)."""
+        ids = np.atleast_1d(np.asarray(item_id, dtype=np.int64))
+        pos = self._position_of(ids)
+        if len(pos) == 0:
+            return
+        if np.ndim(grams):
+            # Come in set_food: i valori seguono l'ordine di item_id, non quello del piano
+            order = {int(i): n for n, i in enumerate(ids)}
+            grams = np.asarray(grams, dtype=np.float64)[[order[int(i)] for i in self.item_id[pos]]]
+        old = self.grams[pos].astype(np.float64)
+        self.grams[pos] = grams
+        delta = self.grams[pos] - old
+        if not delta.any():
+            return
+        self._accumulate(pos, delta)
+        self._touch(set(zip(self.day[pos].tolist(), self.meal[pos].tolist())))
+
+    def set_food(self, item_id, food_idx, grams):
+        """Sostituisce alimento e grammi delle righe indicate (stessa posizione nel pasto)."""
+        ids = np.atleast_1d(np.asarray(item_id, dtype=np.int64))
+        pos = self._position_of(ids)
+        if len(pos) == 0:
+            return
+        # _position_of restituisce le posizioni in ordine di piano: riallinea i valori
+        order = {int(i): n for n, i in enumerate(ids)}
+        rows = [order[int(i)] for i in self.item_id[pos]]
+        self._accumulate(pos, -self.grams[pos].astype(np.float64))
+        self.food_idx[pos] = np.asarray(food_idx)[rows]
+        self.grams[pos] = np.asarray(grams, dtype=np.float64)[rows]
+        self._accumulate(pos, self.grams[pos])
+        self._touch(set(zip(self.day[pos].tolist(), self.meal[pos].tolist())))
+
+    def remove(self, item_ids):
+        mask = np.ones(self._n, dtype=bool)
+        mask[self._position_of(item_ids)] = False
+        self._keep(mask)
+
+    def clear(self, day=None, meal=None):
+        mask = np.ones(self._n, dtype=bool)
+        mask[self.positions(day, meal)] = False
+        self._keep(mask)
+
+    def replace_meal(self, day, meal, food_idx, grams):
+        """Sostituisce il contenuto di un pasto (l'ordine è quello passato)."""
+        self.clear(day, meal)
+        return self.add_many(day, meal, food_idx, grams)
+
+    # --- Calcolo ---
+
+    def slot_totals(self, nutrients):
+        """
+        Totali di tutti i nutrienti per ogni (giorno, pasto), con un solo
+        prodotto matriciale: (slot x alimenti DB) @ (alimenti DB x nutrienti).
+        nutrients: matrice per 100 g (righe DB x nutrienti).
+        Restituisce un array (n_days, n_meals, n_nutrienti).
+        """
+        n = self._n
+        slots = self.day[:n].astype(np.intp) * self.n_meals + self.meal[:n]
+        weights = np.zeros((self.n_days * self.n_meals, nutrients.shape[0]), dtype=np.float64)
+        np.add.at(weights, (slots, self.food_idx[:n]), self.grams[:n] / 100.0)
+        totals = weights @ nutrients
+        return totals.reshape(self.n_days, self.n_meals, nutrients.shape[1])
+
+    def item_totals(self, positions, nutrients):
+        """Nutrienti delle singole righe indicate (righe x nutrienti)."""
+        factor = self.grams[positions].astype(np.float64)[:, None] / 100.0
+        return nutrients[self.food_idx[positions]] * factor